@@ -5,18 +5,33 @@ Script phân tích dữ liệu Udemy courses và lưu vào ChromaDB
 KHÔNG sử dụng OpenAI embedding - dùng ChromaDB default
 """
 
+import argparse
 import pandas as pd
 import chromadb
 from chromadb.config import Settings
 import os
+import sys
 from dotenv import load_dotenv
 import json
+import hashlib
 import time
-from typing import List, Dict, Any, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 import re
+import shutil
 from pathlib import Path
 
+# Cho phép import utils/ khi chạy script trực tiếp từ thư mục backend
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.collection_manifest import manifest_path, read_manifest, versioned_collection_name, write_manifest
+from utils.bm25_index import build_index_from_collection, index_dir
+from utils.embedding_executor import (
+    EmbeddingExecutor, INGEST_EMBEDDING_BATCH_CANDIDATES, INGEST_EMBEDDING_BATCH_SIZE, INGEST_EMBEDDING_WORKERS
+)
+
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -24,213 +39,567 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+ENRICHMENT_FIELDS = ('outcomes', 'requirements', 'audience')
+ENRICHMENT_SOURCE_COLUMNS = {
+    'outcomes': 'What You\'ll Learn',
+    'requirements': 'Requirements',
+    'audience': 'Target Audience',
+}
+ENRICHMENT_BATCH_SIZE = int(os.getenv('ENRICHMENT_BATCH_SIZE', '5'))
+ENRICHMENT_WORKERS = int(os.getenv('ENRICHMENT_WORKERS', '4'))
+
+# Ingest incremental: số row upsert mỗi batch (mỗi batch ghi kèm fingerprint, chạy lại sẽ bỏ qua)
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '100'))
+# Số document dùng để đo chọn embedding batch size (khi INGEST_EMBEDDING_BATCH_SIZE=0)
+EMBEDDING_TUNE_SAMPLE_SIZE = int(os.getenv('EMBEDDING_TUNE_SAMPLE_SIZE', '512'))
+# Tăng khi đổi cách build document/metadata để mọi row được ingest lại
+INGEST_SCHEMA_VERSION = 3
+# Đọc CSV theo chunk để file lớn (100k+ courses) không phải load raw cả file một lúc
+CSV_CHUNK_SIZE = int(os.getenv('CSV_CHUNK_SIZE', '20000'))
+
+# Blue/green reindex: query kiểm tra collection mới trước khi flip alias, số version cũ giữ lại để rollback
+SMOKE_QUERIES = ('python backend development', 'web development javascript', 'data science machine learning')
+KEEP_COLLECTION_VERSIONS = int(os.getenv('KEEP_COLLECTION_VERSIONS', '2'))
+FINGERPRINT_COLUMNS = (
+    'Title', 'Link', 'Detailed Description', "What You'll Learn", 'Requirements', 'Target Audience',
+    'Instructor', 'Rating', 'Duration', 'Level', 'Current Price'
+)
+# Cột text làm sạch, cột dạng list parse, và các cột list đưa vào document (label, số item tối đa)
+TEXT_COLUMNS = ('Title', 'Detailed Description', 'Instructor', 'Level', 'Duration')
+LIST_COLUMNS = ("What You'll Learn", 'Requirements', 'Target Audience')
+DOCUMENT_LIST_SECTIONS = (
+    ("What You'll Learn", 'LEARNING OUTCOMES', 10),
+    ('Requirements', 'REQUIREMENTS', 5),
+    ('Target Audience', 'TARGET AUDIENCE', 5),
+)
+CSV_COLUMNS = frozenset(FINGERPRINT_COLUMNS)
+# Ký tự tạm thay cho dấu phân cách item khi parse cột list (không xuất hiện trong text đã làm sạch)
+LIST_SEPARATOR = '\x00'
+TECH_KEYWORDS = (
+    'python', 'javascript', 'java', 'react', 'angular', 'vue', 'node', 'nodejs',
+    'django', 'flask', 'laravel', 'spring', 'express', 'mongodb', 'mysql',
+    'postgresql', 'html', 'css', 'typescript', 'php', 'ruby', 'go', 'rust',
+    'docker', 'kubernetes', 'aws', 'azure', 'gcp', 'machine learning', 'ml',
+    'artificial intelligence', 'ai', 'data science', 'blockchain', 'flutter',
+    'swift', 'kotlin', 'android', 'ios', 'unity', 'tensorflow', 'pytorch',
+    'backend', 'frontend', 'fullstack', 'web development', 'mobile development',
+    'cloud', 'devops', 'database', 'sql', 'nosql'
+)
+
+def _decode_escape(match) -> str:
+    """Escape sequence trong Python list repr (regex match) -> ký tự thật"""
+    code = match.group(1)
+    if code[0] in 'ux':
+        return chr(int(code[1:], 16))
+    return {'n': '\n', 't': '\t', 'r': '\r'}[code]
+
 class UdemyCourseAnalyzer:
-    def __init__(self):
-        """Khởi tạo analyzer - KHÔNG dùng OpenAI embedding"""
+    def __init__(self, rebuild: bool = False, embedding_workers: int = INGEST_EMBEDDING_WORKERS,
+                 embedding_batch_size: int = INGEST_EMBEDDING_BATCH_SIZE):
+        """
+        Khởi tạo analyzer - KHÔNG dùng OpenAI embedding
+        rebuild=True: xóa collection cũ và ingest lại từ đầu; mặc định giữ collection để ingest incremental
+        embedding_workers: số worker tính embedding song song lúc ingest (0 = để Chroma tự embed trong upsert)
+        embedding_batch_size: số document / job embedding (0 = tự đo chọn)
+        """
+        self.embedding_workers = embedding_workers
+        self.embedding_batch_size = embedding_batch_size
 
         # Khởi tạo ChromaDB
         self.chroma_path = os.getenv('CHROMA_DB_PATH', './chroma_db')
-        self.collection_name = os.getenv('COLLECTION_NAME', 'udemy_courses')
+        # Alias: tên collection mà service dùng; có manifest thì alias trỏ tới collection version đang active
+        self.alias = os.getenv('COLLECTION_NAME', 'udemy_courses')
+        self.manifest_path = manifest_path(self.chroma_path, self.alias)
 
         # Tạo ChromaDB client
         self.chroma_client = chromadb.PersistentClient(
             path=self.chroma_path
         )
 
-        # Xóa collection cũ nếu tồn tại và tạo mới
-        try:
-            self.chroma_client.delete_collection(self.collection_name)
-            logger.info(f"🗑️ Đã xóa collection cũ: {self.collection_name}")
-        except:
-            logger.info(f"ℹ️ Không có collection cũ để xóa: {self.collection_name}")
-
-        # Tạo collection mới - ChromaDB sẽ dùng default embedding
-        self.collection = self.chroma_client.create_collection(
-            name=self.collection_name,
-            metadata={"description": "Udemy courses data for AI chatbot"}
-        )
-        logger.info(f"✅ Đã tạo collection mới: {self.collection_name}")
-
-    def clean_text(self, text: str) -> str:
-        """Làm sạch text, xử lý encoding issues"""
-        if pd.isna(text) or text is None:
-            return ""
+        manifest = read_manifest(self.manifest_path)
+        self.open_collection(manifest['active'] if manifest else self.alias, reset=rebuild)
 
-        text = str(text)
-        text = text.encode('utf-8', errors='ignore').decode('utf-8')
-        text = re.sub(r'[^\w\s\.,!?\-\(\)\[\]:]', ' ', text)
-        text = ' '.join(text.split())
-        return text.strip()
+    def open_collection(self, name: str, reset: bool = False):
+        """Mở (hoặc tạo) collection; reset=True xóa collection cũ cùng tên trước"""
+        self.collection_name = name
 
-    def parse_list_field(self, field_value: str) -> List[str]:
-        """Parse các trường dạng list từ CSV"""
-        if pd.isna(field_value) or field_value is None:
-            return []
+        if reset:
+            # Xóa collection cũ nếu tồn tại và tạo mới
+            try:
+                self.chroma_client.delete_collection(name)
+                logger.info(f"🗑️ Đã xóa collection cũ: {name}")
+            except:
+                logger.info(f"ℹ️ Không có collection cũ để xóa: {name}")
+
+        # ChromaDB sẽ dùng default embedding
+        self.collection = self.chroma_client.get_or_create_collection(
+            name=name,
+            metadata={"description": "Udemy courses data for AI chatbot"}
+        )
+        logger.info(f"✅ Collection: {name} ({self.collection.count()} documents)")
+        return self.collection
+
+    def clean_text_series(self, series: pd.Series, keep: str = '') -> pd.Series:
+        """
+        Làm sạch cả cột text bằng .str (vectorized): bỏ ký tự lạ, gộp khoảng trắng, NaN -> ''.
+        keep: ký tự giữ nguyên (dùng làm separator khi parse cột list)
+        """
+        return (
+            series.fillna('').astype(str)
+            .str.replace(rf'[^\w\s\.,!?\-\(\)\[\]:{keep}]', ' ', regex=True)
+            .str.split().str.join(' ')
+        )
 
-        field_value = str(field_value).strip()
+    def parse_list_series(self, series: pd.Series) -> pd.Series:
+        """
+        Parse cả cột dạng list từ CSV ("['a', 'b']" hoặc "a, b; c") thành list[str] đã làm sạch.
+        Đổi dấu phân cách giữa các item thành 1 ký tự sentinel, làm sạch cả cột 1 lần rồi split,
+        không json.loads / clean từng item.
+        """
+        values = series.fillna('').astype(str).str.strip()
+        is_list = values.str.startswith('[') & values.str.endswith(']')
+
+        # Dạng Python list repr: phân cách là ', ' giữa 2 dấu nháy (replace literal, không cần regex)
+        items = values.str[1:-1]
+        for separator in ("', '", '", "', "', \"", "\", '"):
+            items = items.str.replace(separator, LIST_SEPARATOR, regex=False)
+        # Escape trong repr (\u200b, \xa0, \n...) -> ký tự thật như json.loads, chỉ xử lý cell có backslash
+        escaped = is_list & items.str.contains('\\', regex=False)
+        if escaped.any():
+            items[escaped] = items[escaped].str.replace(
+                r'\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|[ntr])', _decode_escape, regex=True
+            )
+        joined = items.where(is_list, values.str.replace(r'[,;]', LIST_SEPARATOR, regex=True))
 
-        if field_value.startswith('[') and field_value.endswith(']'):
-            try:
-                field_value = field_value.replace("'", '"')
-                parsed_list = json.loads(field_value)
-                return [self.clean_text(item) for item in parsed_list if item]
-            except json.JSONDecodeError:
-                pass
-
-        items = re.split(r'[,;]', field_value.strip('[]'))
-        return [self.clean_text(item) for item in items if item.strip()]
-
-    def create_course_document(self, course_row: pd.Series) -> Tuple[str, Dict[str, Any]]:
-        """Tạo document đơn giản cho mỗi course"""
-        # Tạo text document tập trung vào keywords để search tốt
-        doc_parts = [
-            f"COURSE TITLE: {course_row['Title']}",
-            f"DESCRIPTION: {course_row['Detailed Description']}",
-            f"INSTRUCTOR: {course_row['Instructor']}",
-            f"LEVEL: {course_row['Level']}",
-            f"RATING: {course_row['Rating']}",
-            f"DURATION: {course_row['Duration']}",
+        cleaned = self.clean_text_series(joined, keep=LIST_SEPARATOR)
+        cleaned = (
+            cleaned.str.replace(f' {LIST_SEPARATOR}', LIST_SEPARATOR, regex=False)
+            .str.replace(f'{LIST_SEPARATOR} ', LIST_SEPARATOR, regex=False)
+            .str.strip(LIST_SEPARATOR)
+        )
+        # Item rỗng sau khi làm sạch (hiếm) -> bỏ separator thừa
+        has_empty = cleaned.str.contains(LIST_SEPARATOR * 2, regex=False)
+        if has_empty.any():
+            cleaned[has_empty] = cleaned[has_empty].str.replace(f'{LIST_SEPARATOR}+', LIST_SEPARATOR, regex=True)
+
+        empty = pd.Series([[]] * len(cleaned), index=cleaned.index)
+        return cleaned.str.split(LIST_SEPARATOR).where(cleaned != '', empty)
+
+    def duration_hours_series(self, durations: pd.Series) -> pd.Series:
+        """'16.5 total hours' -> 16.5, '45 total mins' -> 0.75, không rõ -> 0.0"""
+        parts = durations.fillna('').astype(str).str.lower().str.extract(r'(\d+(?:\.\d+)?)\s*(?:total\s*)?(hour|hr|min)')
+        value = parts[0].astype(float)
+        hours = value.where(parts[1] != 'min', (value / 60).round(2))
+        return hours.fillna(0.0)
+
+    def course_ids(self, df: pd.DataFrame) -> pd.Series:
+        """ID ổn định theo nội dung (Link, fallback Title) thay vì vị trí row trong CSV"""
+        links = df['Link'].fillna('').astype(str).str.strip()
+        keys = links.where(links != '', df['Title'].fillna('').astype(str).str.strip())
+        return keys.map(lambda key: f"course_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}")
+
+    def course_fingerprints(self, df: pd.DataFrame, enrich: bool = False) -> pd.Series:
+        """Fingerprint nội dung row - đổi khi dữ liệu nguồn, schema hoặc chế độ enrich thay đổi"""
+        columns = [
+            df[column].astype(str) if column in df else pd.Series('None', index=df.index)
+            for column in FINGERPRINT_COLUMNS
         ]
+        fingerprints = [
+            hashlib.sha256(
+                json.dumps([INGEST_SCHEMA_VERSION, bool(enrich), list(values)], ensure_ascii=False).encode('utf-8')
+            ).hexdigest()
+            for values in zip(*columns)
+        ]
+        return pd.Series(fingerprints, index=df.index)
+
+    def build_documents(self, df: pd.DataFrame,
+                        enrichments: Optional[List[Optional[Dict[str, List[str]]]]] = None) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Tạo document + metadata cho cả batch courses theo cột (không lặp từng row)"""
+        # Text document tập trung vào keywords để search tốt
+        documents = (
+            "COURSE TITLE: " + df['Title'].astype(str)
+            + "\nDESCRIPTION: " + df['Detailed Description'].astype(str)
+            + "\nINSTRUCTOR: " + df['Instructor'].astype(str)
+            + "\nLEVEL: " + df['Level'].astype(str)
+            + "\nRATING: " + df['Rating'].astype(str)
+            + "\nDURATION: " + df['Duration'].astype(str)
+        )
+        # Learning outcomes (quan trọng cho search), requirements, target audience
+        for column, label, limit in DOCUMENT_LIST_SECTIONS:
+            items = df[column].str[:limit]
+            section = ("\n" + label + ":\n- " + items.str.join("\n- ")).where(items.str.len() > 0, '')
+            documents = documents + section
+
+        # Metadata phong phú để filter
+        levels = df['Level'].astype(str).str.lower()
+        metadata_columns = pd.DataFrame({
+            'title': df['Title'],
+            'instructor': df['Instructor'],
+            'level': levels.where(levels != '', 'all levels'),
+            'rating': pd.to_numeric(df['Rating'], errors='coerce').fillna(0.0).astype(float),
+            'duration': df['Duration'],
+            # Dạng số để lọc bằng where filter ($gte) lúc search
+            'duration_hours': self.duration_hours_series(df['Duration']),
+            'link': df['Link'].fillna('').astype(str),
+            'price': (df['Current Price'] if 'Current Price' in df else pd.Series('', index=df.index))
+                .fillna('').astype(str).str.replace('Current price', '', regex=False).replace('', 'Free'),
+            'skills': self.skills_series(df['Title']),
+        }, index=df.index)
+        metadatas = metadata_columns.to_dict('records')
+
+        # Nội dung outcomes/requirements/audience sinh sẵn lúc ingest (JSON string vì metadata chỉ nhận scalar)
+        for metadata, enrichment in zip(metadatas, enrichments or []):
+            if enrichment:
+                metadata['enrichment'] = json.dumps(enrichment, ensure_ascii=False)
+
+        return documents.tolist(), metadatas
+
+    def get_enrichment_from_csv(self, course_row: pd.Series) -> Dict[str, List[str]]:
+        """Lấy outcomes/requirements/audience có sẵn trong CSV (có thể thiếu field)"""
+        enrichment = {}
+        for field, column in ENRICHMENT_SOURCE_COLUMNS.items():
+            items = course_row.get(column)
+            if isinstance(items, list) and items:
+                enrichment[field] = items[:5]
+        return enrichment
+
+    def generate_enrichment_with_ai(self, course_rows: List[pd.Series]) -> List[Dict[str, List[str]]]:
+        """Generate outcomes/requirements/audience (không phụ thuộc profile) cho 1 batch courses trong 1 prompt"""
+        from utils.openai_client import get_openai_client
+
+        course_blocks = []
+        for i, row in enumerate(course_rows):
+            course_blocks.append(
+                f"""[{i}]
+        - Tiêu đề: {row['Title']}
+        - Mô tả: {str(row['Detailed Description'])[:500]}
+        - Trình độ: {row['Level']}
+        - Giảng viên: {row['Instructor']}"""
+            )
+        courses_text = "\n".join(course_blocks)
+
+        prompt = f"""
+        Dựa trên thông tin các khóa học sau, hãy tạo nội dung structured cho TỪNG khóa học:
+
+        {courses_text}
+
+        Hãy trả về JSON array theo đúng thứ tự [0..{len(course_rows) - 1}], mỗi phần tử có format:
+        {{
+            "outcomes": ["Kỹ năng/kiến thức học được 1", "...", "..."],
+            "requirements": ["Yêu cầu kiến thức/kỹ năng 1", "...", "..."],
+            "audience": ["Đối tượng phù hợp 1", "...", "..."]
+        }}
+
+        Dùng tiếng Việt, ngắn gọn, cụ thể. Chỉ trả về JSON, không thêm text nào khác.
+        """
+
+        response = get_openai_client().chat_completion([
+            {"role": "user", "content": prompt}
+        ])
+        if not response or not response.choices:
+            return [{} for _ in course_rows]
+
+        content = response.choices[0].message.content.strip()
+        if content.startswith("```json"):
+            content = content[7:-3].strip()
+        elif content.startswith("```"):
+            content = content[3:-3].strip()
+
+        generated = json.loads(content)
+        if not isinstance(generated, list):
+            return [{} for _ in course_rows]
+
+        results = []
+        for i in range(len(course_rows)):
+            item = generated[i] if i < len(generated) and isinstance(generated[i], dict) else {}
+            results.append({field: item[field] for field in ENRICHMENT_FIELDS if item.get(field)})
+        return results
+
+    def build_enrichments(self, df: pd.DataFrame) -> List[Dict[str, List[str]]]:
+        """
+        Tạo enrichment block cho mọi course: ưu tiên dữ liệu CSV,
+        chỉ gọi AI (theo batch, song song) cho các course còn thiếu field
+        """
+        rows = [row for _, row in df.iterrows()]
+        enrichments = [self.get_enrichment_from_csv(row) for row in rows]
+
+        missing_positions = [
+            pos for pos, enrichment in enumerate(enrichments)
+            if any(field not in enrichment for field in ENRICHMENT_FIELDS)
+        ]
+        logger.info(f"🧩 Enrichment từ CSV: {len(rows) - len(missing_positions)}/{len(rows)} courses đầy đủ")
 
-        # Thêm learning outcomes - quan trọng cho search
-        if course_row['What You\'ll Learn']:
-            doc_parts.append("LEARNING OUTCOMES:")
-            doc_parts.extend([f"- {item}" for item in course_row['What You\'ll Learn'][:10]])  # Giới hạn 10 items
-
-        # Thêm requirements
-        if course_row['Requirements']:
-            doc_parts.append("REQUIREMENTS:")
-            doc_parts.extend([f"- {item}" for item in course_row['Requirements'][:5]])
-
-        # Thêm target audience
-        if course_row['Target Audience']:
-            doc_parts.append("TARGET AUDIENCE:")
-            doc_parts.extend([f"- {item}" for item in course_row['Target Audience'][:5]])
-
-        document_text = "\n".join(doc_parts)
-
-        # Tạo metadata phong phú để filter
-        metadata = {
-            'title': course_row['Title'],
-            'instructor': course_row['Instructor'],
-            'level': course_row['Level'].lower() if course_row['Level'] else 'all levels',
-            'rating': float(course_row['Rating']) if pd.notna(course_row['Rating']) else 0.0,
-            'duration': course_row['Duration'],
-            'link': course_row['Link'],
-            'price': getattr(course_row, 'Current Price', 'Free'),
-            'skills': ', '.join(self.extract_keywords_from_title(course_row['Title']))
-        }
-
-        return document_text, metadata
-
-    def extract_keywords_from_title(self, title: str) -> List[str]:
-        """Extract key technology/topic keywords from course title"""
-        if not title:
-            return []
-
-        tech_keywords = {
-            'python', 'javascript', 'java', 'react', 'angular', 'vue', 'node', 'nodejs',
-            'django', 'flask', 'laravel', 'spring', 'express', 'mongodb', 'mysql',
-            'postgresql', 'html', 'css', 'typescript', 'php', 'ruby', 'go', 'rust',
-            'docker', 'kubernetes', 'aws', 'azure', 'gcp', 'machine learning', 'ml',
-            'artificial intelligence', 'ai', 'data science', 'blockchain', 'flutter',
-            'swift', 'kotlin', 'android', 'ios', 'unity', 'tensorflow', 'pytorch',
-            'backend', 'frontend', 'fullstack', 'web development', 'mobile development',
-            'cloud', 'devops', 'database', 'sql', 'nosql'
-        }
+        if not missing_positions:
+            return enrichments
 
-        title_lower = title.lower()
-        found_keywords = [keyword for keyword in tech_keywords if keyword in title_lower]
+        batches = [
+            missing_positions[i:i + ENRICHMENT_BATCH_SIZE]
+            for i in range(0, len(missing_positions), ENRICHMENT_BATCH_SIZE)
+        ]
 
-        return found_keywords[:8]  # Limit to 8 keywords
+        def run_batch(positions: List[int]) -> Tuple[List[int], List[Dict[str, List[str]]]]:
+            try:
+                return positions, self.generate_enrichment_with_ai([rows[pos] for pos in positions])
+            except Exception as e:
+                logger.error(f"❌ Lỗi generate enrichment batch: {e}")
+                return positions, [{} for _ in positions]
+
+        logger.info(f"🤖 Đang generate enrichment cho {len(missing_positions)} courses ({len(batches)} batches)...")
+        with ThreadPoolExecutor(max_workers=max(1, ENRICHMENT_WORKERS)) as executor:
+            for positions, generated in executor.map(run_batch, batches):
+                for pos, item in zip(positions, generated):
+                    # Giữ field có sẵn trong CSV, chỉ bổ sung field còn thiếu
+                    for field in ENRICHMENT_FIELDS:
+                        if field not in enrichments[pos] and item.get(field):
+                            enrichments[pos][field] = item[field]
+
+        return enrichments
+
+    def skills_series(self, titles: pd.Series) -> pd.Series:
+        """Key technology/topic keywords trong title, tối đa 8 keyword, dạng 'python, django'"""
+        titles_lower = titles.fillna('').astype(str).str.lower()
+        skills = pd.Series('', index=titles.index)
+        counts = pd.Series(0, index=titles.index)
+        for keyword in TECH_KEYWORDS:
+            found = titles_lower.str.contains(keyword, regex=False) & (counts < 8)
+            skills = skills.where(~found, skills + ', ' + keyword)
+            counts = counts + found
+        return skills.str[2:]
+
+    def process_chunk(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Làm sạch 1 chunk CSV (vectorized theo cột)"""
+        for column in TEXT_COLUMNS:
+            df[column] = self.clean_text_series(df[column])
+        for column in LIST_COLUMNS:
+            df[column] = self.parse_list_series(df[column])
+        df['Rating'] = pd.to_numeric(df['Rating'], errors='coerce').fillna(0.0)
+        return df
 
-    def load_and_process_data(self, csv_file_path: str) -> pd.DataFrame:
-        """Load và xử lý dữ liệu từ file CSV"""
+    def load_and_process_data(self, csv_file_path: str, chunksize: int = CSV_CHUNK_SIZE) -> pd.DataFrame:
+        """
+        Load và xử lý dữ liệu từ file CSV.
+        Đọc theo chunk (chunksize rows) và làm sạch từng chunk để file lớn không phải giữ cả bản raw trong memory.
+        """
         logger.info(f"Đang load dữ liệu từ: {csv_file_path}")
 
-        try:
-            df = pd.read_csv(csv_file_path, encoding='utf-8')
-        except UnicodeDecodeError:
+        for encoding in ('utf-8', 'latin-1', 'cp1252'):
             try:
-                df = pd.read_csv(csv_file_path, encoding='latin-1')
+                reader = pd.read_csv(
+                    csv_file_path, encoding=encoding, chunksize=max(1, chunksize),
+                    usecols=lambda column: column in CSV_COLUMNS
+                )
+                chunks = [self.process_chunk(chunk) for chunk in reader]
+                break
             except UnicodeDecodeError:
-                df = pd.read_csv(csv_file_path, encoding='cp1252')
-
-        logger.info(f"✅ Đã load {len(df)} courses từ CSV")
-
-        # Làm sạch dữ liệu cơ bản
-        df['Title'] = df['Title'].apply(self.clean_text)
-        df['Detailed Description'] = df['Detailed Description'].apply(self.clean_text)
-        df['Instructor'] = df['Instructor'].apply(self.clean_text)
-        df['Level'] = df['Level'].apply(self.clean_text)
-        df['Duration'] = df['Duration'].apply(self.clean_text)
-
-        # Parse các trường list
-        df['What You\'ll Learn'] = df['What You\'ll Learn'].apply(self.parse_list_field)
-        df['Requirements'] = df['Requirements'].apply(self.parse_list_field)
-        df['Target Audience'] = df['Target Audience'].apply(self.parse_list_field)
-
-        # Xử lý rating
-        df['Rating'] = pd.to_numeric(df['Rating'], errors='coerce').fillna(0.0)
+                logger.info(f"ℹ️ CSV không phải {encoding}, thử encoding khác...")
 
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=list(CSV_COLUMNS))
+        logger.info(f"✅ Đã load {len(df)} courses từ CSV ({len(chunks)} chunks)")
         return df
 
-    def process_and_store_courses_fast(self, df: pd.DataFrame, sample_size: int = None):
-        """Xử lý và lưu courses vào ChromaDB - KHÔNG dùng embedding, rất nhanh"""
-        if sample_size:
+    def get_existing_fingerprints(self) -> Dict[str, str]:
+        """id -> fingerprint của các document đang có trong collection"""
+        existing = {}
+        offset = 0
+        while True:
+            page = self.collection.get(include=['metadatas'], limit=1000, offset=offset)
+            if not page['ids']:
+                break
+            for course_id, metadata in zip(page['ids'], page['metadatas']):
+                existing[course_id] = (metadata or {}).get('fingerprint', '')
+            offset += len(page['ids'])
+        return existing
+
+    def process_and_store_courses_fast(self, df: pd.DataFrame, sample_size: int = None, enrich: bool = False):
+        """
+        Ingest incremental vào ChromaDB - KHÔNG dùng embedding, rất nhanh
+        - ID ổn định theo Link/Title, fingerprint theo nội dung từng row (lưu trong metadata)
+        - Chỉ upsert row mới/thay đổi, xóa row không còn trong CSV (khi xử lý toàn bộ CSV)
+        - Resume: batch đã upsert mang fingerprint mới trong metadata, chạy lại sau khi bị ngắt sẽ coi là
+          không đổi và chỉ upsert phần còn lại (không cần file checkpoint)
+        - Embedding (model default của Chroma) tính song song trên embedding_workers, batch sau được embed
+          trong lúc batch trước đang upsert
+        enrich=True: sinh sẵn outcomes/requirements/audience vào metadata để API không cần gọi AI
+        """
+        full_sync = not sample_size or sample_size >= len(df)
+        if not full_sync:
             df = df.head(sample_size)
             logger.info(f"🧪 Đang xử lý {sample_size} courses mẫu...")
         else:
             logger.info(f"🚀 Đang xử lý {len(df)} courses...")
 
-        documents = []
-        metadatas = []
-        ids = []
+        df = df.assign(_id=self.course_ids(df), _fingerprint=self.course_fingerprints(df, enrich))
+        duplicated = df['_id'].duplicated()
+        if duplicated.any():
+            logger.info(f"ℹ️ Bỏ qua {int(duplicated.sum())} courses trùng Link/Title")
+            df = df[~duplicated]
+
+        existing = self.get_existing_fingerprints()
+        changed = df['_id'].map(existing).fillna('') != df['_fingerprint']
+        changed_ids = df.loc[changed, '_id'].tolist()
+        removed_ids = list(set(existing) - set(df['_id'])) if full_sync else []
+        pending = df[changed]
+
+        logger.info(
+            f"📋 Plan: {len(changed_ids)} mới/thay đổi, {len(df) - len(changed_ids)} không đổi, "
+            f"{len(removed_ids)} cần xóa"
+        )
 
+        embedder = self.create_embedder(pending) if len(pending) else None
+        started = time.perf_counter()
         successful = 0
+        embedding_wait = 0.0
+        write_time = 0.0
+        # Batch đã gửi đi embed nhưng chưa ghi; đủ sâu để mọi worker luôn có job trong lúc ghi Chroma
+        in_flight = deque()
+        pipeline_depth = 1
+        if embedder:
+            pipeline_depth = max(2, -(-embedder.workers * embedder.batch_size // INGEST_BATCH_SIZE) + 1)
+
+        def write_batch(ids, documents, metadatas, futures):
+            nonlocal successful, embedding_wait, write_time
+            embeddings = None
+            if futures is not None:
+                wait_started = time.perf_counter()
+                embeddings = embedder.gather(futures)
+                embedding_wait += time.perf_counter() - wait_started
+
+            write_started = time.perf_counter()
+            self.collection.upsert(documents=documents, metadatas=metadatas, ids=ids, embeddings=embeddings)
+            write_time += time.perf_counter() - write_started
+            successful += len(ids)
+            logger.info(f"✅ Đã upsert {successful}/{len(pending)} courses")
 
-        for course_idx, row in df.iterrows():
-            try:
-                if course_idx % 50 == 0:  # Log ít hơn để đỡ spam
-                    logger.info(f"📝 Đang xử lý course {course_idx + 1}/{len(df)}...")
+        try:
+            for start in range(0, len(pending), INGEST_BATCH_SIZE):
+                batch = pending.iloc[start:start + INGEST_BATCH_SIZE]
+                enrichments = self.build_enrichments(batch) if enrich else None
+
+                documents, metadatas = self.build_documents(batch, enrichments)
+                for metadata, fingerprint in zip(metadatas, batch['_fingerprint']):
+                    metadata['fingerprint'] = fingerprint
+
+                # Worker embed batch này trong lúc batch trước được ghi vào Chroma
+                futures = embedder.submit(documents) if embedder else None
+                in_flight.append((batch['_id'].tolist(), documents, metadatas, futures))
+                if len(in_flight) >= pipeline_depth:
+                    write_batch(*in_flight.popleft())
+
+            while in_flight:
+                write_batch(*in_flight.popleft())
+        finally:
+            if embedder:
+                embedder.shutdown()
+
+        elapsed = time.perf_counter() - started
+
+        if removed_ids:
+            for start in range(0, len(removed_ids), INGEST_BATCH_SIZE):
+                self.collection.delete(ids=removed_ids[start:start + INGEST_BATCH_SIZE])
+            logger.info(f"🗑️ Đã xóa {len(removed_ids)} courses không còn trong CSV")
+
+        if successful or removed_ids or not (index_dir(self.chroma_path, self.collection_name) / 'manifest.json').exists():
+            self.build_keyword_index()
+
+        self.last_ingest_stats = {
+            'upserted': successful,
+            'unchanged': len(df) - len(changed_ids),
+            'deleted': len(removed_ids),
+            'elapsed_s': round(elapsed, 2),
+            'rows_per_s': round(successful / elapsed, 1) if successful and elapsed else 0.0,
+            # Thời gian chờ embedding (pipeline chưa kịp) và thời gian ghi Chroma
+            'embedding_wait_s': round(embedding_wait, 2),
+            'write_s': round(write_time, 2),
+            'embedding': embedder.stats() if embedder else None,
+        }
+        logger.info(f"🎉 Hoàn thành! {self.last_ingest_stats}")
+        return successful
 
-                # Tạo document
-                document_text, metadata = self.create_course_document(row)
+    def build_keyword_index(self) -> dict:
+        """Build lại BM25 index (keyword search của hybrid retrieval) từ toàn bộ collection hiện tại"""
+        started = time.perf_counter()
+        manifest = build_index_from_collection(self.collection, index_dir(self.chroma_path, self.collection_name))
+        logger.info(
+            f"🔤 BM25 index: {manifest['count']} documents, {manifest['terms']} terms "
+            f"({time.perf_counter() - started:.2f}s)"
+        )
+        return manifest
 
-                # Tạo ID
-                course_id = f"course_{course_idx}"
+    def create_embedder(self, pending: pd.DataFrame) -> Optional[EmbeddingExecutor]:
+        """
+        Pool embedding cho lần ingest này (đã load model, batch size đã tune trên mẫu pending).
+        None -> Chroma tự embed trong upsert như cũ (embedding_workers=0 hoặc không tạo được process).
+        """
+        if self.embedding_workers <= 0:
+            return None
 
-                documents.append(document_text)
-                metadatas.append(metadata)
-                ids.append(course_id)
+        embedder = EmbeddingExecutor(workers=self.embedding_workers, batch_size=self.embedding_batch_size)
+        try:
+            if embedder.batch_size is None:
+                sample, _ = self.build_documents(pending.head(EMBEDDING_TUNE_SAMPLE_SIZE))
+                # Mỗi lần upsert chỉ có INGEST_BATCH_SIZE document -> job lớn hơn không có ý nghĩa
+                embedder.tune_batch_size(sample, [
+                    size for size in INGEST_EMBEDDING_BATCH_CANDIDATES if size <= INGEST_BATCH_SIZE
+                ])
+            warm_up_ms = embedder.start()
+        except OSError as e:
+            logger.warning(f"⚠️ Không tạo được embedding workers, để Chroma tự embed: {e}")
+            embedder.shutdown()
+            return None
+
+        logger.info(
+            f"🧮 Embedding: {embedder.workers} {embedder.backend} workers, batch {embedder.batch_size} "
+            f"(warm-up {warm_up_ms} ms)"
+        )
+        return embedder
 
-                successful += 1
+    def validate_collection(self, expected_count: int) -> None:
+        """Count check + smoke queries, raise nếu collection chưa sẵn sàng để serve"""
+        count = self.collection.count()
+        if count != expected_count:
+            raise RuntimeError(f"Collection {self.collection_name} có {count} documents, cần {expected_count}")
+
+        for query in SMOKE_QUERIES:
+            results = self.collection.query(query_texts=[query], n_results=3)
+            if not results['documents'] or not results['documents'][0]:
+                raise RuntimeError(f"Smoke query không có kết quả: '{query}'")
+        logger.info(f"✅ Validate {self.collection_name}: {count} documents, {len(SMOKE_QUERIES)} smoke queries OK")
+
+    def reindex_blue_green(self, df: pd.DataFrame, enrich: bool = False) -> dict:
+        """
+        Rebuild toàn bộ vào collection version mới (alias__v{n}) trong khi service vẫn serve version cũ,
+        validate rồi flip alias trong manifest (atomic). Xóa các version cũ hơn KEEP_COLLECTION_VERSIONS.
+        """
+        manifest = read_manifest(self.manifest_path) or {}
+        version = int(manifest.get('version', 0)) + 1
+        new_name = versioned_collection_name(self.alias, version)
+        logger.info(f"🔵🟢 Blue/green reindex: {manifest.get('active', self.alias)} -> {new_name}")
+
+        # Version này có thể còn sót từ lần reindex trước bị ngắt: giữ lại để resume qua fingerprint
+        self.open_collection(new_name)
+        self.process_and_store_courses_fast(df, enrich=enrich)
+        stats = self.last_ingest_stats
+        self.validate_collection(stats['upserted'] + stats['unchanged'])
+
+        manifest = write_manifest(
+            self.manifest_path, self.alias, new_name, version, count=self.collection.count()
+        )
+        logger.info(f"🔀 Alias '{self.alias}' -> {new_name}")
 
-                # Lưu theo batch để tránh memory issues
-                if len(documents) >= 100:
-                    self.collection.add(
-                        documents=documents,
-                        metadatas=metadatas,
-                        ids=ids
-                    )
-                    logger.info(f"✅ Đã lưu batch {len(documents)} courses")
-                    documents, metadatas, ids = [], [], []
+        self.drop_old_versions(version)
+        return manifest
 
-            except Exception as e:
-                logger.error(f"❌ Lỗi khi xử lý course {course_idx}: {e}")
+    def drop_old_versions(self, active_version: int) -> None:
+        """Xóa collection version cũ, giữ lại KEEP_COLLECTION_VERSIONS version gần nhất (kể cả active)"""
+        prefix = f"{self.alias}__v"
+        for collection in self.chroma_client.list_collections():
+            name = collection.name
+            if not name.startswith(prefix) or not name[len(prefix):].isdigit():
                 continue
-
-        # Lưu batch cuối cùng
-        if documents:
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            logger.info(f"✅ Đã lưu batch cuối {len(documents)} courses")
-
-        logger.info(f"🎉 Hoàn thành! Đã lưu {successful} courses vào ChromaDB")
-        return successful
+            if int(name[len(prefix):]) <= active_version - max(1, KEEP_COLLECTION_VERSIONS):
+                self.chroma_client.delete_collection(name)
+                shutil.rmtree(index_dir(self.chroma_path, name), ignore_errors=True)
+                logger.info(f"🗑️ Đã xóa version cũ: {name}")
 
     def get_collection_info(self):
         """Hiển thị thông tin collection"""
@@ -239,53 +608,54 @@ class UdemyCourseAnalyzer:
         return count
 
 def main():
-    """Hàm main để chạy script"""
+    """
+    Hàm main để chạy script (không hỏi input, cấu hình qua flag):
+        python courses_analyzer/data_analyzer.py --mode incremental
+        python courses_analyzer/data_analyzer.py --mode blue-green --enrich
+        python courses_analyzer/data_analyzer.py --mode rebuild --sample 200 --csv data/other.csv
+    """
+    parser = argparse.ArgumentParser(description="Ingest Udemy courses CSV vào ChromaDB")
+    parser.add_argument("--csv", default=str(Path(__file__).resolve().parent.parent / "data" / "UDEMY_2025.csv"),
+                        help="File CSV courses")
+    # Incremental mặc định; blue-green = build version mới rồi flip alias; rebuild = xóa và ingest lại tại chỗ
+    parser.add_argument("--mode", choices=("incremental", "blue-green", "rebuild"), default="incremental")
+    parser.add_argument("--sample", type=int, help="Chỉ xử lý N courses đầu (mặc định: tất cả)")
+    parser.add_argument("--enrich", action="store_true", help="Sinh sẵn outcomes/requirements/audience cho từng course")
+    parser.add_argument("--chunksize", type=int, default=CSV_CHUNK_SIZE, help="Số row đọc CSV mỗi chunk")
+    parser.add_argument("--embedding-workers", type=int, default=INGEST_EMBEDDING_WORKERS,
+                        help="Số worker tính embedding song song (0 = Chroma tự embed trong upsert)")
+    parser.add_argument("--embedding-batch-size", type=int, default=INGEST_EMBEDDING_BATCH_SIZE,
+                        help="Số document / job embedding (0 = tự đo chọn)")
+    args = parser.parse_args()
+
     print("🚀 Udemy Course Data Analyzer - Fast Version (No Embedding)")
     print("=" * 60)
 
-    # Khởi tạo analyzer
-    analyzer = UdemyCourseAnalyzer()
-
-    # File CSV path
-    csv_file = Path(__file__).resolve().parent.parent / "data" / "UDEMY_2025.csv"
-
-    if not os.path.exists(csv_file):
+    csv_file = Path(args.csv)
+    if not csv_file.exists():
         logger.error(f"❌ Không tìm thấy file: {csv_file}")
-        return
+        sys.exit(1)
 
-    # Load dữ liệu
-    df = analyzer.load_and_process_data(csv_file)
-
-    print(f"\n📊 Tổng số courses: {len(df)}")
-    print(f"🎯 3 courses đầu tiên:")
-    for idx, row in df.head(3).iterrows():
-        print(f"  {idx + 1}. {row['Title'][:80]}...")
-
-    # Hỏi sample size
-    print(f"\n⚡ PHƯƠNG PHÁP NHANH: Không dùng OpenAI Embedding")
-    print(f"   ChromaDB sẽ tự động xử lý text search")
-    print(f"\n🧪 Bạn muốn xử lý bao nhiêu courses?")
-    print("   (Nhập số, hoặc 'all' để xử lý tất cả)")
-    response = input("   Số lượng: ").strip().lower()
-
-    sample_size = None
-    if response != 'all' and response.isdigit():
-        sample_size = min(int(response), len(df))
-        print(f"   ✅ Sẽ xử lý {sample_size} courses")
-    else:
-        sample_size = len(df)
-        print(f"   ✅ Sẽ xử lý tất cả {sample_size} courses")
+    # Khởi tạo analyzer
+    analyzer = UdemyCourseAnalyzer(
+        rebuild=(args.mode == 'rebuild'),
+        embedding_workers=args.embedding_workers,
+        embedding_batch_size=args.embedding_batch_size
+    )
 
-    # Xác nhận
-    confirm = input(f"\n🚀 Bắt đầu xử lý NHANH? (y/n): ").strip().lower()
-    if confirm != 'y':
-        print("❌ Đã hủy")
-        return
+    # Load dữ liệu
+    df = analyzer.load_and_process_data(csv_file, chunksize=args.chunksize)
+    sample_size = min(args.sample, len(df)) if args.sample else len(df)
+    print(f"\n📊 Tổng số courses: {len(df)} - sẽ xử lý {sample_size} (mode={args.mode}, enrich={args.enrich})")
 
     # Xử lý
     print(f"\n⏳ Đang xử lý NHANH (không dùng embedding)...")
     start_time = time.time()
-    successful = analyzer.process_and_store_courses_fast(df, sample_size)
+    if args.mode == 'blue-green':
+        analyzer.reindex_blue_green(df.head(sample_size), enrich=args.enrich)
+        successful = analyzer.last_ingest_stats['upserted']
+    else:
+        successful = analyzer.process_and_store_courses_fast(df, sample_size, enrich=args.enrich)
     end_time = time.time()
 
     # Kết quả
@@ -293,7 +663,8 @@ def main():
 
     print(f"\n🎉 HOÀN THÀNH SIÊU NHANH!")
     print(f"⏱️  Thời gian: {end_time - start_time:.2f} giây")
-    print(f"📊 Courses processed: {successful}")
+    print(f"📊 Courses upserted: {successful} ({analyzer.last_ingest_stats})")
+    print(f"🚄 Throughput: {analyzer.last_ingest_stats['rows_per_s']} rows/s")
     print(f"💾 ChromaDB: {analyzer.chroma_path}")
     print(f"📚 Collection: {analyzer.collection_name}")
     print(f"✅ Documents: {final_count}")
@@ -1,29 +1,32 @@
 # main.py
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form  # ⬅️ THÊM IMPORT
+import argparse
+import asyncio
+import json
+import os
+import time
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request  # ⬅️ THÊM IMPORT
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 import uvicorn
 
 # Sửa import - dùng lazy initialization
-from utils.openai_client import get_openai_client, test_openai_connection
+from utils.openai_client import (
+    get_openai_client, get_async_openai_client, get_llm_response_cache,
+    close_async_openai_client, test_openai_connection
+)
 
 print("🚀 Đang khởi động Learning Assistant API...")
 
-# Kiểm tra kết nối OpenAI trước khi khởi động - SỬA CÁCH KIỂM TRA
-try:
-    client = get_openai_client()
-    if not client or not client.client:
-        print("❌ Không thể khởi động do lỗi kết nối OpenAI")
-        exit(1)
-
-    # Test connection chỉ khi client khả dụng
-    if not test_openai_connection():
-        print("❌ Kiểm tra kết nối OpenAI thất bại")
-        exit(1)
+# Bỏ qua test kết nối OpenAI (chat completion thật) khi warm-up - dùng cho autoscale/offline
+SKIP_CONNECTIVITY_CHECK = os.getenv("SKIP_CONNECTIVITY_CHECK", "0") == "1"
 
-except Exception as e:
-    print(f"❌ Lỗi khởi tạo OpenAI client: {e}")
-    exit(1)
+# Trạng thái khởi tạo của từng component, cập nhật bởi background warm-up
+startup_status = {
+    name: {"status": "pending", "detail": None, "elapsed_ms": None}
+    for name in ("openai", "chroma", "parser", "quiz_bank")
+}
 
 app = FastAPI(title="Learning Assistant API", version="1.0.0")
 
@@ -38,19 +41,141 @@ app.add_middleware(
 
 # Pydantic models
 class ProfileRequest(BaseModel):
-    profile_text: str
+    profile_text: str = ""
     career_goal: str = "Backend Developer"
+    profile_id: Optional[str] = None  # dùng profile analysis đã lưu qua /api/save-profile
+    min_rating: Optional[float] = None
+    min_duration_hours: Optional[float] = None
 
 class QuizRequest(BaseModel):
-    profile_text: str
+    profile_text: str = ""
     career_goal: str
     quiz_type: str = "pre-quiz"
+    profile_id: Optional[str] = None
 
 class ProfileTextIn(BaseModel):
     profile_text: str
 
+class BatchRecommendRequest(BaseModel):
+    requests: List[ProfileRequest]
+    top_k: int = 5
+    min_rating: Optional[float] = None
+    min_duration_hours: Optional[float] = None
+
+class BatchProfileItem(BaseModel):
+    id: Optional[str] = None
+    profile_text: str
+
+class BatchNormalizeRequest(BaseModel):
+    profiles: List[BatchProfileItem]
+    concurrency: Optional[int] = None  # mặc định PROFILE_BATCH_CONCURRENCY
+    pack_short_profiles: bool = True  # gộp CV ngắn vào chung 1 prompt
+
 class NormalizedProfileIn(BaseModel):
     normalized_profile: dict
+    profile_id: Optional[str] = None  # cập nhật profile đã lưu
+
+async def run_until_disconnected(http_request: Request, coro):
+    """Chạy coroutine, hủy nó (và các LLM call bên trong) nếu client ngắt kết nối"""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=0.5)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                print("⚠️ Client disconnected, cancelling request")
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def load_profile_analysis(profile_id: Optional[str]) -> Optional[dict]:
+    """Profile analysis đã lưu theo profile_id (None nếu request không có profile_id)"""
+    if not profile_id:
+        return None
+    profile = get_saved_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    return profile
+
+def load_profile_analyses(profile_ids: List[Optional[str]]) -> List[Optional[dict]]:
+    """load_profile_analysis cho nhiều profile_id (1 lần chạy trong thread cho cả batch)"""
+    return [load_profile_analysis(profile_id) for profile_id in profile_ids]
+
+async def _init_component(name: str, init):
+    """Chạy hàm init (blocking: trong thread, async: await trực tiếp), ghi lại trạng thái component"""
+    started = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(init):
+            ok, detail = await init()
+        else:
+            ok, detail = await asyncio.to_thread(init)
+        startup_status[name]["status"] = ok
+        startup_status[name]["detail"] = detail
+    except Exception as e:
+        startup_status[name]["status"] = "failed"
+        startup_status[name]["detail"] = str(e)
+    startup_status[name]["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"🔧 {name}: {startup_status[name]['status']} ({startup_status[name]['elapsed_ms']} ms)")
+
+def _init_openai():
+    client = get_openai_client()
+    get_async_openai_client()
+    if not client.client:
+        return "failed", "OpenAI client not initialized (missing API key?)"
+    if SKIP_CONNECTIVITY_CHECK:
+        return "ready", "connectivity check skipped"
+    if not test_openai_connection():
+        return "failed", "connectivity check failed"
+    return "ready", None
+
+def _init_chroma():
+    service = get_chroma_service()
+    if not getattr(service, "collection", None):
+        return "failed", f"collection '{service.collection_name}' not available"
+    return "ready", None
+
+def _init_parser():
+    elapsed_ms = get_parsing_executor().start()
+    return "ready", f"{get_parsing_executor().workers} workers warm in {elapsed_ms} ms"
+
+async def _init_quiz_bank():
+    startup_status["quiz_bank"]["status"] = "warming"
+    bank = await asyncio.to_thread(get_post_quiz_bank)
+    await bank.warm(QUIZ_BANK_WARM_GOALS)
+    return "ready", None
+
+async def warm_up():
+    """Khởi tạo các resource nặng ở background, API đã nhận request ngay"""
+    await asyncio.gather(
+        _init_component("openai", _init_openai),
+        _init_component("chroma", _init_chroma),
+        _init_component("parser", _init_parser)
+    )
+
+    if startup_status["openai"]["status"] != "ready":
+        startup_status["quiz_bank"]["status"] = "skipped"
+        startup_status["quiz_bank"]["detail"] = "OpenAI not ready"
+        return
+
+    await _init_component("quiz_bank", _init_quiz_bank)
+
+@app.on_event("startup")
+async def start_warm_up():
+    # Chạy ở background để không chặn startup
+    app.state.warm_up_task = asyncio.ensure_future(warm_up())
+
+async def ndjson_stream(events):
+    """Chuyển async generator các event dict thành NDJSON (1 JSON mỗi dòng)"""
+    async for event in events:
+        yield json.dumps(event, ensure_ascii=False) + "\n"
+
+@app.on_event("shutdown")
+async def shutdown_openai_clients():
+    await close_async_openai_client()
+    shutdown_parsing_executor()
 
 # API routes
 @app.get("/")
@@ -61,16 +186,41 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "Learning Assistant"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Sẵn sàng khi OpenAI và ChromaDB đã khởi tạo xong (quiz bank warm-up không bắt buộc)"""
+    ready = all(startup_status[name]["status"] == "ready" for name in ("openai", "chroma"))
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "components": startup_status}
+    )
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    service = await asyncio.to_thread(get_chroma_service)
+    cache = service.enrichment_cache
+    llm_cache = get_llm_response_cache()
+    upload_cache, profile_cache = get_profile_caches()
+    return {
+        "enrichment_cache": cache.stats() if cache is not None else None,
+        "llm_response_cache": llm_cache.stats() if llm_cache is not None else None,
+        "post_quiz_bank": get_post_quiz_bank().stats(),
+        "parsed_upload_cache": upload_cache.stats() if upload_cache is not None else None,
+        "normalized_profile_cache": profile_cache.stats() if profile_cache is not None else None
+    }
+
 # Endpoint: upload file (pdf/docx/txt), trả về JSON normalized và content để frontend review
 @app.post("/api/upload-profile")
 async def upload_profile_file(file: UploadFile = File(...)):  # ⬅️ ĐÃ CÓ IMPORT
     try:
         filename = file.filename
         content = await file.read()
-        text, detected = extract_text_from_file(filename, content)
+        text, detected = await extract_profile_text(filename, content)
         # call OpenAI normalize
-        normalized = normalize_profile(text)
+        normalized = await normalize_profile_async(text)
         return {"ok": True, "detected_type": detected, "raw_text": text, "normalized_profile": normalized}
+    except ParsingError as e:
+        raise HTTPException(status_code=422, detail=f"Không parse được file: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload/parse error: {e}")
 
@@ -82,80 +232,212 @@ def api_normalize_profile(payload: ProfileTextIn):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Normalization error: {e}")
 
+@app.post("/api/normalize-profiles/batch")
+async def api_normalize_profiles_batch(request: BatchNormalizeRequest):
+    """
+    NDJSON stream: mỗi CV 1 dòng (event 'item' kèm status) theo thứ tự hoàn thành,
+    dòng cuối là event 'report' (throughput, token usage)
+    """
+    print(f"📦 API: Batch normalize - {len(request.profiles)} profiles")
+    items = [
+        {"id": item.id if item.id is not None else str(index), "profile_text": item.profile_text}
+        for index, item in enumerate(request.profiles)
+    ]
+    return StreamingResponse(
+        ndjson_stream(normalize_profiles_batch(
+            items, concurrency=max(1, request.concurrency or PROFILE_BATCH_CONCURRENCY),
+            pack=request.pack_short_profiles
+        )),
+        media_type="application/x-ndjson"
+    )
+
 # Save normalized JSON
 @app.post("/api/save-profile")
-def api_save_profile(payload: NormalizedProfileIn):
+async def api_save_profile(payload: NormalizedProfileIn):
     try:
-        final = save_normalized_profile(payload.normalized_profile)
-        return {"ok": True, "normalized_profile": final, "saved_path": str(PROFILE_PATH)}
+        final = await asyncio.to_thread(save_normalized_profile, payload.normalized_profile, payload.profile_id)
+        return {
+            "ok": True,
+            "profile_id": final["profile_id"],
+            "normalized_profile": final,
+            "saved_path": str(PROFILE_PATH)
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Save error: {e}")
 
+@app.get("/api/profiles/{profile_id}")
+async def api_get_profile(profile_id: str):
+    profile = await asyncio.to_thread(load_profile_analysis, profile_id)
+    return {"ok": True, "profile_id": profile_id, "normalized_profile": profile}
+
 @app.post("/api/generate-quiz")
-async def api_generate_quiz(request: QuizRequest):
+async def api_generate_quiz(request: QuizRequest, http_request: Request):
     print(f"📝 API: Generate quiz - {request.quiz_type}")
     try:
-        result = await generate_quiz(request.profile_text, request.career_goal, request.quiz_type)
+        profile_analysis = await asyncio.to_thread(load_profile_analysis, request.profile_id)
+        result = await run_until_disconnected(
+            http_request,
+            generate_quiz(request.profile_text, request.career_goal, request.quiz_type, profile_analysis)
+        )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi tạo quiz: {str(e)}")
 
+@app.post("/api/generate-quiz/stream")
+async def api_generate_quiz_stream(request: QuizRequest):
+    """NDJSON stream: mỗi câu hỏi 1 dòng ngay khi được tạo xong, kết thúc bằng event 'summary'"""
+    print(f"📝 API: Stream quiz - {request.quiz_type}")
+    profile_analysis = await asyncio.to_thread(load_profile_analysis, request.profile_id)
+    return StreamingResponse(
+        ndjson_stream(stream_quiz(request.career_goal, request.quiz_type, profile_analysis)),
+        media_type="application/x-ndjson"
+    )
+
 @app.post("/api/recommend-courses")
-async def api_recommend_courses(request: ProfileRequest):
+async def api_recommend_courses(request: ProfileRequest, http_request: Request):
     print(f"🎓 API: Recommend courses - {request.career_goal}")
     try:
-        result = await recommend_courses(request.profile_text, request.career_goal)
+        profile_analysis = await asyncio.to_thread(load_profile_analysis, request.profile_id)
+        result = await run_until_disconnected(
+            http_request,
+            recommend_courses(
+                request.profile_text, request.career_goal, profile_analysis,
+                min_rating=request.min_rating, min_duration_hours=request.min_duration_hours
+            )
+        )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi gợi ý khóa học: {str(e)}")
 
+@app.post("/api/recommend-courses/batch")
+async def api_recommend_courses_batch(request: BatchRecommendRequest, http_request: Request):
+    """Recommend cho nhiều profile, kết quả theo đúng thứ tự requests"""
+    print(f"🎓 API: Batch recommend courses - {len(request.requests)} profiles")
+    try:
+        profile_analyses = await asyncio.to_thread(
+            load_profile_analyses, [item.profile_id for item in request.requests]
+        )
+        requests = [
+            {"career_goal": item.career_goal, "profile_analysis": profile_analysis}
+            for item, profile_analysis in zip(request.requests, profile_analyses)
+        ]
+        results = await run_until_disconnected(
+            http_request,
+            recommend_courses_batch(
+                requests, top_k=max(1, request.top_k),
+                min_rating=request.min_rating, min_duration_hours=request.min_duration_hours
+            )
+        )
+        return {"results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi gợi ý khóa học: {str(e)}")
+
+@app.post("/api/recommend-courses/stream")
+async def api_recommend_courses_stream(request: ProfileRequest):
+    """
+    NDJSON stream: dòng đầu là danh sách course đã xếp hạng, sau đó mỗi dòng là
+    1 course đã được AI enhance (theo thứ tự hoàn thành), cuối cùng là event 'done'
+    """
+    print(f"🎓 API: Stream recommend courses - {request.career_goal}")
+    profile_analysis = await asyncio.to_thread(load_profile_analysis, request.profile_id)
+
+    return StreamingResponse(
+        ndjson_stream(stream_recommend_courses(
+            request.profile_text, request.career_goal, profile_analysis,
+            min_rating=request.min_rating, min_duration_hours=request.min_duration_hours
+        )),
+        media_type="application/x-ndjson"
+    )
+
 @app.post("/api/generate-post-quiz")
-async def api_generate_post_quiz(request: QuizRequest):
+async def api_generate_post_quiz(request: QuizRequest, http_request: Request):
     print(f"📝 API: Generate post-quiz")
     try:
-        result = await generate_post_quiz(request.career_goal)
+        result = await run_until_disconnected(http_request, generate_post_quiz(request.career_goal))
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi tạo post-quiz: {str(e)}")
 
+@app.post("/api/generate-post-quiz/stream")
+async def api_generate_post_quiz_stream(request: QuizRequest):
+    print(f"📝 API: Stream post-quiz")
+    return StreamingResponse(
+        ndjson_stream(stream_quiz(request.career_goal, "post-quiz")),
+        media_type="application/x-ndjson"
+    )
+
 # API routes - THÊM endpoint mới
 @app.post("/api/upload-and-analyze")
-async def upload_and_analyze(file: UploadFile = File(...), career_goal: str = Form("Backend Developer")):
+async def upload_and_analyze(http_request: Request, file: UploadFile = File(...), career_goal: str = Form("Backend Developer")):
     """
     Upload CV → Parse → Analyze → Generate Pre-quiz
+    Parse chạy trong process pool, retrieve khóa học theo career_goal chạy song song
     """
     try:
         print(f"📄 Đang xử lý CV upload cho: {career_goal}")
 
-        # 1. Parse file
         filename = file.filename
         content = await file.read()
-        text, detected = extract_text_from_file(filename, content)
-
-        # 2. Analyze profile với AI
-        profile_analysis = normalize_profile(text)
-
-        # 3. Generate pre-quiz dựa trên analysis
-        quiz_result = await generate_quiz(text, career_goal, "pre-quiz", profile_analysis)
+        result = await run_until_disconnected(
+            http_request, analyze_uploaded_cv(filename, content, career_goal)
+        )
+        text = result["text"]
 
         return {
             "ok": True,
-            "detected_type": detected,
+            "detected_type": result["detected_type"],
             "raw_text_preview": text[:500] + "..." if len(text) > 500 else text,
-            "profile_analysis": profile_analysis,
-            "pre_quiz": quiz_result
+            "profile_analysis": result["profile_analysis"],
+            "pre_quiz": result["pre_quiz"],
+            "course_candidates": result["course_candidates"],
+            "timings": result["timings"]
         }
 
+    except HTTPException:
+        raise
+    except ParsingError as e:
+        raise HTTPException(status_code=422, detail=f"Không parse được file: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload/analyze error: {e}")
 
 # THÊM các import cần thiết
-from services.profile_service import normalize_profile, save_normalized_profile, PROFILE_PATH
-from utils.file_parser import extract_text_from_file
-from services.quiz_service import generate_quiz, generate_post_quiz
-from services.course_service import recommend_courses
+from services.profile_service import (
+    normalize_profile, normalize_profile_async, save_normalized_profile, get_saved_profile,
+    extract_profile_text, get_profile_caches, PROFILE_PATH
+)
+from utils.parsing_executor import (
+    ParsingError, get_parsing_executor, shutdown_parsing_executor
+)
+from services.quiz_service import generate_quiz, generate_post_quiz, stream_quiz, get_post_quiz_bank
+from services.quiz_bank import QUIZ_BANK_WARM_GOALS
+from services.course_service import (
+    recommend_courses, recommend_courses_batch, stream_recommend_courses, get_chroma_service
+)
+from services.upload_pipeline import analyze_uploaded_cv
+from services.profile_batch import normalize_profiles_batch, PROFILE_BATCH_CONCURRENCY
 
 if __name__ == "__main__":
-    print("✅ Khởi động thành công! Truy cập: http://localhost:8000")
-    print("📚 API Documentation: http://localhost:8000/docs")
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description="Learning Assistant API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--no-reload", action="store_true", help="Tắt auto-reload (production)")
+    parser.add_argument("--skip-connectivity-check", action="store_true",
+                        help="Không gọi thử OpenAI khi warm-up")
+    args = parser.parse_args()
+
+    # Truyền qua env để worker của reloader cũng nhận được
+    if args.skip_connectivity_check:
+        os.environ["SKIP_CONNECTIVITY_CHECK"] = "1"
+
+    print(f"✅ Khởi động thành công! Truy cập: http://localhost:{args.port}")
+    print(f"📚 API Documentation: http://localhost:{args.port}/docs")
+    print(f"🩺 Readiness: http://localhost:{args.port}/ready")
+    uvicorn.run("main:app", host=args.host, port=args.port, reload=not args.no_reload)
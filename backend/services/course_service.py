@@ -1,20 +1,94 @@
 # services/course_service.py
-import chromadb
-from chromadb.config import Settings
+import asyncio
+import json
 import os
-from typing import List, Dict, Any
-from utils.openai_client import openai_client
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from utils.openai_client import get_async_openai_client
+from utils.disk_cache import SQLiteCache, content_hash, env_float
+from utils.collection_manifest import manifest_path, read_manifest
+from utils.bm25_index import BM25Index, BM25IndexError, index_dir, reciprocal_rank_fusion
+
+# Giới hạn số lời gọi AI enhance chạy song song và deadline cho mỗi lời gọi (giây)
+AI_ENHANCE_CONCURRENCY = int(os.getenv('AI_ENHANCE_CONCURRENCY', '5'))
+AI_ENHANCE_TIMEOUT = float(os.getenv('AI_ENHANCE_TIMEOUT', '20'))
+
+# Cache nội dung AI-generated (outcomes/requirements/audience) trên disk
+# ENRICHMENT_CACHE_SCOPE: 'profile' = key theo course + profile, 'course' = chỉ theo course (dùng chung cho mọi
+# profile, prompt không chứa profile)
+ENRICHMENT_CACHE_PATH = os.getenv('ENRICHMENT_CACHE_PATH', './cache/enrichment.sqlite3')
+ENRICHMENT_CACHE_SCOPE = os.getenv('ENRICHMENT_CACHE_SCOPE', 'profile').lower()
+ENRICHMENT_CACHE_TTL = env_float('ENRICHMENT_CACHE_TTL') or 7 * 24 * 3600
+ENRICHMENT_CACHE_MAX_ENTRIES = int(os.getenv('ENRICHMENT_CACHE_MAX_ENTRIES', '50000'))
+
+# Level phù hợp với từng experience level (giá trị metadata 'level' đã lower-case lúc ingest)
+LEVEL_MAPPING = {
+    'beginner': ['beginner', 'all levels'],
+    'intermediate': ['beginner', 'intermediate', 'all levels'],
+    'advanced': ['beginner', 'intermediate', 'advanced', 'expert', 'all levels'],
+    'expert': ['beginner', 'intermediate', 'advanced', 'expert', 'all levels'],
+}
+DEFAULT_LEVELS = ['all levels']
+# Course không rõ level luôn được chấp nhận
+UNSPECIFIED_LEVELS = ['unknown level', '']
+
+# Ngưỡng tối thiểu mặc định cho rating / thời lượng (giờ), không set = không lọc
+COURSE_MIN_RATING = env_float('COURSE_MIN_RATING')
+COURSE_MIN_DURATION_HOURS = env_float('COURSE_MIN_DURATION_HOURS')
+
+# Số query tối đa trong 1 lần collection.query của search_courses_batch
+CHROMA_QUERY_BATCH_SIZE = int(os.getenv('CHROMA_QUERY_BATCH_SIZE', '64'))
+
+# Chu kỳ (giây) kiểm tra manifest alias để chuyển sang collection version mới (blue/green)
+COLLECTION_MANIFEST_CHECK_INTERVAL = float(os.getenv('COLLECTION_MANIFEST_CHECK_INTERVAL', '5'))
+
+# Hybrid search: gộp dense (Chroma) với BM25 index build lúc ingest bằng reciprocal rank fusion
+HYBRID_SEARCH_ENABLED = os.getenv('HYBRID_SEARCH_ENABLED', '1') == '1'
+# Số candidate lấy từ mỗi nhánh (dense / BM25) trước khi fuse
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '20'))
+
+# Dùng enrichment sinh sẵn lúc ingest (metadata 'enrichment') thay vì gọi AI trên hot path
+USE_PRECOMPUTED_ENRICHMENT = os.getenv('USE_PRECOMPUTED_ENRICHMENT', '1') == '1'
 
 class ChromaDBCourseService:
     def __init__(self):
         self.chroma_path = './chroma_db'
-        self.collection_name = 'udemy_courses'
+        # Alias; nếu có manifest (blue/green reindex) thì collection thật là version đang active
+        self.alias = 'udemy_courses'
+        self.manifest_path = manifest_path(self.chroma_path, self.alias)
+        self._manifest_mtime = self._get_manifest_mtime()
+        self._manifest_checked_at = time.monotonic()
+        self._refresh_lock = threading.Lock()
+        manifest = read_manifest(self.manifest_path)
+        self.collection_name = manifest['active'] if manifest else self.alias
+        self.enhance_concurrency = max(1, AI_ENHANCE_CONCURRENCY)
+        self.enhance_timeout = AI_ENHANCE_TIMEOUT
+        self.enrichment_cache_scope = ENRICHMENT_CACHE_SCOPE
+
+        try:
+            self.enrichment_cache = SQLiteCache(
+                ENRICHMENT_CACHE_PATH,
+                table='course_enrichment',
+                ttl_seconds=ENRICHMENT_CACHE_TTL,
+                max_entries=ENRICHMENT_CACHE_MAX_ENTRIES
+            )
+        except Exception as e:
+            print(f"⚠️ Enrichment cache disabled: {e}")
+            self.enrichment_cache = None
+
+        self.collection = None
+        self.keyword_index = None
+        self._keyword_index_key = None
 
         print(f"🔍 Initializing ChromaDB...")
         print(f"   Path: {self.chroma_path}")
         print(f"   Collection: {self.collection_name}")
 
         try:
+            # Import chậm (~1s) nên chỉ import khi service thực sự được khởi tạo
+            import chromadb
+
             self.client = chromadb.PersistentClient(path=self.chroma_path)
             print("✅ ChromaDB client created")
 
@@ -31,43 +105,283 @@ class ChromaDBCourseService:
 
             count = self.collection.count()
             print(f"📊 Total documents in collection: {count}")
+            self.refresh_keyword_index()
 
         except Exception as e:
             print(f"❌ Failed to initialize ChromaDB: {e}")
             self.collection = None
 
-    def search_courses(self, query: str, profile_analysis: dict, top_k: int = 5) -> List[Dict[str, Any]]:
+    def _get_manifest_mtime(self) -> Optional[float]:
+        try:
+            return self.manifest_path.stat().st_mtime
+        except OSError:
+            return None
+
+    def refresh_collection(self) -> None:
+        """
+        Nếu manifest alias thay đổi (reindex đã flip sang version mới) thì chuyển sang collection mới.
+        Request đang chạy vẫn dùng collection cũ cho tới khi xong; version cũ được giữ lại sau flip.
+        """
+        with self._refresh_lock:
+            now = time.monotonic()
+            if now - self._manifest_checked_at < COLLECTION_MANIFEST_CHECK_INTERVAL:
+                return
+            self._manifest_checked_at = now
+            # Ingest incremental build lại BM25 index của cùng collection
+            self.refresh_keyword_index()
+
+            mtime = self._get_manifest_mtime()
+            if mtime is None or mtime == self._manifest_mtime or not hasattr(self, 'client'):
+                return
+
+            manifest = read_manifest(self.manifest_path)
+            if not manifest:
+                return
+            self._manifest_mtime = mtime
+            if manifest['active'] == self.collection_name and self.collection is not None:
+                return
+
+            try:
+                collection = self.client.get_collection(manifest['active'])
+            except Exception as e:
+                print(f"❌ Không mở được collection '{manifest['active']}', giữ '{self.collection_name}': {e}")
+                return
+
+            print(f"🔀 Switch collection: {self.collection_name} -> {manifest['active']}")
+            self.collection, self.collection_name = collection, manifest['active']
+            self.refresh_keyword_index()
+
+    async def refresh_collection_async(self) -> None:
+        """refresh_collection cho async handler: stat manifest, mở collection, load BM25 index trong thread"""
+        if time.monotonic() - self._manifest_checked_at < COLLECTION_MANIFEST_CHECK_INTERVAL:
+            return
+        await asyncio.to_thread(self.refresh_collection)
+
+    def refresh_keyword_index(self) -> None:
+        """Load (lại) BM25 index của collection hiện tại khi index mới được build; không có index -> chỉ dense"""
+        if not HYBRID_SEARCH_ENABLED:
+            return
+        path = index_dir(self.chroma_path, self.collection_name)
+        try:
+            key = (str(path), (path / 'manifest.json').stat().st_mtime)
+        except OSError:
+            key = None
+        if key == self._keyword_index_key:
+            return
+        self._keyword_index_key = key
+
+        if key is None:
+            print(f"ℹ️ Không có BM25 index cho '{self.collection_name}', search chỉ dùng dense")
+            self.keyword_index = None
+            return
+        try:
+            self.keyword_index = BM25Index(path)
+            print(f"✅ BM25 index loaded: {self.keyword_index.count} documents, {len(self.keyword_index.vocab)} terms")
+        except (BM25IndexError, OSError, ValueError, KeyError) as e:
+            print(f"❌ Không load được BM25 index {path}: {e}")
+            self.keyword_index = None
+
+    async def search_courses(self, query: str, profile_analysis: dict, top_k: int = 5,
+                             min_rating: Optional[float] = None,
+                             min_duration_hours: Optional[float] = None) -> List[Dict[str, Any]]:
         """
         Search courses từ ChromaDB và enhance với AI-generated content
         """
+        await self.refresh_collection_async()
         if not self.collection:
             print("❌ ChromaDB collection not available")
             return []
 
         try:
-            enhanced_query = self._enhance_query(query, profile_analysis)
-            print(f"🔍 Searching with query: {enhanced_query}")
-
-            results = self.collection.query(
-                query_texts=[enhanced_query],
-                n_results=top_k * 2,
-                include=['documents', 'metadatas', 'distances']
-            )
-
-            print(f"📈 Raw results: {len(results['documents'][0])} documents")
-
-            courses = self._process_chroma_results(results, profile_analysis)
+            courses = await self.retrieve_courses(query, profile_analysis, top_k, min_rating, min_duration_hours)
 
             # Enhance courses với AI-generated outcomes, requirements, audience
-            enhanced_courses = self._enhance_courses_with_ai(courses, profile_analysis)
+            enhanced_courses = await self._enhance_courses_with_ai(courses, profile_analysis)
 
             print(f"✅ Enhanced courses: {len(enhanced_courses)}")
-            return enhanced_courses[:top_k]
+            if self.enrichment_cache is not None:
+                print(f"📦 Enrichment cache hit rate: {self.enrichment_cache.hit_rate:.0%}")
+            return enhanced_courses
 
         except Exception as e:
             print(f"❌ Error searching ChromaDB: {e}")
             return []
 
+    async def retrieve_courses(self, query: str, profile_analysis: dict, top_k: int = 5,
+                               min_rating: Optional[float] = None,
+                               min_duration_hours: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Query ChromaDB (trong thread) và trả về top_k courses phù hợp đã xếp hạng, chưa enhance"""
+        await self.refresh_collection_async()
+        collection = self.collection
+        if not collection:
+            print("❌ ChromaDB collection not available")
+            return []
+
+        enhanced_query = self._enhance_query(query, profile_analysis)
+        where = self.build_where_filter(profile_analysis, min_rating, min_duration_hours)
+        keyword_index = self.keyword_index
+        print(f"🔍 Searching with query: {enhanced_query} (where: {where})")
+
+        # Filter chạy trong Chroma nên top_k kết quả đều hợp lệ; hybrid lấy thêm candidate để fuse
+        results = await asyncio.to_thread(
+            collection.query,
+            query_texts=[enhanced_query],
+            n_results=max(top_k, HYBRID_CANDIDATES) if keyword_index else top_k,
+            where=where,
+            include=['documents', 'metadatas', 'distances']
+        )
+
+        print(f"📈 Raw results: {len(results['documents'][0])} documents")
+        if keyword_index:
+            results = await self._fuse_keyword_results(
+                collection, keyword_index, results, [enhanced_query],
+                self.keyword_filter(profile_analysis, min_rating, min_duration_hours), top_k
+            )
+
+        return self._process_chroma_results(results, profile_analysis)
+
+    def suitable_levels(self, profile_analysis: dict) -> List[str]:
+        """Các giá trị metadata 'level' phù hợp với experience level của profile"""
+        user_level = (profile_analysis.get('experience_level') or '').lower()
+        return LEVEL_MAPPING.get(user_level, DEFAULT_LEVELS) + UNSPECIFIED_LEVELS
+
+    def keyword_filter(self, profile_analysis: dict, min_rating: Optional[float] = None,
+                       min_duration_hours: Optional[float] = None) -> Dict[str, Any]:
+        """Cùng rule với build_where_filter, dạng tham số cho BM25Index.search"""
+        return {
+            'levels': self.suitable_levels(profile_analysis),
+            'min_rating': min_rating if min_rating is not None else COURSE_MIN_RATING,
+            'min_duration_hours': min_duration_hours if min_duration_hours is not None else COURSE_MIN_DURATION_HOURS,
+        }
+
+    def build_where_filter(self, profile_analysis: dict, min_rating: Optional[float] = None,
+                           min_duration_hours: Optional[float] = None) -> Dict[str, Any]:
+        """Compile rule level (+ ngưỡng rating/duration) thành Chroma where filter"""
+        min_rating = min_rating if min_rating is not None else COURSE_MIN_RATING
+        min_duration_hours = min_duration_hours if min_duration_hours is not None else COURSE_MIN_DURATION_HOURS
+
+        conditions = [{'level': {'$in': self.suitable_levels(profile_analysis)}}]
+        if min_rating:
+            conditions.append({'rating': {'$gte': float(min_rating)}})
+        if min_duration_hours:
+            conditions.append({'duration_hours': {'$gte': float(min_duration_hours)}})
+
+        return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+    async def search_courses_batch(self, searches: List[Tuple[str, dict]], top_k: int = 5,
+                                   min_rating: Optional[float] = None,
+                                   min_duration_hours: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search cho nhiều (query, profile_analysis) cùng lúc:
+        - Các query có cùng where filter (cùng level) được gửi trong 1 collection.query
+          (chia chunk CHROMA_QUERY_BATCH_SIZE)
+        - Enhancement của mọi profile dùng chung semaphore + enrichment cache
+        Trả về list {'courses', 'error'} theo đúng thứ tự searches; 'error' khác None khi
+        query của item đó lỗi (để phân biệt với không có course nào khớp).
+        """
+        await self.refresh_collection_async()
+        collection = self.collection
+        keyword_index = self.keyword_index
+        if not collection:
+            print("❌ ChromaDB collection not available")
+            return [{'courses': [], 'error': 'ChromaDB collection not available'} for _ in searches]
+
+        # Gom query theo where filter - Chroma chỉ nhận 1 filter cho mỗi lần query
+        groups = {}
+        for index, (query, profile_analysis) in enumerate(searches):
+            where = self.build_where_filter(profile_analysis, min_rating, min_duration_hours)
+            group = groups.setdefault(json.dumps(where, sort_keys=True), {
+                'where': where,
+                'keyword_filter': self.keyword_filter(profile_analysis, min_rating, min_duration_hours),
+                'indexes': [],
+                'queries': []
+            })
+            group['indexes'].append(index)
+            group['queries'].append(self._enhance_query(query, profile_analysis))
+        print(f"🔍 Batch searching {len(searches)} queries ({len(groups)} filters)")
+
+        all_courses = [[] for _ in searches]
+        errors = [None] * len(searches)
+        for group in groups.values():
+            for start in range(0, len(group['queries']), CHROMA_QUERY_BATCH_SIZE):
+                chunk = group['queries'][start:start + CHROMA_QUERY_BATCH_SIZE]
+                try:
+                    results = await asyncio.to_thread(
+                        collection.query,
+                        query_texts=chunk,
+                        n_results=max(top_k, HYBRID_CANDIDATES) if keyword_index else top_k,
+                        where=group['where'],
+                        include=['documents', 'metadatas', 'distances']
+                    )
+                    if keyword_index:
+                        results = await self._fuse_keyword_results(
+                            collection, keyword_index, results, chunk, group['keyword_filter'], top_k
+                        )
+                except Exception as e:
+                    print(f"❌ Error batch searching ChromaDB: {e}")
+                    for offset in range(len(chunk)):
+                        errors[group['indexes'][start + offset]] = f"{type(e).__name__}: {e}"
+                    continue
+
+                for offset in range(len(chunk)):
+                    index = group['indexes'][start + offset]
+                    all_courses[index] = self._process_chroma_results(
+                        results, searches[index][1], query_index=offset
+                    )
+
+        semaphore = asyncio.Semaphore(self.enhance_concurrency)
+        enhanced = await asyncio.gather(*(
+            asyncio.gather(*(self._enhance_course(course, profile_analysis, semaphore) for course in courses))
+            for courses, (_, profile_analysis) in zip(all_courses, searches)
+        ))
+
+        if self.enrichment_cache is not None:
+            print(f"📦 Enrichment cache hit rate: {self.enrichment_cache.hit_rate:.0%}")
+        return [{'courses': list(courses), 'error': error} for courses, error in zip(enhanced, errors)]
+
+    async def _fuse_keyword_results(self, collection, keyword_index: BM25Index, results: Any, queries: List[str],
+                                    keyword_filter: Dict[str, Any], top_k: int) -> Dict[str, list]:
+        """
+        Gộp kết quả dense của từng query với top BM25 (cùng filter) bằng reciprocal rank fusion.
+        Trả về cùng format với collection.query (thêm 'scores' = điểm RRF), top_k / query theo thứ tự fuse.
+        Course chỉ có trong BM25 được lấy document/metadata bằng 1 lần collection.get cho cả batch.
+        """
+        started = time.perf_counter()
+        rankings = []
+        for query_index, query in enumerate(queries):
+            dense = {
+                course_id: (document, metadata, distance)
+                for course_id, document, metadata, distance in zip(
+                    results['ids'][query_index], results['documents'][query_index],
+                    results['metadatas'][query_index], results['distances'][query_index]
+                )
+            }
+            keyword_ids = [course_id for course_id, _ in keyword_index.search(query, HYBRID_CANDIDATES, **keyword_filter)]
+            rankings.append((dense, reciprocal_rank_fusion([results['ids'][query_index], keyword_ids])[:top_k]))
+
+        keyword_only = {}
+        missing = list({course_id for dense, ranked in rankings for course_id, _ in ranked if course_id not in dense})
+        if missing:
+            extra = await asyncio.to_thread(collection.get, ids=missing, include=['documents', 'metadatas'])
+            for course_id, document, metadata in zip(extra['ids'], extra['documents'], extra['metadatas']):
+                keyword_only[course_id] = (document, metadata, None)
+
+        fused = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'scores': []}
+        for dense, ranked in rankings:
+            rows = [
+                (course_id, score, dense.get(course_id) or keyword_only[course_id])
+                for course_id, score in ranked if course_id in dense or course_id in keyword_only
+            ]
+            fused['ids'].append([course_id for course_id, _, _ in rows])
+            fused['documents'].append([row[0] for _, _, row in rows])
+            fused['metadatas'].append([row[1] for _, _, row in rows])
+            fused['distances'].append([row[2] for _, _, row in rows])
+            fused['scores'].append([score for _, score, _ in rows])
+
+        print(f"🔀 Hybrid fuse {len(queries)} queries: +{len(missing)} BM25-only courses "
+              f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+        return fused
+
     def _enhance_query(self, query: str, profile_analysis: dict) -> str:
         """Enhanced query với thông tin từ profile"""
         skills = profile_analysis.get('extracted_skills', [])
@@ -90,18 +404,20 @@ class ChromaDBCourseService:
         print(f"🎯 Enhanced query: {enhanced_query}")
         return enhanced_query
 
-    def _process_chroma_results(self, results: Any, profile_analysis: dict) -> List[Dict[str, Any]]:
-        """Process kết quả từ ChromaDB"""
+    def _process_chroma_results(self, results: Any, profile_analysis: dict, query_index: int = 0) -> List[Dict[str, Any]]:
+        """Process kết quả từ ChromaDB (của query thứ query_index)"""
         courses = []
 
-        if not results or not results['documents'] or not results['documents'][0]:
+        if not results or not results['documents'] or not results['documents'][query_index]:
             print("❌ No documents in results")
             return courses
 
+        # Kết quả hybrid đã xếp theo điểm RRF ('scores'), không sắp lại theo similarity
+        scores = results.get('scores')
         for i, (doc, metadata, distance) in enumerate(zip(
-            results['documents'][0],
-            results['metadatas'][0],
-            results['distances'][0]
+            results['documents'][query_index],
+            results['metadatas'][query_index],
+            results['distances'][query_index]
         )):
             try:
                 course = {
@@ -118,58 +434,139 @@ class ChromaDBCourseService:
                     "students": metadata.get('students', '1000+'),
                     "original_data": metadata  # Giữ nguyên data gốc để AI enhance
                 }
+                if scores:
+                    course["hybrid_score"] = round(scores[query_index][i], 5)
 
-                if self._is_course_suitable(course, profile_analysis):
-                    courses.append(course)
-                    print(f"   ✅ Added: {course['course_title']} (similarity: {course['similarity']:.2f})")
+                courses.append(course)
+                print(f"   ✅ Added: {course['course_title']} (similarity: {course['similarity']:.2f})")
 
             except Exception as e:
                 print(f"   ❌ Error processing course {i}: {e}")
                 continue
 
-        courses.sort(key=lambda x: x['similarity'], reverse=True)
+        if not scores:
+            courses.sort(key=lambda x: x['similarity'], reverse=True)
         return courses
 
-    def _enhance_courses_with_ai(self, courses: List[Dict[str, Any]], profile_analysis: dict) -> List[Dict[str, Any]]:
-        """Enhance courses với AI-generated outcomes, requirements, và audience"""
-        enhanced_courses = []
+    async def _enhance_courses_with_ai(self, courses: List[Dict[str, Any]], profile_analysis: dict) -> List[Dict[str, Any]]:
+        """Enhance courses với AI-generated outcomes, requirements, và audience (chạy song song)"""
+        semaphore = asyncio.Semaphore(self.enhance_concurrency)
 
-        for course in courses:
-            try:
-                print(f"🤖 Enhancing course with AI: {course['course_title'][:50]}...")
+        # gather giữ nguyên thứ tự theo similarity
+        return list(await asyncio.gather(*(
+            self._enhance_course(course, profile_analysis, semaphore) for course in courses
+        )))
 
-                # Gọi AI để generate structured content
-                enhanced_content = self._generate_course_content_with_ai(course, profile_analysis)
+    async def stream_enhanced_courses(self, courses: List[Dict[str, Any]], profile_analysis: dict):
+        """Async generator: yield (index, enhanced_course) theo thứ tự enhance xong"""
+        semaphore = asyncio.Semaphore(self.enhance_concurrency)
 
-                # Merge AI-generated content với course data
-                enhanced_course = {**course, **enhanced_content}
-                enhanced_courses.append(enhanced_course)
+        async def enhance_at(index: int, course: Dict[str, Any]):
+            return index, await self._enhance_course(course, profile_analysis, semaphore)
 
+        tasks = [asyncio.ensure_future(enhance_at(i, course)) for i, course in enumerate(courses)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client ngắt stream: hủy các lời gọi AI còn lại
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _enhance_course(self, course: Dict[str, Any], profile_analysis: dict,
+                              semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """Enhance 1 course: dùng enrichment sinh sẵn, hoặc gọi AI có deadline, fallback khi lỗi"""
+        precomputed = self._get_precomputed_content(course)
+        if precomputed:
+            return {**course, **precomputed}
+
+        async with semaphore:
+            print(f"🤖 Enhancing course with AI: {course['course_title'][:50]}...")
+            try:
+                # Gọi AI để generate structured content, có deadline cho từng course
+                enhanced_content = await asyncio.wait_for(
+                    self._generate_course_content_with_ai(course, profile_analysis),
+                    timeout=self.enhance_timeout
+                )
+            except asyncio.TimeoutError:
+                print(f"⏱️ AI enhancement timeout ({self.enhance_timeout}s): {course['course_title'][:50]}")
+                enhanced_content = self._get_fallback_course_content(course)
             except Exception as e:
                 print(f"❌ Error enhancing course with AI: {e}")
-                # Fallback: dùng course data gốc
-                enhanced_courses.append(self._get_fallback_course_content(course))
-                continue
+                enhanced_content = self._get_fallback_course_content(course)
 
-        return enhanced_courses
+        # Merge AI-generated content (hoặc fallback) với course data
+        return {**course, **enhanced_content}
 
-    def _generate_course_content_with_ai(self, course: Dict[str, Any], profile_analysis: dict) -> Dict[str, Any]:
-        """Generate outcomes, requirements, audience với AI"""
+    def _get_precomputed_content(self, course: Dict[str, Any]) -> Dict[str, Any]:
+        """Đọc outcomes/requirements/audience đã sinh sẵn lúc ingest (nếu đủ cả 3 field)"""
+        if not USE_PRECOMPUTED_ENRICHMENT:
+            return {}
 
-        prompt = f"""
-        Dựa trên thông tin khóa học và profile người học, hãy tạo nội dung structured:
+        raw = (course.get('original_data') or {}).get('enrichment')
+        if not raw:
+            return {}
 
-        THÔNG TIN KHÓA HỌC:
-        - Tiêu đề: {course['course_title']}
-        - Mô tả: {course['text'][:500]}
-        - Trình độ: {course['level']}
-        - Giảng viên: {course['instructor']}
+        try:
+            content = json.loads(raw)
+        except (TypeError, ValueError):
+            return {}
+
+        if all(content.get(field) for field in ('outcomes', 'requirements', 'audience')):
+            return content
+        return {}
+
+    def _enrichment_cache_key(self, course: Dict[str, Any], profile_analysis: dict) -> str:
+        """Hash các input quyết định nội dung AI-generated của course"""
+        course_part = {
+            'title': course['course_title'],
+            'description': course['text'][:500],
+            'level': course['level'],
+            'instructor': course['instructor'],
+        }
+        if self.enrichment_cache_scope == 'course':
+            # 'course-generic': entry scope course cũ được sinh từ prompt có profile, không dùng lại
+            return content_hash('course-generic', course_part)
+
+        profile_part = {
+            'extracted_skills': profile_analysis.get('extracted_skills', []),
+            'experience_level': profile_analysis.get('experience_level', 'Không xác định'),
+            'career_interests': profile_analysis.get('career_interests', []),
+        }
+        return content_hash('profile', course_part, profile_part)
 
+    def _build_enrichment_prompt(self, course: Dict[str, Any], profile_analysis: dict) -> str:
+        """
+        Prompt sinh outcomes/requirements/audience. Scope 'course' cache dùng chung cho mọi profile
+        nên prompt không được chứa profile (không thì nội dung cá nhân hóa của người đầu tiên bị
+        trả cho mọi người sau).
+        """
+        if self.enrichment_cache_scope == 'course':
+            intro = "Dựa trên thông tin khóa học, hãy tạo nội dung structured:"
+            profile_section = ""
+            notes = """- Requirements: Phù hợp với trình độ của khóa học
+        - Audience: Những người nên học khóa này"""
+        else:
+            intro = "Dựa trên thông tin khóa học và profile người học, hãy tạo nội dung structured:"
+            profile_section = f"""
         PROFILE NGƯỜI HỌC:
         - Kỹ năng hiện tại: {profile_analysis.get('extracted_skills', [])}
         - Trình độ: {profile_analysis.get('experience_level', 'Không xác định')}
         - Mục tiêu: {profile_analysis.get('career_interests', [])}
+"""
+            notes = """- Requirements: Phù hợp với trình độ người học
+        - Audience: Liên quan đến mục tiêu nghề nghiệp"""
 
+        return f"""
+        {intro}
+
+        THÔNG TIN KHÓA HỌC:
+        - Tiêu đề: {course['course_title']}
+        - Mô tả: {course['text'][:500]}
+        - Trình độ: {course['level']}
+        - Giảng viên: {course['instructor']}
+{profile_section}
         Hãy trả về JSON với format:
         {{
             "outcomes": [
@@ -191,15 +588,26 @@ class ChromaDBCourseService:
 
         Lưu ý:
         - Outcomes: Tập trung vào kỹ năng thực tế, ứng dụng được
-        - Requirements: Phù hợp với trình độ người học
-        - Audience: Liên quan đến mục tiêu nghề nghiệp
+        {notes}
         - Dùng tiếng Việt, ngắn gọn, cụ thể
 
         Chỉ trả về JSON, không thêm text nào khác.
         """
 
+    async def _generate_course_content_with_ai(self, course: Dict[str, Any], profile_analysis: dict) -> Dict[str, Any]:
+        """Generate outcomes, requirements, audience với AI (có cache trên disk, đọc/ghi SQLite trong thread)"""
+        cache_key = None
+        if self.enrichment_cache is not None:
+            cache_key = self._enrichment_cache_key(course, profile_analysis)
+            cached = await asyncio.to_thread(self.enrichment_cache.get, cache_key)
+            if cached is not None:
+                print(f"⚡ Enrichment cache hit: {course['course_title'][:50]}")
+                return cached
+
+        prompt = self._build_enrichment_prompt(course, profile_analysis)
+
         try:
-            response = openai_client.chat_completion([
+            response = await get_async_openai_client().chat_completion([
                 {"role": "user", "content": prompt}
             ])
 
@@ -207,7 +615,6 @@ class ChromaDBCourseService:
                 content = response.choices[0].message.content.strip()
 
                 # Parse JSON từ response
-                import json
                 if content.startswith("```json"):
                     content = content[7:-3].strip()
                 elif content.startswith("```"):
@@ -215,6 +622,9 @@ class ChromaDBCourseService:
 
                 enhanced_data = json.loads(content)
                 print(f"✅ AI-enhanced course: {len(enhanced_data.get('outcomes', []))} outcomes")
+
+                if cache_key is not None:
+                    await asyncio.to_thread(self.enrichment_cache.set, cache_key, enhanced_data)
                 return enhanced_data
             else:
                 return self._get_fallback_course_content(course)
@@ -302,39 +712,46 @@ class ChromaDBCourseService:
                 ]
             }
 
-    def _is_course_suitable(self, course: dict, profile_analysis: dict) -> bool:
-        """Check if course phù hợp với profile"""
-        user_level = profile_analysis.get('experience_level', '').lower()
-        course_level = course.get('level', '').lower()
-
-        level_mapping = {
-            'beginner': ['beginner', 'all levels', ''],
-            'intermediate': ['beginner', 'intermediate', 'all levels', ''],
-            'advanced': ['beginner', 'intermediate', 'advanced', 'all levels', '']
-        }
-
-        suitable_levels = level_mapping.get(user_level, ['all levels', ''])
-        return any(level in course_level for level in suitable_levels)
-
-# Global instance
-chroma_service = ChromaDBCourseService()
-
-async def recommend_courses(profile_text: str, career_goal: str, profile_analysis: dict = None):
-    """Recommend courses từ ChromaDB với AI enhancement"""
+# Global instance - khởi tạo lazy (lần gọi đầu tiên hoặc background warm-up)
+chroma_service = None
+_chroma_service_lock = threading.Lock()
+
+def get_chroma_service() -> ChromaDBCourseService:
+    """Lazy initialization của ChromaDB service"""
+    global chroma_service
+    if chroma_service is None:
+        with _chroma_service_lock:
+            if chroma_service is None:
+                chroma_service = ChromaDBCourseService()
+    return chroma_service
+
+def get_default_profile_analysis(career_goal: str) -> dict:
+    """Profile mặc định khi request không có profile analysis"""
+    return {
+        'extracted_skills': [],
+        'experience_level': 'intermediate',
+        'career_interests': [career_goal],
+        'learning_goals': [f'Learn {career_goal} skills']
+    }
+
+def build_course_query(career_goal: str) -> str:
+    return f"{career_goal} programming development tutorial course"
+
+async def recommend_courses(profile_text: str, career_goal: str, profile_analysis: dict = None,
+                            min_rating: float = None, min_duration_hours: float = None):
+    """Recommend courses từ ChromaDB với AI enhancement (có thể lọc theo rating/thời lượng tối thiểu)"""
     print(f"🎓 Đang tìm khóa học cho: {career_goal}")
 
     if not profile_analysis:
         print("⚠️ No profile analysis provided")
-        profile_analysis = {
-            'extracted_skills': [],
-            'experience_level': 'intermediate',
-            'career_interests': [career_goal],
-            'learning_goals': [f'Learn {career_goal} skills']
-        }
+        profile_analysis = get_default_profile_analysis(career_goal)
 
     try:
-        query = f"{career_goal} programming development tutorial course"
-        courses = chroma_service.search_courses(query, profile_analysis, top_k=5)
+        query = build_course_query(career_goal)
+        service = await asyncio.to_thread(get_chroma_service)
+        courses = await service.search_courses(
+            query, profile_analysis, top_k=5, min_rating=min_rating, min_duration_hours=min_duration_hours
+        )
 
         if not courses:
             print("⚠️ No courses found from ChromaDB, using fallback")
@@ -346,6 +763,93 @@ async def recommend_courses(profile_text: str, career_goal: str, profile_analysi
         print(f"❌ Lỗi recommend courses: {e}")
         return {"courses": get_fallback_courses(career_goal)}
 
+async def retrieve_candidate_courses(career_goal: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Chỉ retrieve (không AI enhancement) theo career goal - không cần profile analysis,
+    nên có thể chạy song song trong lúc parse/phân tích CV
+    """
+    try:
+        service = await asyncio.to_thread(get_chroma_service)
+        return await service.retrieve_courses(
+            build_course_query(career_goal), get_default_profile_analysis(career_goal), top_k=top_k
+        )
+    except Exception as e:
+        print(f"❌ Lỗi retrieve candidate courses: {e}")
+        return []
+
+async def recommend_courses_batch(requests: List[Dict[str, Any]], top_k: int = 5, min_rating: float = None,
+                                  min_duration_hours: float = None) -> List[Dict[str, Any]]:
+    """
+    Recommend cho nhiều profile (vd: cả cohort) bằng 1 vài lần query ChromaDB.
+    requests: list {"career_goal": ..., "profile_analysis": dict|None}
+    """
+    print(f"🎓 Đang tìm khóa học cho {len(requests)} profiles")
+
+    searches = [
+        (build_course_query(request['career_goal']),
+         request.get('profile_analysis') or get_default_profile_analysis(request['career_goal']))
+        for request in requests
+    ]
+
+    try:
+        service = await asyncio.to_thread(get_chroma_service)
+        results = await service.search_courses_batch(
+            searches, top_k=top_k, min_rating=min_rating, min_duration_hours=min_duration_hours
+        )
+    except Exception as e:
+        print(f"❌ Lỗi batch recommend courses: {e}")
+        results = [{'courses': [], 'error': f"{type(e).__name__}: {e}"} for _ in requests]
+
+    responses = []
+    for request, result in zip(requests, results):
+        if result['courses']:
+            responses.append({"career_goal": request['career_goal'], "courses": result['courses'], "source": "chromadb"})
+            continue
+        # Không có course (hoặc search lỗi) -> fallback; 'error' cho client biết là lỗi chứ không phải không khớp
+        response = {"career_goal": request['career_goal'], "courses": get_fallback_courses(request['career_goal']),
+                    "source": "fallback"}
+        if result['error']:
+            response["error"] = result['error']
+        responses.append(response)
+    return responses
+
+async def stream_recommend_courses(profile_text: str, career_goal: str, profile_analysis: dict = None,
+                                   min_rating: float = None, min_duration_hours: float = None):
+    """
+    Recommend courses dạng stream (async generator các event dict):
+    - 'courses': danh sách course đã xếp hạng ngay khi ChromaDB trả kết quả
+    - 'course_enhanced': từng course khi phần AI enhancement của nó xong (kèm index)
+    - 'done': kết thúc stream
+    """
+    print(f"🎓 Đang stream khóa học cho: {career_goal}")
+
+    if not profile_analysis:
+        profile_analysis = get_default_profile_analysis(career_goal)
+
+    try:
+        service = await asyncio.to_thread(get_chroma_service)
+        courses = await service.retrieve_courses(
+            build_course_query(career_goal), profile_analysis, top_k=5,
+            min_rating=min_rating, min_duration_hours=min_duration_hours
+        )
+    except Exception as e:
+        print(f"❌ Lỗi stream recommend courses: {e}")
+        courses = []
+
+    if not courses:
+        print("⚠️ No courses found from ChromaDB, using fallback")
+        fallback_courses = get_fallback_courses(career_goal)
+        yield {"event": "courses", "courses": fallback_courses, "source": "fallback"}
+        yield {"event": "done", "count": len(fallback_courses)}
+        return
+
+    yield {"event": "courses", "courses": courses, "source": "chromadb"}
+
+    async for index, enhanced_course in service.stream_enhanced_courses(courses, profile_analysis):
+        yield {"event": "course_enhanced", "index": index, "course": enhanced_course}
+
+    yield {"event": "done", "count": len(courses)}
+
 def get_fallback_courses(career_goal: str):
     """Fallback courses với enhanced content"""
     print("🔄 Using fallback courses")
@@ -0,0 +1,315 @@
+# services/profile_batch.py
+"""
+Normalize nhiều CV cùng lúc (onboard cả cohort).
+- Worker pool async với concurrency giới hạn
+- CV ngắn được gộp nhiều CV vào 1 prompt (multi-document) để giảm số LLM call
+- Kết quả trả về từng item ngay khi xong, cuối cùng là report throughput + token usage
+
+CLI:
+    python -m services.profile_batch --input ./cvs --output results.jsonl
+    python -m services.profile_batch --input cvs.jsonl --concurrency 16 --no-pack --save
+Input là thư mục file CV (pdf/docx/txt) hoặc JSONL mỗi dòng {"id": ..., "profile_text": ...}.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from utils.openai_client import get_async_openai_client, is_cached_response
+from utils.parsing_executor import shutdown_parsing_executor
+from services.profile_service import (
+    build_normalize_prompt, parse_profile_response, get_fallback_profile,
+    get_cached_profile, cache_profile, extract_profile_text, save_normalized_profile
+)
+
+PROFILE_BATCH_CONCURRENCY = int(os.getenv("PROFILE_BATCH_CONCURRENCY", "8"))
+# CV ngắn hơn N ký tự được gộp vào prompt chung, tối đa PACK_SIZE CV / prompt
+PROFILE_BATCH_PACK_MAX_CHARS = int(os.getenv("PROFILE_BATCH_PACK_MAX_CHARS", "3000"))
+PROFILE_BATCH_PACK_SIZE = int(os.getenv("PROFILE_BATCH_PACK_SIZE", "4"))
+
+def build_batch_normalize_prompt(texts: List[str]) -> str:
+    """Prompt phân tích nhiều CV trong 1 lần gọi, kết quả theo đúng thứ tự"""
+    documents = "\n\n".join(
+        f"=== CV {index} ===\n{text}" for index, text in enumerate(texts)
+    )
+    return f"""
+    Phân tích {len(texts)} CV sau, với MỖI CV extract các thông tin quan trọng để đề xuất khóa học.
+
+    {documents}
+
+    Hãy trả về JSON với format:
+    {{
+        "profiles": [
+            {{
+                "index": số thứ tự CV,
+                "extracted_skills": ["skill1", "skill2", ...],
+                "experience_level": "beginner|intermediate|advanced",
+                "education_background": "mô tả ngắn",
+                "career_interests": ["lĩnh vực quan tâm"],
+                "current_role": "vị trí hiện tại nếu có",
+                "years_of_experience": số năm,
+                "strengths": ["điểm mạnh nổi bật"],
+                "learning_goals": ["mục tiêu học tập"]
+            }}
+        ]
+    }}
+
+    "profiles" phải có đúng {len(texts)} phần tử, theo thứ tự CV.
+    Chỉ trả về JSON, không thêm text nào khác.
+    """
+
+def parse_batch_response(response, count: int) -> List[dict]:
+    """List profile theo index (None cho CV AI không trả về)"""
+    content = response.choices[0].message.content.strip()
+    if content.startswith("```json"):
+        content = content[7:-3].strip()
+    elif content.startswith("```"):
+        content = content[3:-3].strip()
+
+    profiles = [None] * count
+    for position, profile in enumerate(json.loads(content).get("profiles", [])):
+        if not isinstance(profile, dict):
+            continue
+        index = profile.pop("index", position)
+        if isinstance(index, int) and 0 <= index < count and profiles[index] is None:
+            profiles[index] = profile
+    return profiles
+
+class BatchUsage:
+    """
+    Cộng dồn số LLM call và token usage của cả batch.
+    Response từ LLM cache, hoặc dùng chung với request giống hệt đang chạy (cùng response id),
+    được đếm là cache_hits, không tính vào llm_calls/token.
+    """
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._response_ids = set()
+
+    def add(self, response) -> None:
+        response_id = getattr(response, "id", None)
+        if is_cached_response(response) or (response_id and response_id in self._response_ids):
+            self.cache_hits += 1
+            return
+        if response_id:
+            self._response_ids.add(response_id)
+
+        self.llm_calls += 1
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+
+    def to_dict(self) -> dict:
+        return {
+            "llm_calls": self.llm_calls,
+            "cache_hits": self.cache_hits,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+
+async def _normalize_single(item: dict, usage: BatchUsage) -> dict:
+    client = get_async_openai_client()
+    response = await client.chat_completion([
+        {"role": "user", "content": build_normalize_prompt(item["profile_text"])}
+    ])
+    if not response:
+        return {"status": "fallback", "profile": get_fallback_profile(item["profile_text"])}
+
+    usage.add(response)
+    try:
+        profile = parse_profile_response(response, item["profile_text"])
+    except (json.JSONDecodeError, AttributeError) as e:
+        print(f"⚠️ Invalid normalize response for {item['id']}: {e}")
+        return {"status": "fallback", "profile": get_fallback_profile(item["profile_text"])}
+
+    await asyncio.to_thread(cache_profile, item["profile_text"], profile)
+    return {"status": "ok", "profile": profile}
+
+async def _normalize_group(group: List[dict], usage: BatchUsage) -> List[dict]:
+    """Normalize 1 nhóm CV; nhóm > 1 CV dùng prompt gộp, CV nào thiếu thì normalize riêng"""
+    if len(group) == 1:
+        return [await _normalize_single(group[0], usage)]
+
+    profiles = [None] * len(group)
+    try:
+        response = await get_async_openai_client().chat_completion([
+            {"role": "user", "content": build_batch_normalize_prompt([item["profile_text"] for item in group])}
+        ])
+        if response:
+            usage.add(response)
+            profiles = parse_batch_response(response, len(group))
+    except Exception as e:
+        print(f"⚠️ Packed normalize failed, retrying individually: {e}")
+
+    results = []
+    for item, profile in zip(group, profiles):
+        if profile is None:
+            results.append(await _normalize_single(item, usage))
+        else:
+            await asyncio.to_thread(cache_profile, item["profile_text"], profile)
+            results.append({"status": "ok", "profile": profile})
+    return results
+
+def pack_items(items: List[dict], pack: bool = True, pack_size: int = PROFILE_BATCH_PACK_SIZE,
+               max_chars: int = PROFILE_BATCH_PACK_MAX_CHARS) -> List[List[dict]]:
+    """Chia item thành các nhóm: CV dài đi riêng, CV ngắn gộp tối đa pack_size / nhóm"""
+    if not pack or pack_size <= 1:
+        return [[item] for item in items]
+
+    groups = []
+    short_items = []
+    for item in items:
+        if len(item["profile_text"]) <= max_chars:
+            short_items.append(item)
+        else:
+            groups.append([item])
+    groups.extend(short_items[i:i + pack_size] for i in range(0, len(short_items), pack_size))
+    return groups
+
+def _get_cached_profiles(items: List[dict]) -> List[Optional[dict]]:
+    return [get_cached_profile(item["profile_text"]) for item in items]
+
+async def normalize_profiles_batch(items: List[dict], concurrency: int = PROFILE_BATCH_CONCURRENCY,
+                                   pack: bool = True):
+    """
+    Async generator các event dict:
+    - 'item': {id, status: ok|cached|fallback|error, profile, elapsed_ms} theo thứ tự hoàn thành
+    - 'report': tổng kết throughput và token usage
+    items: list {"id": ..., "profile_text": ...}
+    """
+    started = time.perf_counter()
+    usage = BatchUsage()
+    statuses = {}
+    output = asyncio.Queue()
+
+    def emit(item: dict, result: dict, item_started: float):
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+        output.put_nowait({
+            "event": "item",
+            "id": item["id"],
+            **result,
+            "elapsed_ms": round((time.perf_counter() - item_started) * 1000, 1)
+        })
+
+    # Item đã có trong cache normalize trả về ngay, không chiếm worker
+    # (đọc cache SQLite cho cả batch trong 1 thread, không block event loop)
+    pending = []
+    for item, cached in zip(items, await asyncio.to_thread(_get_cached_profiles, items)):
+        if cached is not None:
+            emit(item, {"status": "cached", "profile": cached}, started)
+        else:
+            pending.append(item)
+
+    groups = asyncio.Queue()
+    for group in pack_items(pending, pack):
+        groups.put_nowait(group)
+
+    async def worker():
+        while True:
+            try:
+                group = groups.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            group_started = time.perf_counter()
+            try:
+                results = await _normalize_group(group, usage)
+            except Exception as e:
+                results = [{"status": "error", "error": str(e), "profile": None} for _ in group]
+            for item, result in zip(group, results):
+                emit(item, result, group_started)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(max(1, min(concurrency, groups.qsize())))]
+    # return_exceptions: worker lỗi ngoài dự kiến không làm dừng các worker khác, lỗi được đưa vào report
+    all_done = asyncio.ensure_future(asyncio.gather(*workers, return_exceptions=True))
+
+    try:
+        while not (all_done.done() and output.empty()):
+            if output.empty():
+                getter = asyncio.ensure_future(output.get())
+                await asyncio.wait({getter, all_done}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                yield getter.result()
+            else:
+                yield output.get_nowait()
+    finally:
+        for task in workers:
+            task.cancel()
+        all_done.cancel()
+
+    worker_errors = [f"{type(e).__name__}: {e}" for e in all_done.result() if isinstance(e, BaseException)]
+    for error in worker_errors:
+        print(f"❌ Profile batch worker failed: {error}")
+
+    elapsed = time.perf_counter() - started
+    yield {
+        "event": "report",
+        "count": len(items),
+        "statuses": statuses,
+        # Item của worker lỗi không có event 'item'
+        "worker_errors": worker_errors,
+        "unprocessed": len(items) - sum(statuses.values()),
+        "elapsed_s": round(elapsed, 3),
+        "profiles_per_s": round(len(items) / elapsed, 2) if elapsed else None,
+        "usage": usage.to_dict()
+    }
+
+async def _load_items(input_path: Path) -> List[dict]:
+    """Đọc input CLI: thư mục file CV hoặc JSONL"""
+    if input_path.is_dir():
+        items = []
+        for path in sorted(p for p in input_path.iterdir() if p.is_file()):
+            text, _ = await extract_profile_text(path.name, await asyncio.to_thread(path.read_bytes))
+            items.append({"id": path.name, "profile_text": text})
+        return items
+
+    items = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            if line.strip():
+                record = json.loads(line)
+                items.append({"id": record.get("id", line_number), "profile_text": record["profile_text"]})
+    return items
+
+async def _run_cli(args) -> None:
+    items = await _load_items(Path(args.input))
+    print(f"📦 Normalizing {len(items)} profiles (concurrency={args.concurrency}, pack={not args.no_pack})")
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        async for event in normalize_profiles_batch(items, args.concurrency, pack=not args.no_pack):
+            if event["event"] == "item" and args.save and event.get("profile"):
+                event["profile"] = await asyncio.to_thread(save_normalized_profile, event["profile"])
+            if event["event"] == "report":
+                print(f"📊 Report: {json.dumps(event, ensure_ascii=False)}")
+            else:
+                print(f"  {event['id']}: {event['status']} ({event['elapsed_ms']} ms)")
+            if output:
+                output.write(json.dumps(event, ensure_ascii=False) + "\n")
+    finally:
+        if output:
+            output.close()
+        shutdown_parsing_executor()
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize nhiều CV cùng lúc")
+    parser.add_argument("--input", required=True, help="Thư mục file CV hoặc file JSONL {id, profile_text}")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSONL")
+    parser.add_argument("--concurrency", type=int, default=PROFILE_BATCH_CONCURRENCY)
+    parser.add_argument("--no-pack", action="store_true", help="Không gộp CV ngắn vào chung 1 prompt")
+    parser.add_argument("--save", action="store_true", help="Lưu profile vào profile store (kèm profile_id)")
+    args = parser.parse_args()
+
+    asyncio.run(_run_cli(args))
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,102 @@
 # services/profile_service.py
+import asyncio
 import os
 import json
+import hashlib
+import threading
 from pathlib import Path
-from utils.openai_client import openai_client
+from typing import Optional, Tuple
+from utils.openai_client import get_openai_client, get_async_openai_client
+from utils.disk_cache import SQLiteCache, content_hash, env_float
+from utils.parsing_executor import extract_text_from_file_async
+from services.profile_store import get_profile_store
 
 PROFILE_PATH = Path("./profiles")
 
-def normalize_profile(raw_text: str) -> dict:
-    """
-    Dùng AI để extract thông tin quan trọng từ CV
-    Focus: Skills, Experience, Education, Career Interests
-    """
-    prompt = f"""
+# Cache 2 tầng cho CV upload lại nhiều lần:
+# 1. sha256(bytes upload) -> text đã extract
+# 2. hash(text đã chuẩn hóa khoảng trắng) -> kết quả normalize_profile
+PROFILE_CACHE_ENABLED = os.getenv("PROFILE_CACHE_ENABLED", "1") == "1"
+PROFILE_CACHE_FILE = os.getenv("PROFILE_CACHE_FILE", "profile_cache.sqlite3")
+PARSED_UPLOAD_CACHE_MAX_ENTRIES = int(os.getenv("PARSED_UPLOAD_CACHE_MAX_ENTRIES", "2000"))
+NORMALIZED_PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("NORMALIZED_PROFILE_CACHE_MAX_ENTRIES", "5000"))
+PROFILE_CACHE_TTL = env_float("PROFILE_CACHE_TTL")
+
+parsed_upload_cache = None
+normalized_profile_cache = None
+_profile_cache_lock = threading.Lock()
+
+def get_profile_caches() -> Tuple[Optional[SQLiteCache], Optional[SQLiteCache]]:
+    """(parsed_upload_cache, normalized_profile_cache) - lazy, (None, None) nếu bị tắt"""
+    global parsed_upload_cache, normalized_profile_cache
+    if not PROFILE_CACHE_ENABLED:
+        return None, None
+
+    with _profile_cache_lock:
+        if parsed_upload_cache is None:
+            try:
+                path = PROFILE_PATH / PROFILE_CACHE_FILE
+                parsed_upload_cache = SQLiteCache(
+                    path, table="parsed_uploads",
+                    ttl_seconds=PROFILE_CACHE_TTL, max_entries=PARSED_UPLOAD_CACHE_MAX_ENTRIES
+                )
+                normalized_profile_cache = SQLiteCache(
+                    path, table="normalized_profiles",
+                    ttl_seconds=PROFILE_CACHE_TTL, max_entries=NORMALIZED_PROFILE_CACHE_MAX_ENTRIES
+                )
+            except Exception as e:
+                print(f"⚠️ Profile cache disabled: {e}")
+                parsed_upload_cache = normalized_profile_cache = None
+        return parsed_upload_cache, normalized_profile_cache
+
+def upload_cache_key(filename: str, file_bytes: bytes) -> str:
+    # detected_type phụ thuộc extension nên extension là một phần của key
+    extension = Path(filename or "").suffix.lower()
+    return f"{hashlib.sha256(file_bytes).hexdigest()}{extension}"
+
+def normalized_text_key(raw_text: str) -> str:
+    return content_hash("normalize_profile", " ".join((raw_text or "").split()))
+
+def get_cached_upload(filename: str, file_bytes: bytes) -> Optional[dict]:
+    upload_cache, _ = get_profile_caches()
+    if upload_cache is None:
+        return None
+    return upload_cache.get(upload_cache_key(filename, file_bytes))
+
+def cache_upload(filename: str, file_bytes: bytes, text: str, detected: str) -> None:
+    upload_cache, _ = get_profile_caches()
+    if upload_cache is not None:
+        upload_cache.set(upload_cache_key(filename, file_bytes), {"text": text, "detected_type": detected})
+
+async def extract_profile_text(filename: str, file_bytes: bytes) -> Tuple[str, str]:
+    """Parse file upload (cache theo sha256 của bytes), trả về (text, detected_type)"""
+    # Đọc/ghi SQLite chạy trong thread, không block event loop
+    cached = await asyncio.to_thread(get_cached_upload, filename, file_bytes)
+    if cached is not None:
+        print(f"⚡ Parsed upload cache hit: {filename}")
+        return cached["text"], cached["detected_type"]
+
+    text, detected = await extract_text_from_file_async(filename, file_bytes)
+    await asyncio.to_thread(cache_upload, filename, file_bytes, text, detected)
+    return text, detected
+
+def get_cached_profile(raw_text: str) -> Optional[dict]:
+    _, profile_cache = get_profile_caches()
+    if profile_cache is None:
+        return None
+    cached = profile_cache.get(normalized_text_key(raw_text))
+    if cached is not None:
+        print("⚡ Normalized profile cache hit")
+    return cached
+
+def cache_profile(raw_text: str, profile: dict) -> None:
+    _, profile_cache = get_profile_caches()
+    if profile_cache is not None:
+        profile_cache.set(normalized_text_key(raw_text), profile)
+
+def build_normalize_prompt(raw_text: str) -> str:
+    """Prompt extract thông tin quan trọng từ CV"""
+    return f"""
     Phân tích CV sau và extract các thông tin quan trọng để đề xuất khóa học:
 
     CV TEXT:
@@ -32,21 +117,56 @@ def normalize_profile(raw_text: str) -> dict:
     Chỉ trả về JSON, không thêm text nào khác.
     """
 
+def parse_profile_response(response, raw_text: str) -> dict:
+    """Parse JSON từ response của AI, fallback nếu không có response"""
+    if not response:
+        return get_fallback_profile(raw_text)
+
+    content = response.choices[0].message.content.strip()
+    if content.startswith("```json"):
+        content = content[7:-3].strip()
+    elif content.startswith("```"):
+        content = content[3:-3].strip()
+
+    return json.loads(content)
+
+def normalize_profile(raw_text: str) -> dict:
+    """
+    Dùng AI để extract thông tin quan trọng từ CV
+    Focus: Skills, Experience, Education, Career Interests
+    """
+    cached = get_cached_profile(raw_text)
+    if cached is not None:
+        return cached
+
     try:
-        response = openai_client.chat_completion([
-            {"role": "user", "content": prompt}
+        response = get_openai_client().chat_completion([
+            {"role": "user", "content": build_normalize_prompt(raw_text)}
         ])
-
+        profile = parse_profile_response(response, raw_text)
+        # Chỉ cache kết quả của AI, không cache fallback
         if response:
-            content = response.choices[0].message.content.strip()
-            if content.startswith("```json"):
-                content = content[7:-3].strip()
-            elif content.startswith("```"):
-                content = content[3:-3].strip()
+            cache_profile(raw_text, profile)
+        return profile
+
+    except Exception as e:
+        print(f"❌ Lỗi normalize profile: {e}")
+        return get_fallback_profile(raw_text)
+
+async def normalize_profile_async(raw_text: str) -> dict:
+    """Bản async của normalize_profile - không block event loop"""
+    cached = await asyncio.to_thread(get_cached_profile, raw_text)
+    if cached is not None:
+        return cached
 
-            return json.loads(content)
-        else:
-            return get_fallback_profile(raw_text)
+    try:
+        response = await get_async_openai_client().chat_completion([
+            {"role": "user", "content": build_normalize_prompt(raw_text)}
+        ])
+        profile = parse_profile_response(response, raw_text)
+        if response:
+            await asyncio.to_thread(cache_profile, raw_text, profile)
+        return profile
 
     except Exception as e:
         print(f"❌ Lỗi normalize profile: {e}")
@@ -83,11 +203,10 @@ def extract_skills_simple(text: str) -> list:
 
     return found_skills[:10]
 
-def save_normalized_profile(profile_data: dict) -> dict:
-    """Lưu normalized profile"""
-    if not PROFILE_PATH.exists():
-        PROFILE_PATH.mkdir(parents=True)
+def save_normalized_profile(profile_data: dict, profile_id: Optional[str] = None) -> dict:
+    """Lưu normalized profile vào profile store, trả về profile kèm profile_id"""
+    return get_profile_store(PROFILE_PATH).save(profile_data, profile_id)
 
-    import time
-    profile_data['processed_at'] = time.time()
-    return profile_data
+def get_saved_profile(profile_id: str) -> Optional[dict]:
+    """Profile analysis đã lưu (None nếu không có)"""
+    return get_profile_store(PROFILE_PATH).get(profile_id)
@@ -0,0 +1,82 @@
+# services/profile_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+PROFILE_STORE_FILE = os.getenv("PROFILE_STORE_FILE", "profiles.sqlite3")
+
+class ProfileStore:
+    """
+    Lưu normalized profile trong SQLite (WAL) với profile_id ổn định.
+    - save(): tạo profile mới (id ngẫu nhiên) hoặc cập nhật profile_id đã có
+    - get(): lấy lại profile analysis để dùng cho recommend/quiz thay vì phân tích lại
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            "profile_id TEXT PRIMARY KEY, profile TEXT NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def new_profile_id() -> str:
+        return uuid.uuid4().hex
+
+    def save(self, profile_data: dict, profile_id: Optional[str] = None) -> dict:
+        """Lưu profile, trả về profile kèm profile_id và processed_at"""
+        profile_id = profile_id or profile_data.get("profile_id") or self.new_profile_id()
+        now = time.time()
+        profile = {**profile_data, "profile_id": profile_id, "processed_at": now}
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO profiles (profile_id, profile, created_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(profile_id) DO UPDATE SET profile = excluded.profile, updated_at = excluded.updated_at",
+                (profile_id, json.dumps(profile, ensure_ascii=False), now, now)
+            )
+            self._conn.commit()
+        return profile
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT profile FROM profiles WHERE profile_id = ?", (profile_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, profile_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM profiles WHERE profile_id = ?", (profile_id,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()
+        return count
+
+# Global instance - lazy initialization
+profile_store = None
+_profile_store_lock = threading.Lock()
+
+def get_profile_store(base_path) -> ProfileStore:
+    """Store dùng chung, file nằm trong base_path (PROFILE_PATH)"""
+    global profile_store
+    with _profile_store_lock:
+        if profile_store is None:
+            profile_store = ProfileStore(Path(base_path) / PROFILE_STORE_FILE)
+        return profile_store
@@ -0,0 +1,184 @@
+# services/quiz_bank.py
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+QUIZ_BANK_PATH = os.getenv('QUIZ_BANK_PATH', './cache/quiz_bank.sqlite3')
+QUIZ_BANK_TARGET_SIZE = int(os.getenv('QUIZ_BANK_TARGET_SIZE', '5'))
+QUIZ_BANK_LOW_WATERMARK = int(os.getenv('QUIZ_BANK_LOW_WATERMARK', '2'))
+# Mỗi quiz được phục vụ tối đa N lần rồi bị loại để pool luôn được làm mới
+QUIZ_BANK_MAX_SERVES = int(os.getenv('QUIZ_BANK_MAX_SERVES', '20'))
+QUIZ_BANK_WARM_GOALS = [
+    goal.strip() for goal in os.getenv(
+        'QUIZ_BANK_WARM_GOALS',
+        'Backend Developer,Frontend Developer,Fullstack Developer,Data Scientist,DevOps Engineer,Mobile Developer'
+    ).split(',') if goal.strip()
+]
+
+VALID_ANSWERS = {'A', 'B', 'C', 'D'}
+
+def normalize_goal(career_goal: str) -> str:
+    """Key của pool: lower-case, gộp khoảng trắng"""
+    return ' '.join((career_goal or '').lower().split())
+
+def validate_quiz(quiz_data: dict) -> bool:
+    """Quiz hợp lệ: có list 'quiz', mỗi câu có question, 4 options và answer A-D"""
+    if not isinstance(quiz_data, dict):
+        return False
+
+    questions = quiz_data.get('quiz')
+    if not isinstance(questions, list) or not questions:
+        return False
+
+    return all(validate_question(item) for item in questions)
+
+def validate_question(item: dict) -> bool:
+    """Câu hỏi hợp lệ: có question, đúng 4 options và answer A-D"""
+    if not isinstance(item, dict) or not item.get('question'):
+        return False
+    options = item.get('options')
+    if not isinstance(options, list) or len(options) != 4:
+        return False
+    return str(item.get('answer', '')).strip().upper()[:1] in VALID_ANSWERS
+
+class QuizBank:
+    """
+    Pool các post-quiz đã validate cho từng career goal, lưu trong SQLite.
+    - get_quiz: lấy ngẫu nhiên 1 quiz trong pool (thứ tự câu hỏi được xáo trộn)
+    - Pool dưới low watermark sẽ được refill ở background bằng generator
+    - warm(): điền sẵn pool cho các goal phổ biến khi khởi động
+    """
+
+    def __init__(self, generator: Callable[[str], Awaitable[Optional[dict]]], path=QUIZ_BANK_PATH,
+                 target_size: int = QUIZ_BANK_TARGET_SIZE, low_watermark: int = QUIZ_BANK_LOW_WATERMARK,
+                 max_serves: int = QUIZ_BANK_MAX_SERVES):
+        self.generator = generator
+        self.path = Path(path)
+        self.target_size = max(1, target_size)
+        self.low_watermark = min(max(0, low_watermark), self.target_size)
+        self.max_serves = max_serves
+        self._refilling = {}
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS post_quizzes ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, goal_key TEXT NOT NULL, quiz TEXT NOT NULL, "
+            "created_at REAL NOT NULL, served_count INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_post_quizzes_goal ON post_quizzes(goal_key)")
+        self._conn.commit()
+
+    def count(self, career_goal: str) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM post_quizzes WHERE goal_key = ?", (normalize_goal(career_goal),)
+            ).fetchone()
+        return count
+
+    def add(self, career_goal: str, quiz_data: dict) -> bool:
+        """Thêm quiz vào pool nếu hợp lệ"""
+        if not validate_quiz(quiz_data):
+            return False
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO post_quizzes (goal_key, quiz, created_at) VALUES (?, ?, ?)",
+                (normalize_goal(career_goal), json.dumps(quiz_data, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+        return True
+
+    def add_many(self, career_goal: str, quizzes: List[dict]) -> int:
+        """Thêm các quiz hợp lệ, trả về số quiz đã thêm"""
+        return sum(1 for quiz_data in quizzes if self.add(career_goal, quiz_data))
+
+    def take(self, career_goal: str) -> Optional[dict]:
+        """Lấy ngẫu nhiên 1 quiz trong pool, loại quiz đã phục vụ đủ max_serves lần"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, quiz, served_count FROM post_quizzes WHERE goal_key = ? ORDER BY RANDOM() LIMIT 1",
+                (normalize_goal(career_goal),)
+            ).fetchone()
+            if row is None:
+                return None
+
+            quiz_id, quiz_json, served_count = row
+            if self.max_serves and served_count + 1 >= self.max_serves:
+                self._conn.execute("DELETE FROM post_quizzes WHERE id = ?", (quiz_id,))
+            else:
+                self._conn.execute(
+                    "UPDATE post_quizzes SET served_count = served_count + 1 WHERE id = ?", (quiz_id,)
+                )
+            self._conn.commit()
+
+        quiz_data = json.loads(quiz_json)
+        # Xáo trộn thứ tự câu hỏi (không đổi options để giữ đúng answer/explanation)
+        random.shuffle(quiz_data['quiz'])
+        return quiz_data
+
+    async def get_quiz(self, career_goal: str) -> Optional[dict]:
+        """Lấy quiz từ pool (None nếu pool trống) và refill ở background nếu cần"""
+        # Truy vấn SQLite (có lock) chạy trong thread, không block event loop
+        quiz_data = await asyncio.to_thread(self.take, career_goal)
+        if quiz_data is None or await asyncio.to_thread(self.count, career_goal) < self.low_watermark:
+            self.schedule_refill(career_goal)
+        return quiz_data
+
+    def schedule_refill(self, career_goal: str) -> asyncio.Future:
+        """Chạy refill ở background, mỗi goal chỉ có 1 refill tại một thời điểm"""
+        goal_key = normalize_goal(career_goal)
+        task = self._refilling.get(goal_key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self.refill(career_goal))
+            self._refilling[goal_key] = task
+        return task
+
+    async def _generate_one(self, career_goal: str) -> Optional[dict]:
+        try:
+            return await self.generator(career_goal)
+        except Exception as e:
+            print(f"❌ Quiz bank refill error ({career_goal}): {e}")
+            return None
+
+    async def refill(self, career_goal: str) -> int:
+        """Generate song song cho tới khi pool đạt target_size, trả về số quiz đã thêm"""
+        needed = self.target_size - await asyncio.to_thread(self.count, career_goal)
+        if needed <= 0:
+            return 0
+
+        generated = await asyncio.gather(*(self._generate_one(career_goal) for _ in range(needed)))
+        added = await asyncio.to_thread(self.add_many, career_goal, [quiz_data for quiz_data in generated if quiz_data])
+
+        if added:
+            count = await asyncio.to_thread(self.count, career_goal)
+            print(f"🏦 Quiz bank: +{added} post-quiz cho '{career_goal}' ({count}/{self.target_size})")
+        return added
+
+    async def warm(self, career_goals: List[str] = QUIZ_BANK_WARM_GOALS) -> None:
+        """Điền sẵn pool cho các career goal phổ biến"""
+        print(f"🔥 Warming quiz bank: {career_goals}")
+        counts = await asyncio.to_thread(lambda: [self.count(goal) for goal in career_goals])
+        await asyncio.gather(*(
+            self.schedule_refill(goal) for goal, count in zip(career_goals, counts) if count < self.target_size
+        ))
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT goal_key, COUNT(*) FROM post_quizzes GROUP BY goal_key"
+            ).fetchall()
+        return {
+            "path": str(self.path),
+            "target_size": self.target_size,
+            "low_watermark": self.low_watermark,
+            "pools": {goal_key: count for goal_key, count in rows},
+        }
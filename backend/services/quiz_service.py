@@ -1,6 +1,9 @@
 # services/quiz_service.py
 import json
-from utils.openai_client import openai_client
+import threading
+from utils.openai_client import get_async_openai_client
+from utils.json_stream import JSONArrayItemStreamParser
+from services.quiz_bank import QuizBank, validate_quiz, validate_question
 
 async def generate_quiz(profile_text: str, career_goal: str, quiz_type: str = "pre-quiz", profile_analysis: dict = None):
     """Generate quiz dựa trên profile analysis"""
@@ -14,10 +17,9 @@ async def generate_quiz(profile_text: str, career_goal: str, quiz_type: str = "p
         print(f"❌ Lỗi generate_quiz: {e}")
         return get_fallback_quiz(quiz_type, career_goal)
 
-async def generate_pre_quiz(profile_analysis: dict, career_goal: str):
-    """Pre-quiz tập trung vào thu thập thông tin thêm"""
-
-    prompt = f"""
+def build_pre_quiz_prompt(profile_analysis: dict, career_goal: str) -> str:
+    """Prompt pre-quiz thu thập thêm thông tin người dùng"""
+    return f"""
     Tạo một bài quiz 5 câu để thu thập thêm thông tin về người dùng, dựa trên:
 
     THÔNG TIN ĐÃ CÓ TỪ CV:
@@ -55,8 +57,12 @@ async def generate_pre_quiz(profile_analysis: dict, career_goal: str):
     Chỉ trả về JSON, không có text nào khác.
     """
 
+async def generate_pre_quiz(profile_analysis: dict, career_goal: str):
+    """Pre-quiz tập trung vào thu thập thông tin thêm"""
+    prompt = build_pre_quiz_prompt(profile_analysis, career_goal)
+
     try:
-        response = openai_client.chat_completion([
+        response = await get_async_openai_client().chat_completion([
             {"role": "user", "content": prompt}
         ])
 
@@ -86,9 +92,22 @@ async def generate_pre_quiz(profile_analysis: dict, career_goal: str):
         return get_fallback_pre_quiz(career_goal)
 
 async def generate_post_quiz(career_goal: str):
-    """Post-quiz đánh giá kiến thức sau khi học"""
+    """Post-quiz đánh giá kiến thức sau khi học - ưu tiên lấy từ quiz bank"""
+    quiz_data = await get_post_quiz_bank().get_quiz(career_goal)
+    if quiz_data:
+        print(f"🏦 Post-quiz từ quiz bank cho: {career_goal}")
+        return quiz_data
+
+    # Pool trống: get_quiz đã lên lịch refill, request này tự generate (qua LLM cache + coalescing)
+    quiz_data = await generate_post_quiz_with_ai(career_goal)
+    if quiz_data:
+        return quiz_data
+
+    return get_fallback_post_quiz(career_goal)
 
-    prompt = f"""
+def build_post_quiz_prompt(career_goal: str) -> str:
+    """Prompt post-quiz kiểm tra kiến thức theo career goal"""
+    return f"""
     Tạo quiz 5 câu kiểm tra kiến thức về {career_goal} sau khi học.
     Câu hỏi thực tế, ứng dụng, tập trung vào kiến thức quan trọng.
 
@@ -107,10 +126,14 @@ async def generate_post_quiz(career_goal: str):
     Chỉ trả về JSON, không có text nào khác.
     """
 
+async def generate_post_quiz_with_ai(career_goal: str, use_cache: bool = True):
+    """Gọi AI tạo post-quiz, trả về None nếu thất bại hoặc quiz không hợp lệ"""
+    prompt = build_post_quiz_prompt(career_goal)
+
     try:
-        response = openai_client.chat_completion([
+        response = await get_async_openai_client().chat_completion([
             {"role": "user", "content": prompt}
-        ])
+        ], use_cache=use_cache)
 
         if response:
             content = response.choices[0].message.content.strip()
@@ -123,17 +146,100 @@ async def generate_post_quiz(career_goal: str):
             content = content.strip()
 
             quiz_data = json.loads(content)
+            if not validate_quiz(quiz_data):
+                print("❌ Post-quiz từ AI không hợp lệ")
+                return None
+
             print(f"✅ Đã tạo post-quiz với {len(quiz_data.get('quiz', []))} câu hỏi")
             return quiz_data
         else:
-            return get_fallback_post_quiz(career_goal)
+            return None
 
     except json.JSONDecodeError as e:
         print(f"❌ Lỗi parse JSON từ AI: {e}")
-        return get_fallback_post_quiz(career_goal)
+        return None
     except Exception as e:
         print(f"❌ Lỗi tạo post-quiz: {e}")
-        return get_fallback_post_quiz(career_goal)
+        return None
+
+async def generate_post_quiz_for_bank(career_goal: str):
+    """Generator cho quiz bank - bỏ qua LLM cache để mỗi quiz trong pool khác nhau"""
+    return await generate_post_quiz_with_ai(career_goal, use_cache=False)
+
+# Pool post-quiz theo career goal - lazy initialization (không mở SQLite lúc import)
+post_quiz_bank = None
+_post_quiz_bank_lock = threading.Lock()
+
+def get_post_quiz_bank() -> QuizBank:
+    """Lazy initialization của post-quiz bank"""
+    global post_quiz_bank
+    if post_quiz_bank is None:
+        with _post_quiz_bank_lock:
+            if post_quiz_bank is None:
+                post_quiz_bank = QuizBank(generator=generate_post_quiz_for_bank)
+    return post_quiz_bank
+
+async def stream_quiz(career_goal: str, quiz_type: str = "pre-quiz", profile_analysis: dict = None):
+    """
+    Quiz dạng stream (async generator các event dict):
+    - 'start': gửi ngay để connection không bị idle
+    - 'question': mỗi câu hỏi ngay khi JSON của nó hoàn chỉnh trong stream của AI
+    - 'summary': kết quả validate toàn bộ quiz
+    Post-quiz có trong quiz bank thì trả ngay; AI lỗi thì dùng fallback quiz.
+    """
+    yield {"event": "start", "quiz_type": quiz_type, "career_goal": career_goal}
+
+    questions = []
+    source = "ai"
+    error = None
+
+    if quiz_type != "pre-quiz":
+        bank_quiz = await get_post_quiz_bank().get_quiz(career_goal)
+        if bank_quiz:
+            source = "quiz_bank"
+            for question in bank_quiz["quiz"]:
+                yield {"event": "question", "index": len(questions), "question": question}
+                questions.append(question)
+
+    if source == "ai":
+        if quiz_type == "pre-quiz":
+            prompt = build_pre_quiz_prompt(profile_analysis or {}, career_goal)
+        else:
+            prompt = build_post_quiz_prompt(career_goal)
+
+        parser = JSONArrayItemStreamParser()
+        try:
+            async for text in get_async_openai_client().chat_completion_stream([
+                {"role": "user", "content": prompt}
+            ]):
+                for question in parser.feed(text):
+                    yield {"event": "question", "index": len(questions), "question": question}
+                    questions.append(question)
+            # Đảm bảo toàn bộ response là JSON hợp lệ
+            parser.result()
+        except json.JSONDecodeError as e:
+            error = f"JSON không hợp lệ: {e}"
+        except Exception as e:
+            error = str(e)
+
+        if error:
+            print(f"❌ Lỗi stream quiz: {error}")
+
+    if not questions:
+        source = "fallback"
+        for question in get_fallback_quiz(quiz_type, career_goal)["quiz"]:
+            yield {"event": "question", "index": len(questions), "question": question}
+            questions.append(question)
+
+    invalid = [i for i, question in enumerate(questions) if not validate_question(question)]
+    yield {
+        "event": "summary",
+        "source": source,
+        "count": len(questions),
+        "valid": not invalid and error is None,
+        "invalid_questions": invalid,
+        "error": error
+    }
 
 def get_fallback_pre_quiz(career_goal: str):
     """Fallback pre-quiz khi AI fails"""
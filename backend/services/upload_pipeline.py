@@ -0,0 +1,51 @@
+# services/upload_pipeline.py
+import asyncio
+import time
+
+from services.profile_service import extract_profile_text, normalize_profile_async
+from services.quiz_service import generate_quiz
+from services.course_service import retrieve_candidate_courses
+
+async def _timed(timings: dict, stage: str, coro):
+    """Await coroutine và ghi thời gian (ms) của stage vào timings"""
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000, 1)
+
+async def analyze_uploaded_cv(filename: str, content: bytes, career_goal: str) -> dict:
+    """
+    Pipeline Upload CV → Parse → Analyze → Pre-quiz:
+    - parse: chạy trong process pool (CPU-bound), cache theo sha256 của file
+    - normalize, pre_quiz: LLM call async (quiz cần profile analysis nên chạy sau normalize)
+    - course_retrieval: chỉ phụ thuộc career_goal nên chạy speculative song song từ đầu
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    retrieval_task = asyncio.ensure_future(
+        _timed(timings, "course_retrieval", retrieve_candidate_courses(career_goal))
+    )
+    try:
+        text, detected = await _timed(timings, "parse", extract_profile_text(filename, content))
+        profile_analysis = await _timed(timings, "normalize", normalize_profile_async(text))
+        quiz_result = await _timed(
+            timings, "pre_quiz", generate_quiz(text, career_goal, "pre-quiz", profile_analysis)
+        )
+        course_candidates = await retrieval_task
+    finally:
+        if not retrieval_task.done():
+            retrieval_task.cancel()
+
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"⏱️ Upload pipeline: {timings}")
+
+    return {
+        "detected_type": detected,
+        "text": text,
+        "profile_analysis": profile_analysis,
+        "pre_quiz": quiz_result,
+        "course_candidates": course_candidates,
+        "timings": timings
+    }
@@ -0,0 +1,134 @@
+# test_bm25_index.py
+import math
+
+import chromadb
+import numpy as np
+import pytest
+
+from services.course_service import ChromaDBCourseService
+from utils.bm25_index import (
+    BM25_B, BM25_K1, BM25_SKILL_BOOST, BM25Index, BM25IndexError, build_bm25_index,
+    reciprocal_rank_fusion, tokenize
+)
+
+LEVELS = ['beginner', 'intermediate', 'advanced', 'expert', 'all levels', 'unknown level', '']
+TOPICS = ['python django rest api', 'react javascript frontend', 'docker kubernetes devops',
+          'sql database design', 'machine learning with python']
+
+def make_corpus(count: int = 60):
+    rng = np.random.default_rng(3)
+    ids, documents, metadatas = [], [], []
+    for i in range(count):
+        topic = TOPICS[i % len(TOPICS)]
+        ids.append(f"course-{i}")
+        documents.append(f"Course {i}: {topic}. " + " ".join(rng.choice(topic.split(), size=i % 7 + 1)))
+        metadatas.append({
+            'level': LEVELS[i % len(LEVELS)],
+            'rating': round(float(rng.uniform(3.0, 5.0)), 1),
+            'duration_hours': round(float(rng.uniform(0.5, 30.0)), 1),
+            'skills': 'Python' if 'python' in topic else '',
+        })
+    return ids, documents, metadatas
+
+@pytest.fixture(scope='module')
+def corpus():
+    return make_corpus()
+
+@pytest.fixture
+def index(tmp_path, corpus):
+    ids, documents, metadatas = corpus
+    build_bm25_index(ids, documents, metadatas, tmp_path / 'bm25' / 'udemy_courses__v1', 'udemy_courses__v1')
+    return BM25Index(tmp_path / 'bm25' / 'udemy_courses__v1')
+
+@pytest.fixture(scope='module')
+def chroma_collection(corpus):
+    ids, documents, metadatas = corpus
+    collection = chromadb.EphemeralClient().get_or_create_collection('bm25_filter_parity', embedding_function=None)
+    collection.add(ids=ids, documents=documents, metadatas=metadatas,
+                   embeddings=[[float(i), 1.0] for i in range(len(ids))])
+    return collection
+
+def brute_force_scores(query, documents, metadatas):
+    """BM25 tính thẳng theo công thức trên toàn bộ corpus (tham chiếu)"""
+    docs = [tokenize(doc) + tokenize(meta.get('skills', '')) * BM25_SKILL_BOOST
+            for doc, meta in zip(documents, metadatas)]
+    avgdl = sum(len(doc) for doc in docs) / len(docs)
+    scores = {}
+    for index, doc in enumerate(docs):
+        score = 0.0
+        for term in set(tokenize(query)):
+            tf = doc.count(term)
+            if not tf:
+                continue
+            df = sum(1 for other in docs if term in other)
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / avgdl))
+        if score:
+            scores[index] = score
+    return scores
+
+def test_scores_match_brute_force(index, corpus):
+    ids, documents, metadatas = corpus
+    for query in ('python api', 'docker', 'Machine Learning python', 'nothing matches'):
+        expected = brute_force_scores(query, documents, metadatas)
+        results = index.search(query, top_n=len(ids))
+        assert {course_id: score for course_id, score in results} == pytest.approx(
+            {ids[i]: score for i, score in expected.items()}, rel=1e-5
+        )
+        assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+def test_top_n_keeps_best_scores(index):
+    full = index.search('python database', top_n=1000)
+    top = index.search('python database', top_n=5)
+    assert [score for _, score in top] == pytest.approx([score for _, score in full[:5]])
+
+@pytest.mark.parametrize('experience_level, min_rating, min_duration_hours', [
+    ('beginner', None, None),
+    ('intermediate', 4.2, None),
+    ('expert', None, 10.0),
+    ('', 3.8, 5.0),
+])
+def test_filters_match_chroma_where_clause(index, chroma_collection, experience_level,
+                                            min_rating, min_duration_hours):
+    # Chỉ dùng các hàm build filter, không cần kết nối Chroma/OpenAI
+    service = ChromaDBCourseService.__new__(ChromaDBCourseService)
+    profile_analysis = {'experience_level': experience_level}
+    where = service.build_where_filter(profile_analysis, min_rating, min_duration_hours)
+    keyword_filter = service.keyword_filter(profile_analysis, min_rating, min_duration_hours)
+
+    # Query chứa mọi term -> BM25 trả về mọi doc qua được filter
+    query = ' '.join(TOPICS) + ' course'
+    allowed = set(chroma_collection.get(where=where)['ids'])
+    assert allowed
+    assert {course_id for course_id, _ in index.search(query, top_n=1000, **keyword_filter)} == allowed
+
+def test_threshold_equal_to_stored_value_is_kept(index, corpus):
+    # rating/duration lưu float32 trong index, ngưỡng bằng đúng giá trị metadata vẫn phải qua ($gte)
+    ids, _, metadatas = corpus
+    for i in (0, 1, 7):
+        rating, duration = metadatas[i]['rating'], metadatas[i]['duration_hours']
+        assert ids[i] in {course_id for course_id, _ in index.search(' '.join(TOPICS), 1000, min_rating=rating)}
+        assert ids[i] in {course_id for course_id, _ in index.search(' '.join(TOPICS), 1000, min_duration_hours=duration)}
+
+def test_unknown_level_filter_returns_nothing(index):
+    assert index.search('python', levels=['not a level']) == []
+
+def test_rejects_other_format(index):
+    (index.path / 'manifest.json').write_text('{"format": "other", "version": 1}', encoding='utf-8')
+    with pytest.raises(BM25IndexError):
+        BM25Index(index.path)
+
+def test_reciprocal_rank_fusion():
+    dense = ['a', 'b', 'c']
+    keyword = ['c', 'a', 'd']
+    fused = reciprocal_rank_fusion([dense, keyword], k=60)
+
+    assert [item_id for item_id, _ in fused] == ['a', 'c', 'b', 'd']
+    scores = dict(fused)
+    assert scores['a'] == pytest.approx(1 / 61 + 1 / 62)
+    assert scores['c'] == pytest.approx(1 / 63 + 1 / 61)
+    assert scores['d'] == pytest.approx(1 / 63)
+
+def test_reciprocal_rank_fusion_single_ranking_keeps_order():
+    assert [item_id for item_id, _ in reciprocal_rank_fusion([['x', 'y', 'z']])] == ['x', 'y', 'z']
+    assert reciprocal_rank_fusion([[], []]) == []
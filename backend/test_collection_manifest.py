@@ -0,0 +1,71 @@
+# test_collection_manifest.py
+import json
+import threading
+
+import pytest
+
+from utils import collection_manifest
+from utils.collection_manifest import (
+    manifest_path, read_manifest, versioned_collection_name, write_manifest
+)
+
+def test_write_then_read(tmp_path):
+    path = manifest_path(tmp_path / "chroma_db", "udemy_courses")
+    assert read_manifest(path) is None
+
+    write_manifest(path, "udemy_courses", versioned_collection_name("udemy_courses", 1), 1, count=524)
+    manifest = write_manifest(path, "udemy_courses", versioned_collection_name("udemy_courses", 2), 2, count=530)
+
+    assert read_manifest(path) == manifest
+    assert manifest["active"] == "udemy_courses__v2"
+    assert manifest["previous"] == "udemy_courses__v1"
+    assert manifest["count"] == 530
+    assert list(path.parent.iterdir()) == [path]
+
+def test_failed_write_keeps_previous_manifest(tmp_path, monkeypatch):
+    path = manifest_path(tmp_path, "udemy_courses")
+    write_manifest(path, "udemy_courses", "udemy_courses__v1", 1)
+
+    def broken_dump(obj, f, **kwargs):
+        f.write('{"alias": "udemy_courses", "act')
+        raise OSError("disk full")
+
+    monkeypatch.setattr(collection_manifest.json, "dump", broken_dump)
+    with pytest.raises(OSError):
+        write_manifest(path, "udemy_courses", "udemy_courses__v2", 2)
+    monkeypatch.undo()
+
+    assert read_manifest(path)["active"] == "udemy_courses__v1"
+
+def test_concurrent_reader_never_sees_partial_manifest(tmp_path):
+    path = manifest_path(tmp_path, "udemy_courses")
+    write_manifest(path, "udemy_courses", "udemy_courses__v0", 0, padding="x" * 50000)
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                assert manifest["active"] == versioned_collection_name("udemy_courses", manifest["version"])
+            except Exception as e:  # noqa: BLE001 - gom lỗi của thread để assert ở thread chính
+                errors.append(e)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        for version in range(1, 200):
+            write_manifest(path, "udemy_courses", versioned_collection_name("udemy_courses", version), version,
+                           padding="x" * 50000)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert errors == []
+    assert read_manifest(path)["version"] == 199
+
+def test_corrupt_manifest_reads_as_missing(tmp_path):
+    path = manifest_path(tmp_path, "udemy_courses")
+    path.write_text("{not json", encoding="utf-8")
+    assert read_manifest(path) is None
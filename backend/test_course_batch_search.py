@@ -0,0 +1,111 @@
+# test_course_batch_search.py
+import asyncio
+import json
+
+import pytest
+
+from services import course_service
+from services.course_service import ChromaDBCourseService, recommend_courses_batch
+
+class FakeCollection:
+    """collection.query giả: ghi lại từng lần query, lỗi với filter nằm trong fail_levels"""
+
+    def __init__(self, fail_levels=()):
+        self.calls = []
+        self.fail_levels = set(fail_levels)
+
+    def query(self, query_texts, n_results, where, include):
+        self.calls.append({'queries': list(query_texts), 'where': where})
+        if set(where['level']['$in']) & self.fail_levels:
+            raise RuntimeError("chroma down")
+        # Mỗi query trả về 1 course có document = chính query đó để kiểm tra thứ tự
+        return {
+            'ids': [[f"id-{query}"] for query in query_texts],
+            'documents': [[query] for query in query_texts],
+            'metadatas': [[{'title': query, 'level': 'all levels'}] for query in query_texts],
+            'distances': [[0.1] for _ in query_texts],
+        }
+
+def make_service(collection):
+    service = ChromaDBCourseService.__new__(ChromaDBCourseService)
+    service.collection = collection
+    service.keyword_index = None
+    service.enrichment_cache = None
+    service.enhance_concurrency = 4
+
+    async def no_refresh():
+        pass
+
+    async def no_enhance(course, profile_analysis, semaphore):
+        return course
+
+    service.refresh_collection_async = no_refresh
+    service._enhance_course = no_enhance
+    return service
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(course_service, 'CHROMA_QUERY_BATCH_SIZE', 2)
+    monkeypatch.setattr(course_service, 'COURSE_MIN_RATING', None)
+    monkeypatch.setattr(course_service, 'COURSE_MIN_DURATION_HOURS', None)
+    monkeypatch.setattr(course_service, 'HYBRID_CANDIDATES', 5)
+
+LEVELS = ['beginner', 'advanced', 'beginner', 'intermediate', 'beginner', 'advanced', 'beginner']
+SEARCHES = [(f"query {i}", {'experience_level': level}) for i, level in enumerate(LEVELS)]
+
+def test_groups_by_filter_chunks_and_keeps_order():
+    collection = FakeCollection()
+    service = make_service(collection)
+
+    results = asyncio.run(service.search_courses_batch(SEARCHES, top_k=3))
+
+    # Kết quả theo đúng thứ tự searches
+    assert [result['error'] for result in results] == [None] * len(SEARCHES)
+    assert [[course['text'] for course in result['courses']] for result in results] == [
+        [service._enhance_query(query, profile)] for query, profile in SEARCHES
+    ]
+
+    # 1 nhóm / filter, mỗi lần query tối đa CHROMA_QUERY_BATCH_SIZE query
+    by_filter = {}
+    for call in collection.calls:
+        assert 1 <= len(call['queries']) <= 2
+        by_filter.setdefault(json.dumps(call['where'], sort_keys=True), []).extend(call['queries'])
+    assert len(by_filter) == 3
+    assert len(collection.calls) == 2 + 1 + 1  # beginner: 4 query -> 2 chunk
+    for queries in by_filter.values():
+        levels = {profile['experience_level'] for query, profile in SEARCHES
+                  if service._enhance_query(query, profile) in queries}
+        assert len(levels) == 1
+
+def test_failed_group_marks_only_its_items():
+    service = make_service(FakeCollection(fail_levels={'advanced'}))
+
+    results = asyncio.run(service.search_courses_batch(SEARCHES, top_k=3))
+
+    for (_, profile), result in zip(SEARCHES, results):
+        if profile['experience_level'] == 'advanced':
+            assert result == {'courses': [], 'error': 'RuntimeError: chroma down'}
+        else:
+            assert result['error'] is None and len(result['courses']) == 1
+
+def test_missing_collection_marks_every_item():
+    service = make_service(None)
+    results = asyncio.run(service.search_courses_batch(SEARCHES[:2]))
+    assert [result['error'] for result in results] == ['ChromaDB collection not available'] * 2
+
+def test_recommend_batch_reports_error_per_item(monkeypatch):
+    service = make_service(FakeCollection(fail_levels={'intermediate'}))
+    monkeypatch.setattr(course_service, 'get_chroma_service', lambda: service)
+    requests = [
+        {'career_goal': 'Backend Developer', 'profile_analysis': {'experience_level': 'beginner'}},
+        {'career_goal': 'Data Scientist', 'profile_analysis': {'experience_level': 'intermediate'}},
+    ]
+
+    ok, failed = asyncio.run(recommend_courses_batch(requests, top_k=3))
+
+    assert ok['career_goal'] == 'Backend Developer'
+    assert ok['source'] == 'chromadb' and 'error' not in ok
+    assert failed['career_goal'] == 'Data Scientist'
+    assert failed['source'] == 'fallback'
+    assert failed['error'] == 'RuntimeError: chroma down'
+    assert failed['courses'] == course_service.get_fallback_courses('Data Scientist')
@@ -0,0 +1,80 @@
+# test_course_filters.py
+import pytest
+
+from services import course_service
+from services.course_service import ChromaDBCourseService
+
+# Chỉ dùng các hàm build filter, không cần kết nối Chroma/OpenAI
+service = ChromaDBCourseService.__new__(ChromaDBCourseService)
+
+EXPECTED_LEVELS = {
+    'beginner': ['beginner', 'all levels', 'unknown level', ''],
+    'intermediate': ['beginner', 'intermediate', 'all levels', 'unknown level', ''],
+    'advanced': ['beginner', 'intermediate', 'advanced', 'expert', 'all levels', 'unknown level', ''],
+    'expert': ['beginner', 'intermediate', 'advanced', 'expert', 'all levels', 'unknown level', ''],
+    # Không rõ / không có experience level: chỉ course mọi level hoặc không rõ level
+    'student': ['all levels', 'unknown level', ''],
+    '': ['all levels', 'unknown level', ''],
+}
+
+@pytest.fixture(autouse=True)
+def no_default_thresholds(monkeypatch):
+    monkeypatch.setattr(course_service, 'COURSE_MIN_RATING', None)
+    monkeypatch.setattr(course_service, 'COURSE_MIN_DURATION_HOURS', None)
+
+@pytest.mark.parametrize('experience_level', list(EXPECTED_LEVELS))
+def test_levels_only(experience_level):
+    profile_analysis = {'experience_level': experience_level}
+    levels = EXPECTED_LEVELS[experience_level]
+
+    assert service.suitable_levels(profile_analysis) == levels
+    assert service.build_where_filter(profile_analysis) == {'level': {'$in': levels}}
+    assert service.keyword_filter(profile_analysis) == {
+        'levels': levels, 'min_rating': None, 'min_duration_hours': None
+    }
+
+def test_experience_level_is_case_insensitive_and_optional():
+    assert service.suitable_levels({'experience_level': 'Intermediate'}) == EXPECTED_LEVELS['intermediate']
+    assert service.suitable_levels({'experience_level': None}) == EXPECTED_LEVELS['']
+    assert service.suitable_levels({}) == EXPECTED_LEVELS['']
+
+@pytest.mark.parametrize('experience_level', list(EXPECTED_LEVELS))
+@pytest.mark.parametrize('min_rating, min_duration_hours, extra', [
+    (4.5, None, [{'rating': {'$gte': 4.5}}]),
+    (None, 2, [{'duration_hours': {'$gte': 2.0}}]),
+    (4, 10.5, [{'rating': {'$gte': 4.0}}, {'duration_hours': {'$gte': 10.5}}]),
+])
+def test_thresholds_add_and_conditions(experience_level, min_rating, min_duration_hours, extra):
+    profile_analysis = {'experience_level': experience_level}
+    levels = EXPECTED_LEVELS[experience_level]
+
+    where = service.build_where_filter(profile_analysis, min_rating, min_duration_hours)
+    assert where == {'$and': [{'level': {'$in': levels}}] + extra}
+    assert all(isinstance(value, float) for condition in extra for value in next(iter(condition.values())).values())
+
+    assert service.keyword_filter(profile_analysis, min_rating, min_duration_hours) == {
+        'levels': levels, 'min_rating': min_rating, 'min_duration_hours': min_duration_hours
+    }
+
+def test_zero_threshold_means_no_filter():
+    where = service.build_where_filter({'experience_level': 'beginner'}, 0, 0)
+    assert where == {'level': {'$in': EXPECTED_LEVELS['beginner']}}
+
+def test_env_defaults_apply_when_request_has_no_threshold(monkeypatch):
+    monkeypatch.setattr(course_service, 'COURSE_MIN_RATING', 4.0)
+    monkeypatch.setattr(course_service, 'COURSE_MIN_DURATION_HOURS', 1.5)
+    profile_analysis = {'experience_level': 'advanced'}
+
+    assert service.build_where_filter(profile_analysis) == {'$and': [
+        {'level': {'$in': EXPECTED_LEVELS['advanced']}},
+        {'rating': {'$gte': 4.0}},
+        {'duration_hours': {'$gte': 1.5}},
+    ]}
+    assert service.keyword_filter(profile_analysis) == {
+        'levels': EXPECTED_LEVELS['advanced'], 'min_rating': 4.0, 'min_duration_hours': 1.5
+    }
+    # Giá trị của request ghi đè default
+    assert service.build_where_filter(profile_analysis, 3.5, 0) == {'$and': [
+        {'level': {'$in': EXPECTED_LEVELS['advanced']}},
+        {'rating': {'$gte': 3.5}},
+    ]}
@@ -0,0 +1,101 @@
+# test_data_analyzer.py
+import json
+import re
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from courses_analyzer.data_analyzer import LIST_COLUMNS, TEXT_COLUMNS, UdemyCourseAnalyzer
+
+CSV_PATH = Path(__file__).parent / 'data' / 'UDEMY_2025.csv'
+
+# Chỉ dùng các hàm xử lý DataFrame, không cần mở ChromaDB
+analyzer = UdemyCourseAnalyzer.__new__(UdemyCourseAnalyzer)
+
+def old_clean_text(text) -> str:
+    """clean_text row-wise trước khi vectorize (tham chiếu)"""
+    if pd.isna(text) or text is None:
+        return ""
+    text = str(text)
+    text = text.encode('utf-8', errors='ignore').decode('utf-8')
+    text = re.sub(r'[^\w\s\.,!?\-\(\)\[\]:]', ' ', text)
+    text = ' '.join(text.split())
+    return text.strip()
+
+def old_parse_list_field(field_value):
+    """
+    parse_list_field row-wise trước khi vectorize (tham chiếu).
+    Trả về (items, parsed_as_json): fallback split theo [,;] cắt sai item có dấu phẩy/nháy đơn.
+    """
+    if pd.isna(field_value) or field_value is None:
+        return [], True
+    field_value = str(field_value).strip()
+    if field_value.startswith('[') and field_value.endswith(']'):
+        try:
+            parsed_list = json.loads(field_value.replace("'", '"'))
+            return [old_clean_text(item) for item in parsed_list if item], True
+        except json.JSONDecodeError:
+            pass
+    items = re.split(r'[,;]', field_value.strip('[]'))
+    return [old_clean_text(item) for item in items if item.strip()], False
+
+TEXTS = [
+    'Python & Django: REST API (2025) — “Complete” Guide!!',
+    '  nhiều   khoảng\ttrắng\nvà xuống dòng  ',
+    'C++ / C# for .NET developers; 100% hands-on',
+    'Tiếng Việt có dấu: Lập trình viên Backend',
+    '',
+    None,
+    float('nan'),
+    'emoji 🚀 and zero​width',
+]
+
+def test_clean_text_series_matches_row_wise():
+    expected = [old_clean_text(text) for text in TEXTS]
+    assert analyzer.clean_text_series(pd.Series(TEXTS, dtype=object)).tolist() == expected
+
+LISTS = [
+    "['Build REST APIs', 'Deploy with Docker', 'Write unit tests']",
+    '["Item one", "Item two"]',
+    "['Zero\\u200bwidth space', 'Tab\\tseparated']",
+    "['Only one item']",
+    '[]',
+    'plain text, split by comma; and semicolon',
+    '',
+    None,
+]
+
+def test_parse_list_series_matches_row_wise():
+    expected = [old_parse_list_field(value)[0] for value in LISTS]
+    assert analyzer.parse_list_series(pd.Series(LISTS, dtype=object)).tolist() == expected
+
+def test_parse_list_series_keeps_items_with_commas_and_apostrophes():
+    value = "['Learn Python, Django and Flask', \"Don't repeat yourself\", 'SQL']"
+    old_items, parsed_as_json = old_parse_list_field(value)
+    assert not parsed_as_json
+    assert old_items == ['Learn Python', 'Django and Flask', 'Don t repeat yourself', 'SQL']
+
+    assert analyzer.parse_list_series(pd.Series([value])).tolist() == [
+        ['Learn Python, Django and Flask', 'Don t repeat yourself', 'SQL']
+    ]
+
+@pytest.mark.skipif(not CSV_PATH.exists(), reason='CSV mẫu không có')
+def test_real_csv_matches_row_wise_where_old_parser_succeeded():
+    df = pd.read_csv(CSV_PATH, usecols=list(TEXT_COLUMNS + LIST_COLUMNS), dtype=object)
+
+    for column in TEXT_COLUMNS:
+        assert analyzer.clean_text_series(df[column]).tolist() == [old_clean_text(v) for v in df[column]], column
+
+    fallback_rows = 0
+    for column in LIST_COLUMNS:
+        parsed = analyzer.parse_list_series(df[column]).tolist()
+        for row, (value, items) in enumerate(zip(df[column], parsed)):
+            old_items, parsed_as_json = old_parse_list_field(value)
+            if parsed_as_json:
+                assert items == old_items, (column, row)
+            else:
+                # Row cũ rơi vào fallback split theo [,;] và cắt item có dấu phẩy: giờ giữ nguyên item
+                fallback_rows += 1
+                assert len(items) <= len(old_items), (column, row)
+    assert fallback_rows < len(df)
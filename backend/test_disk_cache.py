@@ -0,0 +1,70 @@
+# test_disk_cache.py
+from utils import disk_cache
+from utils.disk_cache import SQLiteCache, content_hash
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+def make_cache(tmp_path, monkeypatch, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr(disk_cache.time, "time", clock.time)
+    return SQLiteCache(tmp_path / "cache.sqlite3", **kwargs), clock
+
+def test_get_set_roundtrip(tmp_path, monkeypatch):
+    cache, _ = make_cache(tmp_path, monkeypatch)
+    value = {"outcomes": ["Python", "Docker"], "score": 4.5, "nested": {"vi": "Tiếng Việt"}}
+    cache.set("k", value)
+    assert cache.get("k") == value
+    assert cache.get("missing") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_entry_expires_after_ttl(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, ttl_seconds=60)
+    cache.set("k", "v")
+
+    clock.now += 60
+    assert cache.get("k") == "v"
+
+    clock.now += 1
+    assert cache.get("k") is None
+    # Entry hết hạn bị xóa luôn
+    assert len(cache) == 0
+
+def test_purge_expired(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, ttl_seconds=60)
+    cache.set("old", 1)
+    clock.now += 45
+    cache.set("new", 2)
+    clock.now += 30
+
+    assert cache.purge_expired() == 1
+    assert cache.get("old") is None
+    assert cache.get("new") == 2
+
+def test_lru_evicts_least_recently_accessed(tmp_path, monkeypatch):
+    cache, clock = make_cache(tmp_path, monkeypatch, max_entries=3)
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        cache.set(key, key)
+
+    # Đọc "a" -> "b" thành entry ít được truy cập gần đây nhất
+    clock.now += 1
+    assert cache.get("a") == "a"
+    clock.now += 1
+    cache.set("d", "d")
+
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == ["a", "c", "d"]
+
+def test_entries_persist_across_instances(tmp_path):
+    SQLiteCache(tmp_path / "cache.sqlite3").set("k", [1, 2, 3])
+    assert SQLiteCache(tmp_path / "cache.sqlite3").get("k") == [1, 2, 3]
+
+def test_content_hash_is_order_independent_for_dict_keys():
+    assert content_hash({"a": 1, "b": 2}) == content_hash({"b": 2, "a": 1})
+    assert content_hash("course", {"a": 1}) != content_hash("profile", {"a": 1})
@@ -0,0 +1,78 @@
+# test_embedding_executor.py
+from functools import cached_property
+
+import numpy as np
+import pytest
+
+from utils import embedding_executor
+from utils.embedding_executor import (
+    INGEST_EMBEDDING_BATCH_CANDIDATES, EmbeddingExecutor, create_embedding_function
+)
+
+class FakeEmbeddingFunction:
+    """Embedding giả: vector = [số cuối document (-1 nếu không có), độ dài], ghi lại kích thước từng batch"""
+
+    def __init__(self, threads: int):
+        self.threads = threads
+        self.batch_sizes = []
+
+    def __call__(self, documents):
+        self.batch_sizes.append(len(documents))
+        return [[float(document.split()[-1]) if document[-1].isdigit() else -1.0, float(len(document))]
+                for document in documents]
+
+@pytest.fixture
+def executor(monkeypatch):
+    # Embedding function của worker là global của module - reset để dùng fake
+    monkeypatch.setattr(embedding_executor, "_worker_embedding_function", None)
+    executor = EmbeddingExecutor(workers=3, batch_size=0, backend="thread", threads=1,
+                                 embedding_function_factory=FakeEmbeddingFunction)
+    yield executor
+    executor.shutdown()
+
+DOCUMENTS = [f"course document {i}" for i in range(300)]
+
+def test_thread_backend_keeps_input_order(executor):
+    futures = executor.submit(DOCUMENTS, batch_size=7)
+    assert len(futures) == 43
+
+    embeddings = executor.gather(futures)
+    assert np.array_equal(np.asarray(embeddings)[:, 0], np.arange(len(DOCUMENTS), dtype=np.float32))
+    assert all(embedding.dtype == np.float32 for embedding in embeddings)
+    assert executor.stats()["rows"] == 300 and executor.stats()["jobs"] == 43
+
+    assert [embedding[0] for embedding in executor.embed(DOCUMENTS[:5])] == [0, 1, 2, 3, 4]
+
+def test_tune_batch_size_picks_a_candidate(executor):
+    batch_size = executor.tune_batch_size(DOCUMENTS)
+
+    assert batch_size in INGEST_EMBEDDING_BATCH_CANDIDATES
+    assert executor.batch_size == batch_size
+    # Sau khi tune, submit dùng batch size đã chọn
+    executor.submit(DOCUMENTS)
+    assert max(embedding_executor._worker_embedding_function.batch_sizes[-3:]) <= batch_size
+
+def test_tune_batch_size_small_sample_uses_default(executor):
+    assert executor.tune_batch_size(DOCUMENTS[:40]) == embedding_executor.INGEST_EMBEDDING_DEFAULT_BATCH_SIZE
+
+def test_onnx_internals_used_by_limit_threads_exist():
+    """chromadb đổi internals thì _limit_onnx_threads âm thầm dùng session mọi core -> fail ở đây"""
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+    assert isinstance(ONNXMiniLM_L6_V2.__dict__["model"], cached_property)
+    embedding_function = ONNXMiniLM_L6_V2()
+    for name in ("DOWNLOAD_PATH", "EXTRACTED_FOLDER_NAME", "_download_model_if_not_exists", "ort"):
+        assert hasattr(embedding_function, name), name
+
+def test_session_is_limited_to_requested_threads():
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+    model_dir = ONNXMiniLM_L6_V2.DOWNLOAD_PATH / ONNXMiniLM_L6_V2.EXTRACTED_FOLDER_NAME
+    if not (model_dir / "model.onnx").exists():
+        pytest.skip("Model ONNX chưa được tải")
+
+    embedding_function = create_embedding_function(threads=1)
+    assert "model" in embedding_function.__dict__
+    options = embedding_function.model.get_session_options()
+    assert (options.intra_op_num_threads, options.inter_op_num_threads) == (1, 1)
+    assert len(embedding_function(["python backend"])[0]) == 384
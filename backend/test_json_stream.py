@@ -0,0 +1,59 @@
+# test_json_stream.py
+import json
+import random
+
+from utils.json_stream import JSONArrayItemStreamParser
+
+QUIZ = {
+    "quiz": [
+        {"question": "Dấu { trong string?", "options": ["{", "}", "[", "]"], "answer": 0},
+        {"question": 'Escape \\" và \\\\ trong string', "options": ["a", "b"], "answer": 1},
+        {"question": "Nested", "meta": {"tags": [{"name": "x"}, {"name": "y"}]}, "answer": 2},
+    ],
+    "summary": {"total": 3},
+}
+
+def feed_chunks(text: str, sizes):
+    """Feed text theo từng chunk, trả về (parser, các item theo thứ tự nhận được)"""
+    parser = JSONArrayItemStreamParser()
+    items = []
+    position = 0
+    for size in sizes:
+        items.extend(parser.feed(text[position:position + size]))
+        position += size
+    items.extend(parser.feed(text[position:]))
+    return parser, items
+
+def test_items_emitted_for_every_split_point():
+    text = json.dumps(QUIZ, ensure_ascii=False)
+    for split in range(len(text) + 1):
+        _, items = feed_chunks(text, [split])
+        assert items == QUIZ["quiz"], f"split at {split}"
+
+def test_items_emitted_for_random_chunking():
+    text = json.dumps(QUIZ, ensure_ascii=False, indent=2)
+    rng = random.Random(0)
+    for _ in range(200):
+        sizes = [rng.randint(1, 7) for _ in range(len(text))]
+        _, items = feed_chunks(text, sizes)
+        assert items == QUIZ["quiz"]
+
+def test_item_emitted_as_soon_as_it_closes():
+    parser = JSONArrayItemStreamParser()
+    assert parser.feed('{"quiz": [{"question": "a"}') == [{"question": "a"}]
+    assert parser.feed(', {"question": "b", "options": ["}"') == []
+    assert parser.feed(']}') == [{"question": "b", "options": ["}"]}]
+
+def test_code_fence_and_prefix_text_ignored():
+    text = "Đây là quiz:\n```json\n" + json.dumps(QUIZ, ensure_ascii=False) + "\n```"
+    _, items = feed_chunks(text, [5] * (len(text) // 5))
+    assert items == QUIZ["quiz"]
+
+    fenced = JSONArrayItemStreamParser()
+    fenced.feed("```json\n" + json.dumps(QUIZ) + "\n```")
+    assert fenced.result() == QUIZ
+
+def test_text_after_root_object_ignored():
+    parser = JSONArrayItemStreamParser()
+    items = parser.feed('{"quiz": [{"a": 1}]} trailing {"quiz": [{"b": 2}]}')
+    assert items == [{"a": 1}]
@@ -0,0 +1,52 @@
+# test_llm_cache.py
+from utils import llm_cache
+from utils.disk_cache import SQLiteCache
+from utils.llm_cache import LLMResponseCache
+
+MESSAGES = [
+    {"role": "system", "content": "Bạn là trợ lý học tập"},
+    {"role": "user", "content": "Tạo quiz Python"},
+]
+
+def test_key_is_stable_for_equal_inputs():
+    reordered = [{"content": m["content"], "role": m["role"]} for m in MESSAGES]
+    assert LLMResponseCache.make_key("gpt-4o-mini", 0.7, MESSAGES) == \
+        LLMResponseCache.make_key("gpt-4o-mini", 0.7, reordered)
+
+def test_key_changes_with_model_temperature_and_messages():
+    base = LLMResponseCache.make_key("gpt-4o-mini", 0.7, MESSAGES)
+    assert LLMResponseCache.make_key("gpt-4o", 0.7, MESSAGES) != base
+    assert LLMResponseCache.make_key("gpt-4o-mini", 0.2, MESSAGES) != base
+    assert LLMResponseCache.make_key("gpt-4o-mini", 0.7, MESSAGES[1:]) != base
+    assert LLMResponseCache.make_key("gpt-4o-mini", 0.7, MESSAGES + [{"role": "user", "content": ""}]) != base
+    # Thứ tự message có ý nghĩa
+    assert LLMResponseCache.make_key("gpt-4o-mini", 0.7, MESSAGES[::-1]) != base
+
+def test_memory_lru_keeps_max_entries():
+    cache = LLMResponseCache(max_entries=2, ttl_seconds=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+def test_memory_entry_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = LLMResponseCache(ttl_seconds=10)
+    cache.set("a", {"id": "x"})
+    now[0] += 11
+    assert cache.get("a") is None
+
+def test_disk_tier_survives_restart_and_refills_memory(tmp_path):
+    path = tmp_path / "llm.sqlite3"
+    key = LLMResponseCache.make_key("gpt-4o-mini", 0.7, MESSAGES)
+    LLMResponseCache(disk_cache=SQLiteCache(path, table="llm_responses")).set(key, {"id": "chatcmpl-1"})
+
+    disk = SQLiteCache(path, table="llm_responses")
+    cache = LLMResponseCache(disk_cache=disk)
+    assert cache.get(key) == {"id": "chatcmpl-1"}
+    assert cache.get(key) == {"id": "chatcmpl-1"}
+    # Lần thứ 2 lấy từ memory, không đọc disk nữa
+    assert disk.hits == 1
@@ -0,0 +1,121 @@
+# test_openai_client.py
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from openai.types.chat import ChatCompletion
+
+from utils.llm_cache import LLMResponseCache
+from utils.openai_client import AsyncOpenAIClient
+
+MESSAGES = [{"role": "user", "content": "Tạo quiz Python"}]
+
+def status_error(status_code: int) -> openai.APIStatusError:
+    error_class = {400: openai.BadRequestError, 429: openai.RateLimitError}.get(status_code, openai.APIStatusError)
+    response = httpx.Response(status_code, request=httpx.Request("POST", "https://api.openai.test/v1/chat"))
+    return error_class(f"HTTP {status_code}", response=response, body=None)
+
+def make_completion(content: str = "ok") -> ChatCompletion:
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+    })
+
+class StubCompletions:
+    """chat.completions giả: mỗi lần gọi lấy 1 bước trong script (exception, số giây sleep, hoặc response)"""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        step = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, (int, float)):
+            await asyncio.sleep(step)
+            return make_completion()
+        return step
+
+@pytest.fixture
+def make_client(monkeypatch):
+    def init_stub(self):
+        self.http_client = None
+        self.client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+
+    monkeypatch.setattr(AsyncOpenAIClient, "_init_client", init_stub)
+    monkeypatch.setattr(AsyncOpenAIClient, "_backoff_delay", lambda self, attempt: 0.01)
+
+    def make(*script, **kwargs):
+        completions = StubCompletions(*script)
+        monkeypatch.setattr(AsyncOpenAIClient, "completions", completions, raising=False)
+        return AsyncOpenAIClient(**kwargs), completions
+
+    return make
+
+def test_retries_on_rate_limit_and_server_errors(make_client):
+    client, completions = make_client(status_error(429), status_error(503), make_completion("xin chào"))
+    response = asyncio.run(client.chat_completion(MESSAGES, use_cache=False))
+    assert response.choices[0].message.content == "xin chào"
+    assert completions.calls == 3
+
+def test_gives_up_after_max_retries(make_client):
+    client, completions = make_client(status_error(500), max_retries=2)
+    assert asyncio.run(client.chat_completion(MESSAGES, use_cache=False)) is None
+    assert completions.calls == 3
+
+def test_no_retry_on_bad_request(make_client):
+    client, completions = make_client(status_error(400), make_completion())
+    assert asyncio.run(client.chat_completion(MESSAGES, use_cache=False)) is None
+    assert completions.calls == 1
+
+def test_timeout_is_one_deadline_across_attempts(make_client):
+    # Upstream chậm: hết deadline ở lần thử đầu, không retry thêm max_retries lần nữa
+    client, completions = make_client(30, max_retries=3)
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(client._call_with_retries(lambda: completions.create(), timeout=0.2))
+    assert time.monotonic() - started < 1
+    assert completions.calls == 1
+
+    # Lỗi 5xx lặp lại: các lần retry + backoff vẫn nằm trong deadline
+    client, completions = make_client(status_error(503), status_error(503), 0.15, max_retries=10)
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(client._call_with_retries(lambda: completions.create(), timeout=0.1))
+    assert time.monotonic() - started < 1
+    assert completions.calls == 3
+
+def test_cancelled_error_propagates_without_retry(make_client):
+    client, completions = make_client(30)
+
+    async def scenario():
+        task = asyncio.ensure_future(client.chat_completion(MESSAGES, use_cache=False))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert completions.calls == 1
+    assert not client._semaphore.locked()
+
+def test_identical_inflight_calls_share_one_upstream_call(make_client):
+    client, completions = make_client(0.05, response_cache=LLMResponseCache(ttl_seconds=None))
+
+    async def scenario():
+        return await asyncio.gather(client.chat_completion(MESSAGES), client.chat_completion(MESSAGES))
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert completions.calls == 1
+    assert client._inflight == {}
+
+    # Lần sau lấy từ cache, không gọi upstream
+    assert asyncio.run(client.chat_completion(MESSAGES)).id == first.id
+    assert completions.calls == 1
@@ -0,0 +1,93 @@
+# test_parsing_executor.py
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+
+from utils import parsing_executor
+from utils.parsing_executor import ParsingError, ParsingExecutor, _is_pdf, _warm_up_job
+
+# Job chạy trong worker process (fork) - phải là hàm module-level
+def sleep_job(seconds: float) -> int:
+    time.sleep(seconds)
+    return os.getpid()
+
+def crash_job(counter_path: str) -> None:
+    with open(counter_path, "a", encoding="utf-8") as f:
+        f.write(f"{os.getpid()}\n")
+    os.kill(os.getpid(), signal.SIGTERM)
+
+@pytest.fixture
+def executor():
+    executor = ParsingExecutor(workers=2, timeout=1.0, memory_mb=0)
+    yield executor
+    executor.shutdown()
+
+def test_timed_out_job_kills_and_replaces_its_worker(executor):
+    async def scenario():
+        slow = asyncio.create_task(executor._run("slow", sleep_job, 30))
+        fast_pid = await executor._run("fast", sleep_job, 0.1)
+        slow_pid, = {worker.process.pid for worker in executor._running} - {fast_pid}
+        with pytest.raises(ParsingError, match="quá"):
+            await slow
+        # 2 job song song: 1 chạy trên worker cũ, 1 trên worker mới thay worker bị kill
+        pids = await asyncio.gather(executor._run("a", sleep_job, 0.2), executor._run("b", sleep_job, 0.2))
+        return fast_pid, slow_pid, set(pids)
+
+    started = time.monotonic()
+    fast_pid, slow_pid, pids = asyncio.run(scenario())
+
+    assert time.monotonic() - started < 10
+    assert (executor.timeouts, executor.restarts) == (1, 1)
+    alive = {child.pid for child in multiprocessing.active_children()}
+    assert slow_pid not in alive
+    assert fast_pid in pids and len(pids) == 2 and slow_pid not in pids
+
+def test_crashed_worker_retried_once_then_raises(executor, tmp_path):
+    counter = tmp_path / "attempts.txt"
+    with pytest.raises(ParsingError, match="crashed"):
+        asyncio.run(executor._run("crash", crash_job, str(counter)))
+
+    pids = counter.read_text(encoding="utf-8").split()
+    assert len(pids) == 2 and pids[0] != pids[1]
+    assert executor.crashes == 2
+    # Executor vẫn chạy được job tiếp theo
+    assert asyncio.run(executor._run("ok", _warm_up_job, None)) > 0
+
+def test_extensionless_non_pdf_skips_pdf_path(executor, monkeypatch):
+    async def no_pdf(*args):
+        raise AssertionError("không được đi vào nhánh PDF")
+
+    monkeypatch.setattr(executor, "_parse_pdf_parallel", no_pdf)
+    text = "Nguyen Van A - Backend developer, Python, Django, Docker"
+
+    assert asyncio.run(executor.parse("resume", text.encode())) == (text, "txt")
+    assert asyncio.run(executor.parse("notes.txt", b"%PDF-1.7 " + text.encode()))[1] == "txt"
+    assert not _is_pdf("resume", text.encode())
+    assert not _is_pdf("notes.txt", b"%PDF-1.7")
+    assert _is_pdf("resume", b"%PDF-1.7")
+    assert _is_pdf("CV.PDF", b"")
+
+def test_shutdown_leaves_no_child_processes(executor):
+    executor.start()
+    pids = {worker.process.pid for worker in executor._running}
+    assert len(pids) == 2
+
+    executor.shutdown()
+
+    assert not pids & {child.pid for child in multiprocessing.active_children()}
+    assert executor.stats()["busy"] == 0
+    # Dùng lại được sau shutdown, worker được tạo lại
+    assert asyncio.run(executor._run("again", _warm_up_job, None)) not in pids
+
+def test_falls_back_to_thread_when_processes_unavailable(monkeypatch):
+    class NoProcesses:
+        async def parse(self, filename, file_bytes):
+            raise OSError("fork not permitted")
+
+    monkeypatch.setattr(parsing_executor, "get_parsing_executor", lambda: NoProcesses())
+    result = asyncio.run(parsing_executor.extract_text_from_file_async("cv.txt", "Tiếng Việt".encode()))
+    assert result == ("Tiếng Việt", "txt")
@@ -0,0 +1,129 @@
+# test_pdf_ranges.py
+import asyncio
+import io
+import tempfile
+
+import pdfplumber
+import pytest
+
+from utils import file_parser, parsing_executor
+from utils.file_parser import count_pdf_pages, extract_pdf_page_range, extract_text_from_pdf_with_pdfplumber
+from utils.parsing_executor import ParsingExecutor
+
+def make_pdf(pages) -> bytes:
+    """
+    PDF tối thiểu, mỗi page là dict: text (dòng chữ, Helvetica) và/hoặc rect (khung kẻ như bảng)
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for page in pages:
+        content = b""
+        if page.get("text"):
+            content += b"BT /F1 12 Tf 72 720 Td (" + page["text"].encode("latin-1") + b") Tj ET\n"
+        if page.get("rect"):
+            content += b"72 500 200 100 re S 72 550 m 272 550 l S 172 500 m 172 600 l S\n"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"endstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objects)
+        )
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(page_refs) + b"] /Count %d >>" % len(pages)
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return output
+
+TEN_PAGES = make_pdf([{"text": f"Page {i:02d} Python"} for i in range(10)])
+
+def test_page_range_boundaries():
+    assert count_pdf_pages(TEN_PAGES) == 10
+    assert extract_pdf_page_range(TEN_PAGES, 0, 1) == ["Page 00 Python"]
+    assert extract_pdf_page_range(TEN_PAGES, 3, 6) == ["Page 03 Python", "Page 04 Python", "Page 05 Python"]
+    assert extract_pdf_page_range(TEN_PAGES, 8, 20) == ["Page 08 Python", "Page 09 Python"]
+    assert extract_pdf_page_range(TEN_PAGES, 4, 4) == []
+
+def test_page_range_from_path(tmp_path):
+    path = tmp_path / "cv.pdf"
+    path.write_bytes(TEN_PAGES)
+    assert count_pdf_pages(str(path)) == 10
+    assert extract_pdf_page_range(str(path), 2, 4) == extract_pdf_page_range(TEN_PAGES, 2, 4)
+
+def test_stops_early_when_budget_reached():
+    # Mỗi page 14 ký tự: budget 20 -> dừng sau page thứ 2
+    assert extract_pdf_page_range(TEN_PAGES, 0, 10, char_budget=20) == ["Page 00 Python", "Page 01 Python"]
+    assert extract_pdf_page_range(TEN_PAGES, 0, 10, char_budget=14) == ["Page 00 Python"]
+    assert len(extract_pdf_page_range(TEN_PAGES, 0, 10)) == 10
+    assert extract_text_from_pdf_with_pdfplumber(TEN_PAGES, max_pages=3, char_budget=0).count("Page") == 3
+
+def test_tables_only_extracted_on_pages_without_text_but_with_rulings(monkeypatch):
+    pdf = make_pdf([{"text": "Chi co chu"}, {}, {"rect": True}, {"text": "Chu va khung", "rect": True}])
+    calls = []
+
+    def fake_extract_tables(page, *args, **kwargs):
+        calls.append(page.page_number)
+        return [[["Python", None, "5 nam"]]]
+
+    monkeypatch.setattr(pdfplumber.page.Page, "extract_tables", fake_extract_tables)
+    assert extract_pdf_page_range(pdf, 0, 4) == ["Chi co chu", "Python |  | 5 nam", "Chu va khung"]
+    # Page trống không có đường kẻ thì bỏ qua extract_tables (chậm)
+    assert calls == [3]
+
+    with pdfplumber.open(io.BytesIO(pdf)) as opened:
+        assert [file_parser._has_table_rulings(page) for page in opened.pages] == [False, False, True, True]
+
+@pytest.fixture
+def range_jobs(monkeypatch):
+    """Ghi lại (start, end, char_budget) của các range job mà executor gửi đi"""
+    jobs = []
+    original_run = ParsingExecutor._run
+
+    async def recording_run(self, label, fn, *args):
+        if fn is parsing_executor._pdf_range_job:
+            assert isinstance(args[0], str)  # đường dẫn file tạm, không phải bytes
+            jobs.append(args[1:3] + args[4:])
+        return await original_run(self, label, fn, *args)
+
+    monkeypatch.setattr(ParsingExecutor, "_run", recording_run)
+    return jobs
+
+def run_parse(executor, file_bytes):
+    try:
+        return asyncio.run(executor.parse("cv.pdf", file_bytes))
+    finally:
+        executor.shutdown()
+
+def test_parallel_parse_matches_serial(range_jobs, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    executor = ParsingExecutor(workers=2, pages_per_job=3, char_budget=0, memory_mb=0)
+    text, detected = run_parse(executor, TEN_PAGES)
+
+    assert detected == "pdf"
+    assert text == extract_text_from_pdf_with_pdfplumber(TEN_PAGES, char_budget=0)
+    assert [job[:2] for job in range_jobs] == [(0, 3), (3, 6), (6, 9), (9, 10)]
+    # File tạm cho các range job đã được xóa
+    assert list(tmp_path.iterdir()) == []
+
+def test_budget_is_split_across_wave_and_stops_dispatch(range_jobs):
+    # 2 job / đợt, budget 30: mỗi job nhận 15 ký tự (= 2 page) thay vì cả 30
+    executor = ParsingExecutor(workers=2, pages_per_job=3, char_budget=30, memory_mb=0)
+    text, _ = run_parse(executor, TEN_PAGES)
+
+    assert range_jobs == [(0, 3, 15), (3, 6, 15)]
+    assert text.split("\n\n") == ["Page 00 Python", "Page 01 Python", "Page 03 Python"]
+
+def test_remaining_budget_goes_to_next_wave(range_jobs):
+    pdf = make_pdf([{"text": "x" * 10} if i < 4 else {} for i in range(8)] + [{"text": "tail"}])
+    executor = ParsingExecutor(workers=2, pages_per_job=2, char_budget=100, memory_mb=0)
+    text, _ = run_parse(executor, pdf)
+
+    # Đợt 1 extract 40 ký tự -> đợt 2 chia 60 ký tự còn lại, đợt 3 (1 job) nhận cả 60
+    assert range_jobs == [(0, 2, 50), (2, 4, 50), (4, 6, 30), (6, 8, 30), (8, 9, 60)]
+    assert text.endswith("tail")
@@ -0,0 +1,109 @@
+# test_profile_batch.py
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services import profile_batch
+from services.profile_batch import BatchUsage, normalize_profiles_batch, pack_items
+
+PROFILE = {"extracted_skills": ["python"], "experience_level": "beginner"}
+
+def make_items(*lengths):
+    return [{"id": str(i), "profile_text": "x" * length} for i, length in enumerate(lengths)]
+
+def make_response(response_id, content=None, prompt_tokens=100, completion_tokens=20, cached=False):
+    response = SimpleNamespace(
+        id=response_id,
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content or json.dumps(PROFILE)))],
+    )
+    if cached:
+        response._from_cache = True
+    return response
+
+async def collect(generator):
+    return [event async for event in generator]
+
+def test_pack_items_limits():
+    items = make_items(10, 5000, 20, 3000, 30, 40, 3001)
+    groups = pack_items(items, pack_size=3, max_chars=3000)
+
+    # CV dài (> max_chars) đi riêng, CV ngắn (<= max_chars) gộp tối đa pack_size
+    assert [[item["id"] for item in group] for group in groups] == [["1"], ["6"], ["0", "2", "3"], ["4", "5"]]
+    assert sorted(item["id"] for group in groups for item in group) == [item["id"] for item in items]
+
+def test_pack_items_disabled():
+    items = make_items(10, 20, 30)
+    assert pack_items(items, pack=False) == [[item] for item in items]
+    assert pack_items(items, pack_size=1) == [[item] for item in items]
+    assert pack_items([], pack_size=4) == []
+
+def test_batch_usage_counts_coalesced_and_cached_responses_once():
+    usage = BatchUsage()
+    shared = make_response("chatcmpl-1")
+    usage.add(shared)
+    # Request giống hệt chạy đồng thời dùng chung 1 upstream call -> cùng response id
+    usage.add(shared)
+    usage.add(make_response("chatcmpl-1"))
+    usage.add(make_response("chatcmpl-2", prompt_tokens=50, completion_tokens=10))
+    # Response từ LLM cache không tốn token
+    usage.add(make_response("chatcmpl-0", cached=True))
+
+    assert usage.to_dict() == {
+        "llm_calls": 2,
+        "cache_hits": 3,
+        "prompt_tokens": 150,
+        "completion_tokens": 30,
+        "total_tokens": 180,
+    }
+
+@pytest.fixture
+def no_profile_cache(monkeypatch):
+    cached = {}
+    monkeypatch.setattr(profile_batch, "get_cached_profile", lambda text: cached.get(text))
+    monkeypatch.setattr(profile_batch, "cache_profile", lambda text, profile: cached.__setitem__(text, profile))
+    return cached
+
+def test_worker_error_becomes_error_item(monkeypatch, no_profile_cache):
+    items = make_items(10, 20, 30, 40)
+    no_profile_cache[items[3]["profile_text"]] = PROFILE
+
+    async def fake_normalize_group(group, usage):
+        if group[0]["id"] == "1":
+            raise RuntimeError("upstream exploded")
+        return [{"status": "ok", "profile": PROFILE} for _ in group]
+
+    monkeypatch.setattr(profile_batch, "_normalize_group", fake_normalize_group)
+    events = asyncio.run(collect(normalize_profiles_batch(items, concurrency=2, pack=False)))
+
+    item_events = {event["id"]: event for event in events if event["event"] == "item"}
+    assert {item_id: event["status"] for item_id, event in item_events.items()} == {
+        "0": "ok", "1": "error", "2": "ok", "3": "cached"
+    }
+    assert item_events["1"]["error"] == "upstream exploded"
+    assert item_events["1"]["profile"] is None
+
+    report = events[-1]
+    assert report["event"] == "report"
+    assert report["statuses"] == {"ok": 2, "error": 1, "cached": 1}
+    assert (report["worker_errors"], report["unprocessed"]) == ([], 0)
+
+def test_identical_profiles_share_one_llm_call_in_report(monkeypatch, no_profile_cache):
+    shared = make_response("chatcmpl-shared")
+
+    class FakeClient:
+        async def chat_completion(self, messages, **kwargs):
+            # Client coalesce 2 request giống hệt -> cùng 1 response object
+            return shared
+
+    monkeypatch.setattr(profile_batch, "get_async_openai_client", lambda: FakeClient())
+    items = [{"id": "a", "profile_text": "Python dev"}, {"id": "b", "profile_text": "Python dev"}]
+    events = asyncio.run(collect(normalize_profiles_batch(items, concurrency=2, pack=False)))
+
+    report = events[-1]
+    assert report["statuses"] == {"ok": 2}
+    assert report["usage"]["llm_calls"] == 1
+    assert report["usage"]["cache_hits"] == 1
+    assert report["usage"]["total_tokens"] == 120
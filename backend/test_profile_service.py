@@ -0,0 +1,104 @@
+# test_profile_service.py
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services import profile_service
+from utils import disk_cache
+
+PROFILE = {"extracted_skills": ["python", "docker"], "experience_level": "intermediate"}
+
+@pytest.fixture(autouse=True)
+def profile_caches(tmp_path, monkeypatch):
+    """Cache profile riêng cho từng test (thư mục tạm, giới hạn entry nhỏ)"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(disk_cache.time, "time", lambda: now[0])
+    monkeypatch.setattr(profile_service, "PROFILE_PATH", tmp_path)
+    monkeypatch.setattr(profile_service, "PROFILE_CACHE_ENABLED", True)
+    monkeypatch.setattr(profile_service, "PARSED_UPLOAD_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.setattr(profile_service, "NORMALIZED_PROFILE_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.setattr(profile_service, "parsed_upload_cache", None)
+    monkeypatch.setattr(profile_service, "normalized_profile_cache", None)
+    return now
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    calls = []
+
+    async def fake_extract(filename, file_bytes):
+        calls.append(filename)
+        return file_bytes.decode(), "txt"
+
+    monkeypatch.setattr(profile_service, "extract_text_from_file_async", fake_extract)
+    return calls
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    calls = []
+
+    class FakeClient:
+        async def chat_completion(self, messages, **kwargs):
+            calls.append(messages)
+            message = SimpleNamespace(content=json.dumps(PROFILE))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    monkeypatch.setattr(profile_service, "get_async_openai_client", lambda: FakeClient())
+    return calls
+
+def test_repeated_upload_hits_parse_cache(parse_calls):
+    content = "Backend developer, 3 năm Python".encode()
+
+    first = asyncio.run(profile_service.extract_profile_text("cv.txt", content))
+    second = asyncio.run(profile_service.extract_profile_text("cv.txt", content))
+
+    assert first == second == ("Backend developer, 3 năm Python", "txt")
+    assert parse_calls == ["cv.txt"]
+    # Cùng bytes nhưng khác extension là key khác (detected_type phụ thuộc extension)
+    asyncio.run(profile_service.extract_profile_text("cv.md", content))
+    assert parse_calls == ["cv.txt", "cv.md"]
+
+def test_repeated_text_hits_normalized_profile_cache(llm_calls):
+    first = asyncio.run(profile_service.normalize_profile_async("Python   developer\n Docker"))
+    # Khác khoảng trắng vẫn cùng key
+    second = asyncio.run(profile_service.normalize_profile_async("Python developer Docker"))
+
+    assert first == second == PROFILE
+    assert len(llm_calls) == 1
+    # normalize_profile (sync) dùng chung cache
+    assert profile_service.normalize_profile("Python developer  Docker") == PROFILE
+    assert len(llm_calls) == 1
+
+def test_failed_normalize_is_not_cached(monkeypatch):
+    class FailingClient:
+        async def chat_completion(self, messages, **kwargs):
+            return None
+
+    monkeypatch.setattr(profile_service, "get_async_openai_client", lambda: FailingClient())
+    profile = asyncio.run(profile_service.normalize_profile_async("python docker"))
+    assert profile["extracted_skills"] == ["python", "docker"]
+    assert profile_service.get_cached_profile("python docker") is None
+
+def test_upload_cache_size_bound_evicts_oldest(parse_calls, profile_caches):
+    for name in ("a.txt", "b.txt", "c.txt"):
+        profile_caches[0] += 1
+        asyncio.run(profile_service.extract_profile_text(name, name.encode()))
+
+    upload_cache, _ = profile_service.get_profile_caches()
+    assert len(upload_cache) == 2
+    assert profile_service.get_cached_upload("a.txt", b"a.txt") is None
+    assert profile_service.get_cached_upload("c.txt", b"c.txt") == {"text": "c.txt", "detected_type": "txt"}
+
+    asyncio.run(profile_service.extract_profile_text("a.txt", b"a.txt"))
+    assert parse_calls == ["a.txt", "b.txt", "c.txt", "a.txt"]
+
+def test_profile_cache_size_bound_evicts_oldest(profile_caches):
+    for i in range(3):
+        profile_caches[0] += 1
+        profile_service.cache_profile(f"cv {i}", {"i": i})
+
+    _, profile_cache = profile_service.get_profile_caches()
+    assert len(profile_cache) == 2
+    assert profile_service.get_cached_profile("cv 0") is None
+    assert [profile_service.get_cached_profile(f"cv {i}") for i in (1, 2)] == [{"i": 1}, {"i": 2}]
@@ -0,0 +1,64 @@
+# test_profile_store.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from services import profile_store
+from services.profile_store import ProfileStore
+
+PROFILE = {"extracted_skills": ["python", "sql"], "experience_level": "beginner"}
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ProfileStore(tmp_path / "profiles.sqlite3")
+    monkeypatch.setattr(profile_store, "profile_store", store)
+    return store
+
+def test_save_returns_stable_id(store):
+    saved = store.save(PROFILE)
+    profile_id = saved["profile_id"]
+    assert profile_id and saved["processed_at"] > 0
+
+    # Lưu lại với cùng id (tham số hoặc có sẵn trong profile) -> cập nhật, không tạo bản mới
+    updated = store.save({**PROFILE, "experience_level": "intermediate"}, profile_id)
+    assert updated["profile_id"] == profile_id
+    assert store.save(updated)["profile_id"] == profile_id
+    assert len(store) == 1
+
+    assert store.save(PROFILE)["profile_id"] != profile_id
+    assert len(store) == 2
+
+def test_get_roundtrip(store):
+    saved = store.save({**PROFILE, "education_background": "Đại học Bách Khoa"})
+    assert store.get(saved["profile_id"]) == saved
+    assert store.get("missing") is None
+
+def test_persists_across_instances(store):
+    profile_id = store.save(PROFILE)["profile_id"]
+    assert ProfileStore(store.path).get(profile_id)["extracted_skills"] == ["python", "sql"]
+
+def test_delete(store):
+    profile_id = store.save(PROFILE)["profile_id"]
+    assert store.delete(profile_id)
+    assert store.get(profile_id) is None
+    assert not store.delete(profile_id)
+
+def test_load_profile_analysis(store):
+    profile_id = main.save_normalized_profile(PROFILE)["profile_id"]
+
+    assert main.load_profile_analysis(None) is None
+    assert main.load_profile_analysis(profile_id)["extracted_skills"] == ["python", "sql"]
+    with pytest.raises(HTTPException) as error:
+        main.load_profile_analysis("unknown-id")
+    assert error.value.status_code == 404
+
+def test_get_profile_endpoint_returns_404_for_unknown_id(store):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.api_get_profile("unknown-id"))
+    assert error.value.status_code == 404
+
+    profile_id = store.save(PROFILE)["profile_id"]
+    response = asyncio.run(main.api_get_profile(profile_id))
+    assert response["normalized_profile"]["profile_id"] == profile_id
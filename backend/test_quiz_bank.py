@@ -0,0 +1,110 @@
+# test_quiz_bank.py
+import asyncio
+
+from services.quiz_bank import QuizBank, normalize_goal, validate_quiz
+
+def make_quiz(tag: str) -> dict:
+    return {"quiz": [
+        {"question": f"{tag} câu {i}", "options": ["a", "b", "c", "d"], "answer": "B"} for i in range(3)
+    ]}
+
+class FakeGenerator:
+    """Generator giả: đếm số lần gọi theo goal, có thể chặn tới khi release"""
+
+    def __init__(self, result=make_quiz):
+        self.result = result
+        self.calls = {}
+        self.release = None
+
+    async def __call__(self, career_goal: str):
+        self.calls[career_goal] = self.calls.get(career_goal, 0) + 1
+        if self.release is not None:
+            await self.release.wait()
+        return self.result(career_goal)
+
+def make_bank(tmp_path, generator, **kwargs) -> QuizBank:
+    kwargs.setdefault("target_size", 3)
+    kwargs.setdefault("low_watermark", 2)
+    return QuizBank(generator, path=tmp_path / "quiz_bank.sqlite3", **kwargs)
+
+def test_miss_refills_up_to_target_size(tmp_path):
+    generator = FakeGenerator()
+    bank = make_bank(tmp_path, generator)
+
+    async def scenario():
+        assert await bank.get_quiz("Backend  Developer") is None
+        await bank._refilling[normalize_goal("Backend Developer")]
+        return await bank.get_quiz("backend developer")
+
+    quiz = asyncio.run(scenario())
+    assert validate_quiz(quiz)
+    assert generator.calls == {"Backend  Developer": 3}
+    # 3 quiz - 1 vừa lấy (served_count < max_serves nên vẫn còn trong pool)
+    assert bank.count("Backend Developer") == 3
+
+def test_below_low_watermark_schedules_one_refill_per_goal(tmp_path):
+    generator = FakeGenerator()
+    bank = make_bank(tmp_path, generator, max_serves=1)
+    for goal in ("Backend Developer", "Data Scientist"):
+        bank.add(goal, make_quiz(goal))
+        bank.add(goal, make_quiz(goal))
+
+    refills = []
+    original_refill = bank.refill
+
+    async def counting_refill(career_goal):
+        refills.append(normalize_goal(career_goal))
+        return await original_refill(career_goal)
+
+    bank.refill = counting_refill
+
+    async def scenario():
+        generator.release = asyncio.Event()
+        # max_serves=1: mỗi lần lấy xóa quiz -> pool xuống dưới low watermark
+        await asyncio.gather(*(
+            bank.get_quiz(goal) for goal in ("Backend Developer", "Data Scientist") * 2
+        ))
+        tasks = dict(bank._refilling)
+        generator.release.set()
+        await asyncio.gather(*tasks.values())
+        return tasks
+
+    tasks = asyncio.run(scenario())
+    assert sorted(tasks) == ["backend developer", "data scientist"]
+    # 2 request / goal trong lúc refill đang chạy nhưng chỉ có 1 refill cho mỗi goal
+    assert sorted(refills) == ["backend developer", "data scientist"]
+    assert bank.count("Backend Developer") == bank.count("Data Scientist") == 3
+
+def test_quiz_deleted_after_max_serves(tmp_path):
+    bank = make_bank(tmp_path, FakeGenerator(), max_serves=2)
+    bank.add("DevOps", make_quiz("devops"))
+
+    assert bank.take("DevOps") is not None
+    assert bank.count("DevOps") == 1
+    assert bank.take("DevOps") is not None
+    assert bank.count("DevOps") == 0
+    assert bank.take("DevOps") is None
+
+def test_invalid_quiz_never_added(tmp_path):
+    invalid = [
+        None,
+        {"quiz": []},
+        {"quiz": [{"question": "Thiếu option", "options": ["a", "b"], "answer": "A"}]},
+        {"quiz": [{"question": "Sai answer", "options": ["a", "b", "c", "d"], "answer": "E"}]},
+    ]
+    results = iter(invalid)
+    bank = make_bank(tmp_path, FakeGenerator(lambda goal: next(results)), target_size=4)
+
+    assert asyncio.run(bank.refill("Mobile Developer")) == 0
+    assert bank.count("Mobile Developer") == 0
+    assert not any(bank.add("Mobile Developer", quiz) for quiz in invalid)
+
+def test_warm_fills_only_goals_below_target(tmp_path):
+    generator = FakeGenerator()
+    bank = make_bank(tmp_path, generator)
+    for _ in range(3):
+        bank.add("Frontend Developer", make_quiz("fe"))
+
+    asyncio.run(bank.warm(["Frontend Developer", "Fullstack Developer"]))
+    assert generator.calls == {"Fullstack Developer": 3}
+    assert bank.stats()["pools"] == {"frontend developer": 3, "fullstack developer": 3}
@@ -0,0 +1,111 @@
+# test_vector_store.py
+import numpy as np
+
+from utils import vector_store
+from utils.disk_cache import SQLiteCache
+from utils.vector_store import BACKEND_KEYWORDS, VectorIndex, embed_batch, get_local_embedding
+
+def make_docs(count: int, titles: int, dim: int = 8, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "course_title": f"Course {i % titles}",
+            "text": f"python backend {i}" if i % 3 == 0 else f"design {i}",
+            "embedding": rng.normal(size=dim).tolist(),
+        }
+        for i in range(count)
+    ]
+
+def brute_force_top_k_unique(scores, titles, top_k):
+    """Sort toàn bộ, giữ document score cao nhất của mỗi title"""
+    picked, seen = [], set()
+    for i in sorted(range(len(scores)), key=lambda i: -scores[i]):
+        if titles[i] not in seen:
+            seen.add(titles[i])
+            picked.append(i)
+    return picked[:top_k]
+
+def test_top_k_unique_matches_brute_force():
+    rng = np.random.default_rng(1)
+    for count, titles in [(1, 1), (10, 10), (50, 3), (200, 40), (1000, 7), (1000, 1000)]:
+        docs = make_docs(count, titles)
+        index = VectorIndex.from_docs(docs)
+        doc_titles = [doc["course_title"] for doc in docs]
+        for top_k in (1, 3, 5, 20, count + 5):
+            scores = rng.random(count).astype(np.float32)
+            expected = brute_force_top_k_unique(scores, doc_titles, top_k)
+            assert index.top_k_unique(scores, top_k).tolist() == expected, (count, titles, top_k)
+
+def test_top_k_unique_widens_pool_when_titles_repeat():
+    # 200 bản ghi đầu cùng title và có score cao nhất: pool ban đầu (top_k * 4) chỉ có 1 title
+    docs = [{"course_title": "Dup", "text": "", "embedding": [1.0]} for _ in range(200)]
+    docs += [{"course_title": f"Other {i}", "text": "", "embedding": [1.0]} for i in range(5)]
+    index = VectorIndex.from_docs(docs)
+    scores = np.concatenate([np.linspace(1.0, 0.9, 200), np.linspace(0.5, 0.1, 5)]).astype(np.float32)
+
+    picked = index.top_k_unique(scores, 3)
+    assert [docs[i]["course_title"] for i in picked] == ["Dup", "Other 0", "Other 1"]
+
+def test_top_k_unique_empty_cases():
+    index = VectorIndex.from_docs(make_docs(5, 5))
+    assert index.top_k_unique(np.zeros(5, dtype=np.float32), 0).tolist() == []
+    assert VectorIndex.from_docs([]).top_k_unique(np.zeros(0, dtype=np.float32), 3).tolist() == []
+
+def test_search_uses_cosine_when_embeddings_present():
+    docs = make_docs(100, 100, dim=16)
+    index = VectorIndex.from_docs(docs)
+    query = np.asarray(docs[42]["embedding"]) * 3.0
+
+    results = index.search("anything", top_k=5, query_embedding=query.tolist())
+    assert results[0]["course_title"] == "Course 42"
+    assert abs(results[0]["similarity"] - 1.0) < 1e-5
+
+    matrix = np.asarray([doc["embedding"] for doc in docs])
+    cosine = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    assert [r["course_title"] for r in results] == [f"Course {i}" for i in np.argsort(-cosine)[:5]]
+
+def test_search_falls_back_to_keywords_without_embeddings():
+    docs = [{"course_title": f"C{i}", "text": text} for i, text in enumerate(["python django api", "painting", "sql"])]
+    index = VectorIndex.from_docs(docs)
+    assert not index.has_embeddings
+
+    results = index.search("python api developer", top_k=2)
+    assert results[0]["course_title"] == "C0"
+    assert abs(results[0]["similarity"] - 2 / len(BACKEND_KEYWORDS)) < 1e-6
+
+def test_local_embedding_is_deterministic_and_normalized():
+    vector = get_local_embedding("Python backend developer")
+    assert vector == get_local_embedding("Python backend developer")
+    assert len(vector) == vector_store.LOCAL_EMBEDDING_DIM
+    assert abs(np.linalg.norm(vector) - 1.0) < 1e-5
+    assert not np.any(get_local_embedding(""))
+
+def test_local_embedding_similar_text_scores_higher():
+    query = np.asarray(get_local_embedding("python django backend"))
+    related = np.asarray(get_local_embedding("backend development with python and django"))
+    unrelated = np.asarray(get_local_embedding("watercolor painting for beginners"))
+    assert query @ related > query @ unrelated
+
+def test_embed_batch_caches_and_dedupes(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_create_embeddings(texts, model):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    monkeypatch.setattr(vector_store, "create_embeddings", fake_create_embeddings)
+    monkeypatch.setattr(vector_store, "_embedding_cache", SQLiteCache(tmp_path / "emb.sqlite3", table="embeddings"))
+
+    assert embed_batch(["aa", "b", "aa", "cccc"], batch_size=2) == [[2.0, 1.0], [1.0, 1.0], [2.0, 1.0], [4.0, 1.0]]
+    # Text trùng chỉ embed 1 lần, chia batch theo batch_size
+    assert calls == [["aa", "b"], ["cccc"]]
+
+    assert embed_batch(["cccc", "dd"]) == [[4.0, 1.0], [2.0, 1.0]]
+    assert calls[-1] == ["dd"]
+
+def test_embed_batch_falls_back_to_local_for_whole_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "create_embeddings", lambda texts, model: None)
+    monkeypatch.setattr(vector_store, "_embedding_cache", SQLiteCache(tmp_path / "emb.sqlite3", table="embeddings"))
+
+    texts = ["python api", "sql database"]
+    assert embed_batch(texts) == [get_local_embedding(text) for text in texts]
@@ -0,0 +1,89 @@
+# test_vectorstore_format.py
+import json
+
+import numpy as np
+import pytest
+
+from utils.vector_store import BACKEND_KEYWORDS, VectorIndex
+from utils.vectorstore_format import (
+    MappedVectorstore, VectorstoreFormatError, convert_vectorstore
+)
+
+def make_docs(count: int = 30, dim: int = 12):
+    rng = np.random.default_rng(7)
+    return [
+        {
+            "course_title": f"Khóa học {i % 10}",
+            "text": "Python REST api với Django" if i % 2 else "Thiết kế đồ họa – “Photoshop”",
+            "url": f"https://example.com/{i}",
+            "embedding": rng.normal(size=dim).astype(np.float32).tolist(),
+        }
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def store_dir(tmp_path):
+    path = tmp_path / "embedded_docs_bin"
+    convert_vectorstore(make_docs(), path, BACKEND_KEYWORDS)
+    return path
+
+def test_roundtrip_records_and_embeddings(store_dir):
+    docs = make_docs()
+    store = MappedVectorstore(store_dir, verify_checksum=True)
+    try:
+        assert store.count == len(docs)
+        assert store.dim == 12
+        for i, doc in enumerate(docs):
+            expected = {key: value for key, value in doc.items() if key != "embedding"}
+            assert store.record(i) == expected
+        np.testing.assert_array_equal(store.embeddings, np.asarray([d["embedding"] for d in docs], dtype=np.float32))
+        np.testing.assert_allclose(store.norms, np.linalg.norm(store.embeddings, axis=1), rtol=1e-6)
+    finally:
+        store.close()
+
+def test_mapped_index_matches_in_memory_index(store_dir):
+    docs = make_docs()
+    store = MappedVectorstore(store_dir)
+    try:
+        mapped = VectorIndex.from_mapped(store)
+        in_memory = VectorIndex.from_docs(docs)
+        query = docs[3]["embedding"]
+        assert mapped.search("python api", 5, query) == in_memory.search("python api", 5, query)
+        assert mapped.search("python api", 5) == in_memory.search("python api", 5)
+    finally:
+        store.close()
+
+def test_checksum_mismatch_detected(store_dir):
+    data = bytearray((store_dir / "records.bin").read_bytes())
+    data[-2] ^= 0x01
+    (store_dir / "records.bin").write_bytes(bytes(data))
+
+    with pytest.raises(VectorstoreFormatError, match="records.bin"):
+        MappedVectorstore(store_dir, verify_checksum=True)
+    # Không verify thì vẫn mở được (verify là tùy chọn vì phải đọc toàn bộ file)
+    MappedVectorstore(store_dir).close()
+
+def test_unsupported_version_rejected(store_dir):
+    manifest_path = store_dir / "manifest.json"
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    manifest["version"] = 99
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+    with pytest.raises(VectorstoreFormatError, match="99"):
+        MappedVectorstore(store_dir)
+
+def test_convert_rejects_mismatched_dimensions(tmp_path):
+    docs = make_docs(3)
+    docs[1]["embedding"] = docs[1]["embedding"][:5]
+    with pytest.raises(VectorstoreFormatError):
+        convert_vectorstore(docs, tmp_path / "out", BACKEND_KEYWORDS)
+    assert not (tmp_path / "out").exists()
+
+def test_reconvert_replaces_directory(store_dir):
+    convert_vectorstore(make_docs(5), store_dir, BACKEND_KEYWORDS)
+    store = MappedVectorstore(store_dir, verify_checksum=True)
+    try:
+        assert store.count == 5
+    finally:
+        store.close()
+    assert not store_dir.with_name(store_dir.name + ".tmp").exists()
@@ -0,0 +1,248 @@
+# utils/bm25_index.py
+"""
+Inverted index BM25 cho course documents (keyword search chạy cạnh dense search của Chroma).
+
+Thư mục index (1 thư mục / collection version, nằm trong CHROMA_DB_PATH/bm25/<collection>):
+- manifest.json        : format, version, collection, count, avgdl, k1, b, levels
+- vocab.json           : term -> term_id
+- ids.json             : course id theo doc index
+- term_offsets.npy     : offset postings của từng term (int64, vocab + 1)
+- postings_docs.npy    : doc index của từng posting (int32)
+- postings_weights.npy : điểm BM25 tính sẵn của từng posting (idf * tf đã chuẩn hóa, float32)
+- levels.npy / ratings.npy / duration_hours.npy : metadata để lọc giống where filter của Chroma
+
+Điểm BM25 được tính sẵn lúc build nên query chỉ cần cộng weight của postings (np.bincount),
+các file .npy mở bằng mmap.
+
+Build: python -m utils.bm25_index build --chroma-path ./chroma_db --collection udemy_courses
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FORMAT_NAME = "course-bm25"
+FORMAT_VERSION = 1
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Term trong metadata 'skills' được đếm thêm N lần (keyword công nghệ trong title)
+BM25_SKILL_BOOST = int(os.getenv("BM25_SKILL_BOOST", "2"))
+RRF_K = 60
+
+# Giữ c++, c#, node.js, asp.net... thành 1 token
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+STOPWORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "into", "is", "it",
+    "of", "on", "or", "the", "this", "to", "with", "you", "your", "will", "can", "all",
+))
+
+class BM25IndexError(Exception):
+    pass
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if token not in STOPWORDS]
+
+def index_dir(chroma_path, collection_name: str) -> Path:
+    return Path(chroma_path) / "bm25" / collection_name
+
+def build_bm25_index(ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[dict],
+                     output_dir, collection_name: str = "") -> dict:
+    """Ghi index cho (ids, documents, metadatas) ra output_dir (ghi thư mục tạm rồi rename), trả về manifest"""
+    output_dir = Path(output_dir)
+    vocab: Dict[str, int] = {}
+    doc_terms: List[Dict[int, int]] = []
+    doc_lengths = np.zeros(len(ids), dtype=np.float32)
+
+    for doc_index, (document, metadata) in enumerate(zip(documents, metadatas)):
+        tokens = tokenize(document) + tokenize((metadata or {}).get("skills", "")) * BM25_SKILL_BOOST
+        counts: Dict[int, int] = {}
+        for token in tokens:
+            term_id = vocab.setdefault(token, len(vocab))
+            counts[term_id] = counts.get(term_id, 0) + 1
+        doc_terms.append(counts)
+        doc_lengths[doc_index] = len(tokens)
+
+    count = len(ids)
+    avgdl = float(doc_lengths.mean()) if count else 0.0
+
+    # Postings theo term: gom (term, doc, tf) rồi sắp theo term -> CSR
+    term_ids = np.fromiter((term for counts in doc_terms for term in counts), dtype=np.int64)
+    doc_indexes = np.fromiter(
+        (doc for doc, counts in enumerate(doc_terms) for _ in counts), dtype=np.int32, count=len(term_ids)
+    )
+    tfs = np.fromiter((tf for counts in doc_terms for tf in counts.values()), dtype=np.float32, count=len(term_ids))
+    order = np.argsort(term_ids, kind="stable")
+    term_ids, doc_indexes, tfs = term_ids[order], doc_indexes[order], tfs[order]
+
+    document_frequency = np.bincount(term_ids, minlength=len(vocab)).astype(np.float64)
+    idf = np.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[doc_indexes] / (avgdl or 1.0))
+    weights = (idf[term_ids] * tfs * (BM25_K1 + 1) / (tfs + norm)).astype(np.float32)
+    term_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(document_frequency.astype(np.int64), out=term_offsets[1:])
+
+    level_names = sorted({str((metadata or {}).get("level", "")) for metadata in metadatas})
+    level_codes = {level: code for code, level in enumerate(level_names)}
+
+    tmp_dir = output_dir.with_name(output_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    np.save(tmp_dir / "term_offsets.npy", term_offsets)
+    np.save(tmp_dir / "postings_docs.npy", doc_indexes)
+    np.save(tmp_dir / "postings_weights.npy", weights)
+    np.save(tmp_dir / "levels.npy", np.array(
+        [level_codes[str((metadata or {}).get("level", ""))] for metadata in metadatas], dtype=np.int16
+    ).reshape(count))
+    np.save(tmp_dir / "ratings.npy", np.array(
+        [float((metadata or {}).get("rating") or 0.0) for metadata in metadatas], dtype=np.float32
+    ).reshape(count))
+    np.save(tmp_dir / "duration_hours.npy", np.array(
+        [float((metadata or {}).get("duration_hours") or 0.0) for metadata in metadatas], dtype=np.float32
+    ).reshape(count))
+    with open(tmp_dir / "vocab.json", "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    with open(tmp_dir / "ids.json", "w", encoding="utf-8") as f:
+        json.dump(list(ids), f)
+
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "collection": collection_name,
+        "count": count,
+        "terms": len(vocab),
+        "postings": int(len(weights)),
+        "avgdl": avgdl,
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "skill_boost": BM25_SKILL_BOOST,
+        "levels": level_names,
+    }
+    with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    return manifest
+
+def build_index_from_collection(collection, output_dir, page_size: int = 1000) -> dict:
+    """Đọc toàn bộ documents + metadatas của Chroma collection (theo trang) rồi build index"""
+    ids, documents, metadatas = [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        offset += len(page["ids"])
+    return build_bm25_index(ids, documents, metadatas, output_dir, collection_name=collection.name)
+
+class BM25Index:
+    """Index BM25 đã build, postings/metadata mở bằng mmap"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        manifest_path = self.path / "manifest.json"
+        if not manifest_path.exists():
+            raise BM25IndexError(f"Không tìm thấy manifest: {manifest_path}")
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_NAME or self.manifest.get("version") != FORMAT_VERSION:
+            raise BM25IndexError(
+                f"Index {self.manifest.get('format')} v{self.manifest.get('version')} không được hỗ trợ"
+            )
+
+        self.count = self.manifest["count"]
+        self.level_codes = {level: code for code, level in enumerate(self.manifest["levels"])}
+        with open(self.path / "vocab.json", "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        with open(self.path / "ids.json", "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+
+        self.term_offsets = np.load(self.path / "term_offsets.npy", mmap_mode="r")
+        self.postings_docs = np.load(self.path / "postings_docs.npy", mmap_mode="r")
+        self.postings_weights = np.load(self.path / "postings_weights.npy", mmap_mode="r")
+        self.levels = np.load(self.path / "levels.npy", mmap_mode="r")
+        self.ratings = np.load(self.path / "ratings.npy", mmap_mode="r")
+        self.duration_hours = np.load(self.path / "duration_hours.npy", mmap_mode="r")
+
+        if len(self.ids) != self.count or len(self.term_offsets) != len(self.vocab) + 1:
+            raise BM25IndexError("Kích thước index không khớp với manifest")
+
+    def search(self, query: str, top_n: int = 20, levels: Optional[Iterable[str]] = None,
+               min_rating: Optional[float] = None, min_duration_hours: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Top_n (course_id, điểm BM25) cho query, lọc level/rating/thời lượng giống where filter"""
+        term_ids = {self.vocab[token] for token in tokenize(query) if token in self.vocab}
+        if not term_ids or not self.count:
+            return []
+
+        docs = np.concatenate([self.postings_docs[self.term_offsets[t]:self.term_offsets[t + 1]] for t in term_ids])
+        weights = np.concatenate([self.postings_weights[self.term_offsets[t]:self.term_offsets[t + 1]] for t in term_ids])
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+
+        # Chỉ lọc trên doc có chứa term của query, không quét toàn bộ metadata
+        keep = np.ones(len(candidates), dtype=bool)
+        if levels is not None:
+            codes = [self.level_codes[level] for level in levels if level in self.level_codes]
+            keep &= np.isin(self.levels[candidates], codes)
+        if min_rating:
+            keep &= self.ratings[candidates] >= min_rating
+        if min_duration_hours:
+            keep &= self.duration_hours[candidates] >= min_duration_hours
+        candidates, scores = candidates[keep], scores[keep]
+
+        if len(candidates) > top_n:
+            top = np.argpartition(-scores, top_n)[:top_n]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(self.ids[candidates[i]], float(scores[i])) for i in order]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Gộp nhiều ranking (list id đã xếp hạng) bằng RRF: score = sum 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build / kiểm tra BM25 index của course collection")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build index từ Chroma collection")
+    build_parser.add_argument("--chroma-path", default=os.getenv("CHROMA_DB_PATH", "./chroma_db"))
+    build_parser.add_argument("--collection", help="Tên collection (mặc định: collection active của alias)")
+    build_parser.add_argument("--alias", default=os.getenv("COLLECTION_NAME", "udemy_courses"))
+
+    search_parser = subparsers.add_parser("search", help="Thử query trên index")
+    search_parser.add_argument("path")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--top", type=int, default=10)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        import chromadb
+        from utils.collection_manifest import manifest_path, read_manifest
+
+        manifest = read_manifest(manifest_path(args.chroma_path, args.alias))
+        name = args.collection or (manifest["active"] if manifest else args.alias)
+        collection = chromadb.PersistentClient(path=args.chroma_path).get_collection(name)
+        result = build_index_from_collection(collection, index_dir(args.chroma_path, name))
+        print(f"✅ BM25 index {name}: {result['count']} documents, {result['terms']} terms")
+    else:
+        index = BM25Index(args.path)
+        for course_id, score in index.search(args.query, top_n=args.top):
+            print(f"{score:8.3f}  {course_id}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# utils/collection_manifest.py
+"""
+Alias cho Chroma collection (blue/green reindex).
+Manifest nhỏ nằm cạnh dữ liệu Chroma, trỏ alias -> collection version đang active:
+
+    {"alias": "udemy_courses", "active": "udemy_courses__v3", "version": 3, "count": 524, ...}
+
+Reindex build vào collection version mới, validate xong mới ghi manifest (atomic rename),
+service đọc lại manifest khi file thay đổi để chuyển sang version mới không cần restart.
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+def manifest_path(chroma_path, alias: str) -> Path:
+    return Path(chroma_path) / f"{alias}.manifest.json"
+
+def versioned_collection_name(alias: str, version: int) -> str:
+    return f"{alias}__v{version}"
+
+def read_manifest(path) -> Optional[dict]:
+    """Manifest hiện tại hoặc None nếu chưa có (dùng collection tên alias như cũ)"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Không đọc được manifest {path}: {e}")
+        return None
+
+def write_manifest(path, alias: str, collection_name: str, version: int, **extra) -> dict:
+    """Trỏ alias sang collection_name - ghi file tạm rồi os.replace để reader không thấy file ghi dở"""
+    path = Path(path)
+    previous = read_manifest(path) or {}
+    manifest = {
+        "alias": alias,
+        "active": collection_name,
+        "version": version,
+        "previous": previous.get("active"),
+        "updated_at": time.time(),
+        **extra,
+    }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return manifest
@@ -0,0 +1,171 @@
+# utils/embedding_executor.py
+"""
+Tính embedding cho ingest ChromaDB song song trên nhiều core.
+
+Embedding function mặc định của Chroma chạy ngay trong collection.add/upsert (1 thread, dựng lại
+ONNX session mỗi lần gọi). Ở đây mỗi worker giữ 1 session all-MiniLM-L6-v2 (cùng model với default
+của Chroma nên vector dùng chung được với query), ingest truyền embeddings tính sẵn vào upsert.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+INGEST_EMBEDDING_WORKERS = int(os.getenv("INGEST_EMBEDDING_WORKERS", str(os.cpu_count() or 2)))
+# Số document / job embedding; 0 = tự đo và chọn trong INGEST_EMBEDDING_BATCH_CANDIDATES
+INGEST_EMBEDDING_BATCH_SIZE = int(os.getenv("INGEST_EMBEDDING_BATCH_SIZE", "0"))
+INGEST_EMBEDDING_BATCH_CANDIDATES = (16, 32, 64, 128)
+INGEST_EMBEDDING_DEFAULT_BATCH_SIZE = 32
+INGEST_EMBEDDING_BACKEND = os.getenv("INGEST_EMBEDDING_BACKEND", "process")  # process | thread
+# ONNX intra-op threads / worker: mặc định session dùng mọi core, N worker sẽ tranh nhau
+INGEST_EMBEDDING_THREADS = int(os.getenv("INGEST_EMBEDDING_THREADS", "1"))
+
+def _limit_onnx_threads(embedding_function, threads: int) -> None:
+    """
+    Dựng sẵn ONNX session với intra_op_num_threads = threads (model là cached_property).
+    Dùng thuộc tính nội bộ của ONNXMiniLM_L6_V2 (DOWNLOAD_PATH, EXTRACTED_FOLDER_NAME,
+    _download_model_if_not_exists) - chromadb được pin trong requirements.txt, đổi version thì
+    chạy lại test_embedding_executor.py.
+    """
+    try:
+        embedding_function._download_model_if_not_exists()
+        ort = embedding_function.ort
+        options = ort.SessionOptions()
+        options.log_severity_level = 3
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        providers = [p for p in ort.get_available_providers() if p != "CoreMLExecutionProvider"]
+        embedding_function.__dict__["model"] = ort.InferenceSession(
+            os.path.join(embedding_function.DOWNLOAD_PATH, embedding_function.EXTRACTED_FOLDER_NAME, "model.onnx"),
+            providers=providers,
+            sess_options=options
+        )
+    except Exception as e:
+        # Session mặc định dùng mọi core trong MỖI worker process -> giảm INGEST_EMBEDDING_WORKERS
+        print(f"⚠️ Không giới hạn được ONNX threads, dùng session mặc định (mọi core / worker): {e}")
+
+def create_embedding_function(threads: int = INGEST_EMBEDDING_THREADS):
+    """Cùng model với DefaultEmbeddingFunction của Chroma, nhưng giữ 1 session cho cả worker"""
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+    embedding_function = ONNXMiniLM_L6_V2()
+    if threads > 0:
+        _limit_onnx_threads(embedding_function, threads)
+    return embedding_function
+
+# Embedding function của worker (process: 1 / process, thread: dùng chung)
+_worker_embedding_function = None
+_worker_lock = threading.Lock()
+
+def _init_worker(factory: Callable, threads: int) -> None:
+    global _worker_embedding_function
+    with _worker_lock:
+        if _worker_embedding_function is None:
+            _worker_embedding_function = factory(threads)
+
+def _embed_job(documents: Sequence[str]) -> np.ndarray:
+    return np.asarray(_worker_embedding_function(list(documents)), dtype=np.float32)
+
+class EmbeddingExecutor:
+    """
+    Pool tính embedding cho ingest:
+    - process (mặc định): mỗi worker 1 ONNX session giới hạn thread -> throughput scale theo số core
+    - thread: các thread dùng chung 1 session (ONNX nhả GIL khi chạy model)
+    - submit() chia documents thành các job batch_size và trả về futures ngay, caller ghi Chroma
+      trong lúc worker embed các batch sau (pipeline)
+    - tune_batch_size(): đo throughput các batch size trên mẫu document, chọn batch nhanh nhất
+    """
+
+    def __init__(self, workers: int = INGEST_EMBEDDING_WORKERS, batch_size: int = INGEST_EMBEDDING_BATCH_SIZE,
+                 backend: str = INGEST_EMBEDDING_BACKEND, threads: int = INGEST_EMBEDDING_THREADS,
+                 embedding_function_factory: Callable = create_embedding_function):
+        self.workers = max(1, workers)
+        # None = chưa tune
+        self.batch_size = batch_size if batch_size > 0 else None
+        self.backend = backend
+        self.threads = threads
+        self.embedding_function_factory = embedding_function_factory
+        self.rows = 0
+        self.jobs = 0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                pool_class = ThreadPoolExecutor if self.backend == "thread" else ProcessPoolExecutor
+                self._pool = pool_class(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.embedding_function_factory, self.threads)
+                )
+            return self._pool
+
+    def start(self) -> float:
+        """Khởi động worker và load model trước (không tính vào thời gian tune/ingest), trả về ms"""
+        started = time.perf_counter()
+        pool = self._get_pool()
+        list(pool.map(_embed_job, [["warm up"]] * self.workers))
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    def submit(self, documents: Sequence[str], batch_size: int = None) -> List[Future]:
+        """Chia documents thành job batch_size, trả về futures theo đúng thứ tự"""
+        batch_size = batch_size or self.batch_size or INGEST_EMBEDDING_DEFAULT_BATCH_SIZE
+        pool = self._get_pool()
+        futures = [
+            pool.submit(_embed_job, documents[start:start + batch_size])
+            for start in range(0, len(documents), batch_size)
+        ]
+        self.jobs += len(futures)
+        self.rows += len(documents)
+        return futures
+
+    @staticmethod
+    def gather(futures: List[Future]) -> List[np.ndarray]:
+        """Chờ các job của 1 lần submit, trả về list embedding theo thứ tự documents"""
+        return [embedding for future in futures for embedding in future.result()]
+
+    def embed(self, documents: Sequence[str]) -> List[np.ndarray]:
+        return self.gather(self.submit(documents))
+
+    def tune_batch_size(self, documents: Sequence[str], candidates=INGEST_EMBEDDING_BATCH_CANDIDATES) -> int:
+        """
+        Embed mẫu documents với từng batch size, giữ batch size có rows/s cao nhất.
+        Mẫu quá nhỏ (không chia được cho mọi worker) thì dùng INGEST_EMBEDDING_DEFAULT_BATCH_SIZE.
+        """
+        candidates = [size for size in candidates if size * self.workers <= len(documents)]
+        if len(candidates) < 2:
+            self.batch_size = self.batch_size or INGEST_EMBEDDING_DEFAULT_BATCH_SIZE
+            return self.batch_size
+
+        self.start()
+        throughput = {}
+        for size in candidates:
+            started = time.perf_counter()
+            self.gather(self.submit(documents, batch_size=size))
+            throughput[size] = len(documents) / (time.perf_counter() - started)
+
+        self.batch_size = max(throughput, key=throughput.get)
+        print(f"📐 Embedding batch size: {self.batch_size} "
+              f"({', '.join(f'{size}: {rate:.0f} rows/s' for size, rate in throughput.items())})")
+        return self.batch_size
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "backend": self.backend,
+            "threads": self.threads,
+            "batch_size": self.batch_size,
+            "rows": self.rows,
+            "jobs": self.jobs,
+        }
@@ -1,44 +1,82 @@
 # backend/utils/file_parser.py
 import io
-from typing import Tuple
+from typing import List, Optional, Tuple, Union
 import os
 from docx import Document
 
 # pdfplumber
 import pdfplumber
 
+# normalize_profile chỉ cần đủ text của CV - dừng extract PDF khi đạt số ký tự này (0 = không giới hạn)
+PDF_CHAR_BUDGET = int(os.getenv("PDF_CHAR_BUDGET", "30000"))
+
 def extract_text_from_docx(file_bytes: bytes) -> str:
     doc = Document(io.BytesIO(file_bytes))
     paragraphs = [p.text for p in doc.paragraphs if p.text]
     return "\n".join(paragraphs).strip()
 
-def extract_text_from_pdf_with_pdfplumber(file_bytes: bytes) -> str:
+def _has_table_rulings(page) -> bool:
+    """Page có đường kẻ/khung (lines, rects) - điều kiện cần để extract_tables() tìm được bảng"""
+    return bool(page.lines or page.rects)
+
+def _extract_page_chunks(page) -> List[str]:
+    """Text của 1 page; page không có text thì thử đọc bảng (chỉ khi page có đường kẻ)"""
+    # .extract_text() returns text; for complex layouts you can try .extract_text(x_tolerance=... )
+    page_text = page.extract_text()
+    if page_text:
+        return [page_text]
+
+    chunks = []
+    # if page has no text but has tables, extract tables as CSV-like text
+    # extract_tables() rất chậm, bỏ qua page không có đường kẻ bảng
+    if _has_table_rulings(page):
+        tables = page.extract_tables()
+        for table in tables or []:
+            # flatten table rows
+            for row in table:
+                # join non-empty cells
+                chunks.append(" | ".join([cell if cell is not None else "" for cell in row]))
+    return chunks
+
+def _open_pdf(source: Union[bytes, str]):
+    """source: bytes của file hoặc đường dẫn file PDF"""
+    # pdfplumber expects a file-like object
+    return pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+def count_pdf_pages(source: Union[bytes, str]) -> int:
+    with _open_pdf(source) as pdf:
+        return len(pdf.pages)
+
+def extract_pdf_page_range(source: Union[bytes, str], start: int, end: int,
+                           char_budget: Optional[int] = None) -> List[str]:
     """
-    Extract text from PDF using pdfplumber. This tries to extract
-    page by page and returns concatenated text. Handles many layouts better.
+    Extract các page [start, end) của PDF (bytes hoặc đường dẫn), trả về list text chunk theo thứ tự page.
+    Dừng sớm khi tổng số ký tự đạt char_budget.
     """
     text_pages = []
-    # pdfplumber expects a file-like object
-    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-        for page in pdf.pages:
+    total_chars = 0
+    with _open_pdf(source) as pdf:
+        for page in pdf.pages[start:end]:
             try:
-                # .extract_text() returns text; for complex layouts you can try .extract_text(x_tolerance=... )
-                page_text = page.extract_text()
-                if page_text:
-                    text_pages.append(page_text)
-                else:
-                    # if page has no text but has tables, extract tables as CSV-like text
-                    tables = page.extract_tables()
-                    if tables:
-                        for table in tables:
-                            # flatten table rows
-                            for row in table:
-                                # join non-empty cells
-                                row_text = " | ".join([cell if cell is not None else "" for cell in row])
-                                text_pages.append(row_text)
+                chunks = _extract_page_chunks(page)
             except Exception:
                 # if extraction fails for a page, skip it but continue
                 continue
+            text_pages.extend(chunks)
+            total_chars += sum(len(chunk) for chunk in chunks)
+            if char_budget and total_chars >= char_budget:
+                break
+    return text_pages
+
+def extract_text_from_pdf_with_pdfplumber(file_bytes: bytes, max_pages: Optional[int] = None,
+                                          char_budget: Optional[int] = PDF_CHAR_BUDGET) -> str:
+    """
+    Extract text from PDF using pdfplumber. This tries to extract
+    page by page and returns concatenated text. Handles many layouts better.
+    Only the first max_pages pages are read when max_pages is set, and
+    extraction stops once char_budget characters have been collected.
+    """
+    text_pages = extract_pdf_page_range(file_bytes, 0, max_pages or None, char_budget or None)
     return "\n\n".join(text_pages).strip()
 
 def extract_text_from_txt(file_bytes: bytes, encoding="utf-8") -> str:
@@ -47,15 +85,15 @@ def extract_text_from_txt(file_bytes: bytes, encoding="utf-8") -> str:
     except Exception:
         return file_bytes.decode(errors="ignore")
 
-def extract_text_from_file(filename: str, file_bytes: bytes) -> Tuple[str, str]:
+def extract_text_from_file(filename: str, file_bytes: bytes, max_pages: Optional[int] = None) -> Tuple[str, str]:
     """
     Return tuple (text, detected_type) where detected_type is 'pdf'|'docx'|'txt'|'unknown'
-    Uses pdfplumber for PDFs.
+    Uses pdfplumber for PDFs (at most max_pages pages).
     """
     lower = filename.lower()
     if lower.endswith(".pdf"):
         try:
-            text = extract_text_from_pdf_with_pdfplumber(file_bytes)
+            text = extract_text_from_pdf_with_pdfplumber(file_bytes, max_pages)
             return text, "pdf"
         except Exception:
             # fallback: try decode as txt
@@ -70,7 +108,7 @@ def extract_text_from_file(filename: str, file_bytes: bytes) -> Tuple[str, str]:
 
     # fallback heuristics: try pdfplumber first
     try:
-        text = extract_text_from_pdf_with_pdfplumber(file_bytes)
+        text = extract_text_from_pdf_with_pdfplumber(file_bytes, max_pages)
         if len(text) > 20:
             return text, "pdf"
     except Exception:
@@ -0,0 +1,74 @@
+# utils/json_stream.py
+import json
+from typing import List
+
+class JSONArrayItemStreamParser:
+    """
+    Parser JSON tăng dần cho response dạng {"quiz": [ {...}, {...} ]} được stream từng token.
+    feed() trả về các object trong array cấp 1 của root object ngay khi object đó đóng ngoặc,
+    không cần chờ toàn bộ response. Bỏ qua text/markdown (```json) trước root object.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._position = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._item_start = None
+        self._root_closed = False
+
+    def feed(self, chunk: str) -> List[dict]:
+        """Thêm chunk text, trả về các item vừa hoàn chỉnh"""
+        self.buffer += chunk
+        items = []
+
+        while self._position < len(self.buffer):
+            char = self.buffer[self._position]
+
+            if self._root_closed:
+                break
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif not self._stack and char != "{":
+                # Chưa vào root object (vd: ```json)
+                pass
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and self._stack == ["{", "["]:
+                    self._item_start = self._position
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if char == "}" and self._stack == ["{", "["] and self._item_start is not None:
+                    raw_item = self.buffer[self._item_start:self._position + 1]
+                    self._item_start = None
+                    try:
+                        items.append(json.loads(raw_item))
+                    except json.JSONDecodeError:
+                        pass
+                if not self._stack:
+                    self._root_closed = True
+
+            self._position += 1
+
+        return items
+
+    def result(self) -> dict:
+        """Parse toàn bộ buffer khi stream kết thúc (raise nếu JSON không hợp lệ)"""
+        content = self.buffer.strip()
+        if content.startswith("```json"):
+            content = content[7:]
+        elif content.startswith("```"):
+            content = content[3:]
+        if content.endswith("```"):
+            content = content[:-3]
+        return json.loads(content.strip())
@@ -0,0 +1,90 @@
+# utils/llm_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from utils.disk_cache import SQLiteCache, content_hash, env_float
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")  # bật tầng disk khi được set
+LLM_CACHE_DISK_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "20000"))
+LLM_CACHE_TTL = env_float("LLM_CACHE_TTL") or 24 * 3600
+
+class LLMResponseCache:
+    """
+    Cache cho chat completion, key = (model, temperature, messages).
+    Hai tầng: LRU trong memory + SQLiteCache trên disk (tùy chọn).
+    Value là dict (response.model_dump()) để lưu được ra disk.
+    Muốn thay backend khác chỉ cần object có get(key)/set(key, value).
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, disk_cache: Optional[SQLiteCache] = None,
+                 ttl_seconds: Optional[float] = LLM_CACHE_TTL):
+        self.max_entries = max(1, max_entries)
+        self.disk_cache = disk_cache
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: list) -> str:
+        return content_hash("chat_completion", model, temperature, messages)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self.ttl_seconds is None or time.time() - stored_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    return value
+                del self._memory[key]
+
+        if self.disk_cache is None:
+            return None
+
+        value = self.disk_cache.get(key)
+        if value is not None:
+            self._set_memory(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._set_memory(key, value)
+        if self.disk_cache is not None:
+            self.disk_cache.set(key, value)
+
+    def _set_memory(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._memory[key] = (time.time(), value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "memory_entries": len(self._memory),
+            "memory_max_entries": self.max_entries,
+            "disk": self.disk_cache.stats() if self.disk_cache is not None else None,
+        }
+
+def create_default_llm_cache() -> Optional[LLMResponseCache]:
+    """Cache mặc định theo env; None nếu LLM_CACHE_ENABLED=0"""
+    if not LLM_CACHE_ENABLED:
+        return None
+
+    disk_cache = None
+    if LLM_CACHE_PATH:
+        try:
+            disk_cache = SQLiteCache(
+                LLM_CACHE_PATH,
+                table="llm_responses",
+                ttl_seconds=LLM_CACHE_TTL,
+                max_entries=LLM_CACHE_DISK_MAX_ENTRIES
+            )
+        except Exception as e:
+            print(f"⚠️ LLM disk cache disabled: {e}")
+
+    return LLMResponseCache(disk_cache=disk_cache)
@@ -1,9 +1,14 @@
 # utils/openai_client.py
 import os
-from openai import OpenAI
+import asyncio
+import random
+import threading
+from concurrent.futures import Future
 from dotenv import load_dotenv
 import logging
 
+from utils.llm_cache import LLMResponseCache, create_default_llm_cache
+
 # Load environment variables
 load_dotenv()
 
@@ -11,29 +16,63 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Cấu hình cho async client: connection pool, concurrency, retry, timeout
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "16"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "8"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+def _resolve_credentials():
+    """Lấy (api_key, base_url) từ environment, raise nếu thiếu key"""
+    # Ưu tiên các API key từ .env của bạn
+    api_key = (
+        os.getenv("OPENAI_API_KEY_GPT4O") or
+        os.getenv("OPENAI_API_KEY_EMBED") or
+        os.getenv("OPENAI_API_KEY")  # Fallback
+    )
+
+    base_url = os.getenv("OPENAI_BASE_URL")
+
+    if not api_key:
+        logger.error("❌ Không tìm thấy OpenAI API key trong environment variables")
+        logger.info("🔍 Kiểm tra các biến môi trường:")
+        logger.info(f"   OPENAI_API_KEY_GPT4O: {'✅' if os.getenv('OPENAI_API_KEY_GPT4O') else '❌'}")
+        logger.info(f"   OPENAI_API_KEY_EMBED: {'✅' if os.getenv('OPENAI_API_KEY_EMBED') else '❌'}")
+        logger.info(f"   OPENAI_API_KEY: {'✅' if os.getenv('OPENAI_API_KEY') else '❌'}")
+        raise ValueError("OpenAI API key is required")
+
+    return api_key, base_url
+
+def _chat_completion_from_cache(data):
+    """Dựng lại ChatCompletion object từ dict đã cache"""
+    from openai.types.chat import ChatCompletion
+
+    response = ChatCompletion.model_validate(data)
+    # Đánh dấu response lấy từ cache (không phải API call, không tốn token) - xem is_cached_response
+    response._from_cache = True
+    return response
+
+def is_cached_response(response) -> bool:
+    return bool(getattr(response, "_from_cache", False))
+
 class OpenAIClient:
-    def __init__(self):
+    def __init__(self, response_cache=None):
+        # response_cache: object có get(key)/set(key, value), vd LLMResponseCache
+        self.response_cache = response_cache
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
         self._init_client()
 
     def _init_client(self):
         """Initialize OpenAI client với các API key có sẵn"""
         try:
-            # Ưu tiên các API key từ .env của bạn
-            api_key = (
-                os.getenv("OPENAI_API_KEY_GPT4O") or
-                os.getenv("OPENAI_API_KEY_EMBED") or
-                os.getenv("OPENAI_API_KEY")  # Fallback
-            )
-
-            base_url = os.getenv("OPENAI_BASE_URL")
+            # Import SDK khi khởi tạo client (import openai mất ~1s, không làm chậm startup)
+            from openai import OpenAI
 
-            if not api_key:
-                logger.error("❌ Không tìm thấy OpenAI API key trong environment variables")
-                logger.info("🔍 Kiểm tra các biến môi trường:")
-                logger.info(f"   OPENAI_API_KEY_GPT4O: {'✅' if os.getenv('OPENAI_API_KEY_GPT4O') else '❌'}")
-                logger.info(f"   OPENAI_API_KEY_EMBED: {'✅' if os.getenv('OPENAI_API_KEY_EMBED') else '❌'}")
-                logger.info(f"   OPENAI_API_KEY: {'✅' if os.getenv('OPENAI_API_KEY') else '❌'}")
-                raise ValueError("OpenAI API key is required")
+            api_key, base_url = _resolve_credentials()
 
             self.client = OpenAI(
                 api_key=api_key,
@@ -65,12 +104,51 @@ class OpenAIClient:
             logger.error(f"❌ OpenAI connection test failed: {e}")
             return False
 
-    def chat_completion(self, messages, model="gpt-4o-mini", temperature=0.7):
-        """Generate chat completion với error handling"""
+    def chat_completion(self, messages, model="gpt-4o-mini", temperature=0.7, use_cache=True):
+        """
+        Generate chat completion với error handling.
+        Response được cache theo (model, temperature, messages); các request giống hệt
+        đang chạy song song được gộp thành 1 lời gọi upstream.
+        """
         if not self.client:
             logger.error("❌ OpenAI client not available")
             return None
 
+        cache = self.response_cache if use_cache else None
+        if cache is None:
+            return self._create_chat_completion(messages, model, temperature)
+
+        key = LLMResponseCache.make_key(model, temperature, messages)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info("⚡ LLM cache hit")
+            return _chat_completion_from_cache(cached)
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not is_leader:
+            logger.info("🔗 Coalesced với request đang chạy")
+            return future.result()
+
+        try:
+            response = self._create_chat_completion(messages, model, temperature)
+            if response is not None:
+                cache.set(key, response.model_dump())
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _create_chat_completion(self, messages, model, temperature):
         try:
             response = self.client.chat.completions.create(
                 model=model,
@@ -103,27 +181,312 @@ class OpenAIClient:
             logger.error(f"❌ Embedding error: {e}")
             return None
 
+    def create_embeddings(self, texts, model="text-embedding-3-small"):
+        """Create embeddings cho nhiều text trong 1 request, giữ đúng thứ tự input"""
+        if not self.client:
+            logger.error("❌ OpenAI client not available")
+            return None
+
+        try:
+            # Truncate very long texts
+            inputs = [text[:8000] for text in texts]
+
+            response = self.client.embeddings.create(
+                model=model,
+                input=inputs
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            logger.error(f"❌ Batch embedding error: {e}")
+            return None
+
+class AsyncOpenAIClient:
+    """
+    Async counterpart của OpenAIClient để không block event loop:
+    - Một httpx.AsyncClient dùng chung (connection pool + keep-alive)
+    - Semaphore giới hạn số request đồng thời tới OpenAI
+    - Retry với exponential backoff + jitter cho 429/5xx/lỗi kết nối
+    - timeout là deadline chung cho mọi lần thử (kể cả chờ semaphore và backoff);
+      CancelledError (client ngắt kết nối) được propagate
+    """
+
+    def __init__(self, max_concurrency=OPENAI_MAX_CONCURRENCY, max_retries=OPENAI_MAX_RETRIES,
+                 timeout=OPENAI_TIMEOUT, response_cache=None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.timeout = timeout
+        self.response_cache = response_cache
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # key -> [task, số request đang chờ]
+        self._inflight = {}
+        self._init_client()
+
+    def _init_client(self):
+        """Initialize AsyncOpenAI với HTTP connection pool dùng chung"""
+        try:
+            import httpx
+            from openai import AsyncOpenAI
+
+            api_key, base_url = _resolve_credentials()
+
+            self.http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                    keepalive_expiry=30
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=10.0)
+            )
+
+            # Tự retry ở tầng này nên tắt retry mặc định của SDK
+            self.client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=self.http_client,
+                max_retries=0
+            )
+
+            logger.info("✅ Async OpenAI client initialized successfully")
+
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize async OpenAI client: {e}")
+            self.http_client = None
+            self.client = None
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """429, 5xx và lỗi kết nối thì retry; 4xx khác thì không (hết deadline cũng không retry)"""
+        from openai import APIConnectionError, APIStatusError, RateLimitError
+
+        if isinstance(error, (RateLimitError, APIConnectionError)):
+            return True
+        if isinstance(error, APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return False
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff với full jitter"""
+        cap = min(OPENAI_RETRY_MAX_DELAY, OPENAI_RETRY_BASE_DELAY * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline: float):
+        """Thời gian backoff trước lần thử tiếp theo, None nếu không retry (lỗi không retry được / hết deadline)"""
+        if attempt >= self.max_retries or not self._is_retryable(error):
+            return None
+        delay = self._backoff_delay(attempt)
+        if asyncio.get_running_loop().time() + delay >= deadline:
+            return None
+        return delay
+
+    async def _call_with_retries(self, make_request, timeout=None):
+        """Gọi make_request với retry; quá deadline (timeout tính cho cả các lần retry) -> asyncio.TimeoutError"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    return await asyncio.wait_for(make_request(), timeout=max(0.0, deadline - loop.time()))
+            except asyncio.CancelledError:
+                # Request bị hủy (vd: client ngắt kết nối) - không retry
+                raise
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                logger.warning(f"⚠️ OpenAI request failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} sau {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def chat_completion(self, messages, model="gpt-4o-mini", temperature=0.7, timeout=None, use_cache=True):
+        """
+        Generate chat completion với retry, trả về None nếu thất bại.
+        Có cache + gộp các request giống hệt đang chạy thành 1 lời gọi upstream.
+        """
+        if not self.client:
+            logger.error("❌ Async OpenAI client not available")
+            return None
+
+        cache = self.response_cache if use_cache else None
+        if cache is None:
+            return await self._create_chat_completion(messages, model, temperature, timeout)
+
+        key = LLMResponseCache.make_key(model, temperature, messages)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info("⚡ LLM cache hit")
+            return _chat_completion_from_cache(cached)
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(
+                self._create_and_cache(cache, key, messages, model, temperature, timeout)
+            )
+            entry = [task, 0]
+            self._inflight[key] = entry
+            task.add_done_callback(lambda _, key=key, entry=entry: self._release_inflight(key, entry))
+        else:
+            logger.info("🔗 Coalesced với request đang chạy")
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # shield: 1 request bị hủy không làm hủy lời gọi dùng chung với request khác
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _release_inflight(self, key, entry):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    async def _create_and_cache(self, cache, key, messages, model, temperature, timeout):
+        response = await self._create_chat_completion(messages, model, temperature, timeout)
+        if response is not None:
+            cache.set(key, response.model_dump())
+        return response
+
+    async def _create_chat_completion(self, messages, model, temperature, timeout=None):
+        try:
+            return await self._call_with_retries(
+                lambda: self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature
+                ),
+                timeout=timeout
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Async chat completion error: {e}")
+            return None
+
+    async def chat_completion_stream(self, messages, model="gpt-4o-mini", temperature=0.7, timeout=None):
+        """
+        Stream chat completion, yield từng đoạn text.
+        Chỉ retry khi chưa nhận được token nào; raise nếu lỗi (caller tự fallback).
+        """
+        if not self.client:
+            raise RuntimeError("Async OpenAI client not available")
+
+        # Slot semaphore giữ trong lúc tạo stream và suốt thời gian đọc stream,
+        # nhả ra trong lúc backoff giữa các lần retry (như _call_with_retries).
+        # Deadline chung chỉ tính cho việc tạo stream (kể cả retry), không tính thời gian đọc stream
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        for attempt in range(self.max_retries + 1):
+            await self._semaphore.acquire()
+            try:
+                stream = await asyncio.wait_for(
+                    self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        stream=True
+                    ),
+                    timeout=max(0.0, deadline - loop.time())
+                )
+                break
+            except asyncio.CancelledError:
+                self._semaphore.release()
+                raise
+            except Exception as e:
+                self._semaphore.release()
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                logger.warning(f"⚠️ OpenAI stream failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} sau {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            try:
+                await stream.close()
+            finally:
+                self._semaphore.release()
+
+    async def create_embedding(self, text, model="text-embedding-3-small", timeout=None):
+        """Create embeddings với retry, trả về None nếu thất bại"""
+        if not self.client:
+            logger.error("❌ Async OpenAI client not available")
+            return None
+
+        if len(text) > 8000:
+            text = text[:8000]
+            logger.warning("Text truncated for embedding")
+
+        try:
+            response = await self._call_with_retries(
+                lambda: self.client.embeddings.create(model=model, input=text),
+                timeout=timeout
+            )
+            return response.data[0].embedding
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Async embedding error: {e}")
+            return None
+
+    async def aclose(self):
+        """Đóng connection pool"""
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
 # Global instance - KHÔNG khởi tạo ngay để tránh lỗi khi import
 openai_client = None
+async_openai_client = None
+llm_response_cache = None
+
+def get_llm_response_cache():
+    """Cache response dùng chung cho sync và async client"""
+    global llm_response_cache
+    if llm_response_cache is None:
+        llm_response_cache = create_default_llm_cache()
+    return llm_response_cache
 
 def get_openai_client():
     """Lazy initialization của OpenAI client"""
     global openai_client
     if openai_client is None:
-        openai_client = OpenAIClient()
+        openai_client = OpenAIClient(response_cache=get_llm_response_cache())
     return openai_client
 
+def get_async_openai_client():
+    """Lazy initialization của async OpenAI client (dùng chung connection pool)"""
+    global async_openai_client
+    if async_openai_client is None:
+        async_openai_client = AsyncOpenAIClient(response_cache=get_llm_response_cache())
+    return async_openai_client
+
+async def close_async_openai_client():
+    """Đóng connection pool của async client (nếu đã khởi tạo)"""
+    global async_openai_client
+    if async_openai_client is not None:
+        await async_openai_client.aclose()
+        async_openai_client = None
+
 def test_openai_connection():
     """Test connection (legacy function)"""
     client = get_openai_client()
     return client.test_connection()
 
-def chat_completion(messages, model="gpt-4o-mini", temperature=0.7):
+def chat_completion(messages, model="gpt-4o-mini", temperature=0.7, use_cache=True):
     """Legacy chat completion function"""
     client = get_openai_client()
-    return client.chat_completion(messages, model, temperature)
+    return client.chat_completion(messages, model, temperature, use_cache)
 
 def create_embedding(text, model="text-embedding-3-small"):
     """Legacy embedding function"""
     client = get_openai_client()
     return client.create_embedding(text, model)
+
+def create_embeddings(texts, model="text-embedding-3-small"):
+    """Batch embedding function"""
+    client = get_openai_client()
+    return client.create_embeddings(texts, model)
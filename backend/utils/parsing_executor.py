@@ -0,0 +1,429 @@
+# utils/parsing_executor.py
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from utils.file_parser import (
+    PDF_CHAR_BUDGET, count_pdf_pages, extract_pdf_page_range, extract_text_from_file
+)
+
+try:
+    import resource  # chỉ có trên Unix
+except ImportError:
+    resource = None
+
+# Cấu hình parse file (pdfplumber/docx là CPU-bound, không chạy trên event loop)
+FILE_PARSE_WORKERS = int(os.getenv("FILE_PARSE_WORKERS", str(os.cpu_count() or 2)))
+FILE_PARSE_TIMEOUT = float(os.getenv("FILE_PARSE_TIMEOUT", "30"))          # wall-clock / job
+FILE_PARSE_CPU_SECONDS = int(os.getenv("FILE_PARSE_CPU_SECONDS", "20"))    # CPU time / job
+FILE_PARSE_MEMORY_MB = int(os.getenv("FILE_PARSE_MEMORY_MB", "1024"))      # address space / worker
+FILE_PARSE_MAX_PAGES = int(os.getenv("FILE_PARSE_MAX_PAGES", "50"))
+# PDF nhiều hơn N page được chia thành các page range parse song song
+PDF_PAGES_PER_JOB = int(os.getenv("PDF_PAGES_PER_JOB", "4"))
+
+# Worker chết vì các signal này = file vượt giới hạn CPU/memory, thử lại chỉ tốn thêm 1 lần budget
+# (RLIMIT_CPU -> SIGXCPU, cấp phát lỗi dưới RLIMIT_AS trong C extension -> SIGSEGV/SIGABRT/SIGBUS,
+# OOM killer -> SIGKILL)
+_LIMIT_SIGNALS = {
+    getattr(signal, name) for name in ("SIGXCPU", "SIGKILL", "SIGSEGV", "SIGABRT", "SIGBUS")
+    if hasattr(signal, name)
+}
+
+class ParsingError(Exception):
+    """File không parse được trong giới hạn (timeout, hết CPU/memory, worker crash)"""
+    pass
+
+class _WorkerCrashed(Exception):
+    """Worker process chết giữa job (exitcode < 0 = bị signal kill)"""
+
+    def __init__(self, exitcode: Optional[int]):
+        super().__init__(exitcode)
+        self.exitcode = exitcode
+
+    @property
+    def hit_limit(self) -> bool:
+        return self.exitcode is not None and -self.exitcode in _LIMIT_SIGNALS
+
+def _init_worker(memory_mb: int) -> None:
+    """Chạy 1 lần khi worker process khởi động: giới hạn memory + import sẵn parser"""
+    if resource is not None and memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+    # Import nặng (pdfminer) làm trước để job đầu tiên không phải chờ
+    import pdfplumber  # noqa: F401
+    import docx  # noqa: F401
+
+def _worker_main(conn, memory_mb: int) -> None:
+    """Vòng lặp của worker process: nhận (fn, args) qua pipe, chạy lần lượt từng job"""
+    _init_worker(memory_mb)
+    while True:
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return  # executor đã đóng pipe
+        try:
+            result = ("ok", fn(*args))
+        except BaseException as e:
+            result = ("error", e)
+        try:
+            conn.send(result)
+        except Exception as e:
+            # kết quả/exception không pickle được
+            conn.send(("error", RuntimeError(f"{type(e).__name__}: {e}")))
+
+def _warm_up_job(_=None) -> int:
+    return os.getpid()
+
+def _limit_cpu(cpu_seconds: int) -> None:
+    """Giới hạn CPU time tính từ lúc bắt đầu job (RLIMIT_CPU tính cộng dồn cho cả process)"""
+    if resource is None or cpu_seconds <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    # Vượt soft limit -> SIGXCPU kill worker, executor thay bằng worker mới
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def _parse_job(filename: str, file_bytes: bytes, cpu_seconds: int, max_pages: int) -> Tuple[str, str]:
+    """Job chạy trong worker: giới hạn CPU time rồi parse cả file"""
+    _limit_cpu(cpu_seconds)
+    return extract_text_from_file(filename, file_bytes, max_pages=max_pages or None)
+
+def _count_pages_job(file_bytes: bytes, cpu_seconds: int) -> int:
+    _limit_cpu(cpu_seconds)
+    return count_pdf_pages(file_bytes)
+
+def _pdf_range_job(pdf_path: str, start: int, end: int, cpu_seconds: int, char_budget: int) -> List[str]:
+    _limit_cpu(cpu_seconds)
+    return extract_pdf_page_range(pdf_path, start, end, char_budget or None)
+
+def _write_temp_pdf(file_bytes: bytes) -> str:
+    with tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", delete=False) as f:
+        f.write(file_bytes)
+        return f.name
+
+def _remove_file(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def _is_pdf(filename: str, file_bytes: bytes) -> bool:
+    """Đuôi .pdf, hoặc không có đuôi mà có magic bytes PDF (.txt/.docx đi đúng parser theo đuôi)"""
+    extension = os.path.splitext(filename.lower())[1]
+    if extension == ".pdf":
+        return True
+    return not extension and file_bytes[:5] == b"%PDF-"
+
+# Tạo worker tuần tự: fork lúc pipe của worker khác chưa đóng đầu con thì process mới giữ luôn
+# đầu đó, worker kia chết sẽ không ra EOF
+_spawn_lock = threading.Lock()
+
+class _Worker:
+    """1 worker process + pipe, chạy từng job một"""
+
+    def __init__(self, context, memory_mb: int):
+        with _spawn_lock:
+            self.conn, child_conn = context.Pipe()
+            self.process = context.Process(target=_worker_main, args=(child_conn, memory_mb), daemon=True)
+            self.process.start()
+            child_conn.close()
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def run(self, fn, args, timeout: float):
+        """Gửi job, chờ kết quả tối đa timeout giây (TimeoutError), worker chết giữa chừng -> EOFError"""
+        self.conn.send((fn, args))
+        if not self.conn.poll(max(0.0, timeout)):
+            raise TimeoutError
+        return self.conn.recv()
+
+    def kill(self) -> Optional[int]:
+        """Kill worker nếu còn chạy, trả về exitcode"""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+        return self.process.exitcode
+
+class ParsingExecutor:
+    """
+    Worker process parse file upload:
+    - Worker được khởi động sẵn (warm) với giới hạn memory (RLIMIT_AS)
+    - Mỗi worker chỉ chạy 1 job tại một thời điểm, job có giới hạn CPU time (RLIMIT_CPU),
+      wall-clock timeout và page cap
+    - PDF lớn được chia page range parse song song, dừng khi đủ char_budget
+    - Job treo quá timeout: chỉ kill worker đang chạy job đó, các job khác chạy tiếp
+    - Worker chết giữa job: thay worker mới; chết vì giới hạn CPU/memory thì báo lỗi luôn,
+      lý do khác thì thử lại 1 lần
+    Lỗi của file hỏng chỉ làm chết worker của chính nó, không ảnh hưởng job khác hay API process.
+    """
+
+    def __init__(self, workers: int = FILE_PARSE_WORKERS, timeout: float = FILE_PARSE_TIMEOUT,
+                 cpu_seconds: int = FILE_PARSE_CPU_SECONDS, memory_mb: int = FILE_PARSE_MEMORY_MB,
+                 max_pages: int = FILE_PARSE_MAX_PAGES, pages_per_job: int = PDF_PAGES_PER_JOB,
+                 char_budget: int = PDF_CHAR_BUDGET):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_pages = max_pages
+        self.pages_per_job = pages_per_job
+        self.char_budget = char_budget
+        self.restarts = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self._context = multiprocessing.get_context()
+        # Worker rảnh; None = slot chưa có process (tạo khi cần)
+        self._idle = queue.Queue()
+        for _ in range(self.workers):
+            self._idle.put(None)
+        self._running = set()
+        # Thread chờ pipe của worker (tối đa 1 thread / worker)
+        self._io = None
+        self._lock = threading.Lock()
+
+    def _get_io(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._io is None:
+                self._io = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="parser-io")
+            return self._io
+
+    def _acquire(self, deadline: float) -> _Worker:
+        """Lấy 1 worker rảnh (tạo mới nếu slot trống/worker đã chết), chờ tối đa tới deadline"""
+        try:
+            worker = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            raise TimeoutError
+        if worker is not None and worker.alive():
+            return worker
+
+        if worker is not None:
+            self._discard(worker)
+        try:
+            worker = _Worker(self._context, self.memory_mb)
+        except Exception:
+            self._idle.put(None)
+            raise
+        with self._lock:
+            self._running.add(worker)
+        return worker
+
+    def _discard(self, worker: _Worker) -> Optional[int]:
+        with self._lock:
+            self._running.discard(worker)
+        return worker.kill()
+
+    def _release(self, worker: _Worker) -> None:
+        """Trả worker về hàng đợi (worker đã bị shutdown() kill thì bỏ, slot đã được trả lại)"""
+        with self._lock:
+            if worker not in self._running:
+                return
+        self._idle.put(worker)
+
+    def _replace(self, worker: _Worker) -> Optional[int]:
+        """Kill đúng worker này, slot của nó sẽ tạo worker mới ở job sau"""
+        with self._lock:
+            owned = worker in self._running
+            self._running.discard(worker)
+        exitcode = worker.kill()
+        if owned:
+            self.restarts += 1
+            self._idle.put(None)
+        return exitcode
+
+    def _execute(self, label: str, fn, args: tuple, deadline: float):
+        """Chạy trong thread I/O: gửi job cho 1 worker rảnh và chờ kết quả tới deadline"""
+        try:
+            worker = self._acquire(deadline)
+        except TimeoutError:
+            self.timeouts += 1
+            raise ParsingError(f"Parse '{label}' quá {self.timeout}s (chờ worker rảnh)")
+
+        try:
+            status, value = worker.run(fn, args, deadline - time.monotonic())
+        except TimeoutError:
+            self.timeouts += 1
+            self._replace(worker)
+            raise ParsingError(f"Parse '{label}' quá {self.timeout}s")
+        except (EOFError, OSError):
+            raise _WorkerCrashed(self._replace(worker))
+
+        if status == "error" and isinstance(value, MemoryError):
+            # Worker vừa hết memory có thể ở trạng thái hỏng -> thay mới
+            self._replace(worker)
+            raise ParsingError(f"Parse '{label}' vượt giới hạn memory")
+        self._release(worker)
+        if status == "error":
+            raise value
+        return value
+
+    def start(self) -> float:
+        """Khởi động sẵn tất cả worker, trả về thời gian (ms)"""
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        list(self._get_io().map(
+            lambda _: self._execute("warm-up", _warm_up_job, (None,), deadline), range(self.workers)
+        ))
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    async def _run(self, label: str, fn, *args):
+        """Chạy 1 job trên 1 worker với timeout; worker chết không vì giới hạn thì thử lại 1 lần"""
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(2):
+            deadline = time.monotonic() + self.timeout
+            try:
+                return await loop.run_in_executor(self._get_io(), self._execute, label, fn, args, deadline)
+            except _WorkerCrashed as e:
+                self.crashes += 1
+                if e.hit_limit:
+                    raise ParsingError(
+                        f"Parse '{label}' vượt giới hạn CPU/memory (worker exitcode {e.exitcode})"
+                    )
+                if attempt == 0:
+                    print(f"⚠️ Parser worker crashed (exitcode {e.exitcode}), retrying '{label}' on a new worker")
+                    continue
+                raise ParsingError(f"Parser worker crashed khi parse '{label}' (exitcode {e.exitcode})")
+
+    async def parse(self, filename: str, file_bytes: bytes) -> Tuple[str, str]:
+        """Parse file trên worker process, trả về (text, detected_type)"""
+        if _is_pdf(filename, file_bytes) and self.pages_per_job > 0:
+            text = await self._parse_pdf_parallel(filename, file_bytes)
+            if text is not None:
+                return text, "pdf"
+
+        return await self._run(filename, _parse_job, filename, file_bytes, self.cpu_seconds, self.max_pages)
+
+    async def _parse_pdf_parallel(self, filename: str, file_bytes: bytes) -> Optional[str]:
+        """
+        Chia PDF thành các page range, parse song song theo từng đợt (mỗi đợt = số worker).
+        - File được ghi ra file tạm 1 lần, job chỉ nhận đường dẫn (không pickle cả file cho từng job)
+        - Phần char_budget còn lại được chia đều cho các job trong đợt, cả đợt extract tối đa
+          ~budget còn lại; không đợt nào được dispatch sau khi đủ char_budget
+        Trả về None nếu PDF nhỏ/lỗi -> dùng parse thường.
+        """
+        try:
+            page_count = await self._run(filename, _count_pages_job, file_bytes, self.cpu_seconds)
+        except ParsingError:
+            raise
+        except Exception:
+            return None  # không đọc được như PDF, để extract_text_from_file tự fallback
+
+        if self.max_pages:
+            page_count = min(page_count, self.max_pages)
+        if page_count <= self.pages_per_job:
+            return None
+
+        ranges = [
+            (start, min(start + self.pages_per_job, page_count))
+            for start in range(0, page_count, self.pages_per_job)
+        ]
+        text_pages = []
+        total_chars = 0
+        pdf_path = await asyncio.to_thread(_write_temp_pdf, file_bytes)
+
+        try:
+            for wave_start in range(0, len(ranges), self.workers):
+                wave = ranges[wave_start:wave_start + self.workers]
+                job_budget = -(-(self.char_budget - total_chars) // len(wave)) if self.char_budget else 0
+                try:
+                    results = await asyncio.gather(*(
+                        self._run(f"{filename}[{start}:{end}]", _pdf_range_job, pdf_path, start, end,
+                                  self.cpu_seconds, job_budget)
+                        for start, end in wave
+                    ))
+                except ParsingError:
+                    raise
+                except Exception:
+                    return None
+
+                for chunks in results:
+                    for chunk in chunks:
+                        if self.char_budget and total_chars >= self.char_budget:
+                            break
+                        text_pages.append(chunk)
+                        total_chars += len(chunk)
+
+                if self.char_budget and total_chars >= self.char_budget:
+                    break
+        finally:
+            await asyncio.to_thread(_remove_file, pdf_path)
+
+        return "\n\n".join(text_pages).strip()
+
+    __call__ = parse
+
+    def shutdown(self) -> None:
+        """Kill mọi worker (kể cả worker đang chạy job); executor dùng lại được, worker tạo lại khi cần"""
+        with self._lock:
+            workers, self._running = list(self._running), set()
+            io, self._io = self._io, None
+        for worker in workers:
+            worker.kill()
+        if io is not None:
+            io.shutdown(wait=False, cancel_futures=True)
+
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for _ in range(self.workers):
+            self._idle.put(None)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "busy": self.workers - self._idle.qsize(),
+            "timeout": self.timeout,
+            "cpu_seconds": self.cpu_seconds,
+            "memory_mb": self.memory_mb,
+            "max_pages": self.max_pages,
+            "pages_per_job": self.pages_per_job,
+            "char_budget": self.char_budget,
+            "restarts": self.restarts,
+            "timeouts": self.timeouts,
+            "crashes": self.crashes,
+        }
+
+# Global instance - lazy initialization
+parsing_executor = None
+_parsing_executor_lock = threading.Lock()
+
+def get_parsing_executor() -> ParsingExecutor:
+    global parsing_executor
+    with _parsing_executor_lock:
+        if parsing_executor is None:
+            parsing_executor = ParsingExecutor()
+        return parsing_executor
+
+def shutdown_parsing_executor() -> None:
+    if parsing_executor is not None:
+        parsing_executor.shutdown()
+
+async def extract_text_from_file_async(filename: str, file_bytes: bytes) -> Tuple[str, str]:
+    """extract_text_from_file chạy trong ParsingExecutor, không block event loop"""
+    try:
+        return await get_parsing_executor().parse(filename, file_bytes)
+    except OSError as e:
+        # Không tạo được process (sandbox...) -> parse trong thread
+        print(f"⚠️ Process pool unavailable, parsing in thread: {e}")
+        return await asyncio.to_thread(
+            extract_text_from_file, filename, file_bytes, FILE_PARSE_MAX_PAGES or None
+        )
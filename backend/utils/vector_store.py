@@ -1,12 +1,31 @@
 import json
 import os
-import math
-from .openai_client import create_embedding
-
-def load_vectorstore():
+import threading
+import zlib
+import numpy as np
+from .openai_client import create_embeddings
+from .disk_cache import SQLiteCache, content_hash
+from .vectorstore_format import MappedVectorstore
+
+VECTORSTORE_PATH = os.getenv("VECTORSTORE_PATH", "../vectorstore/embedded_docs.json")
+# Thư mục vectorstore nhị phân (tạo bằng: python -m utils.vectorstore_format convert)
+VECTORSTORE_BIN_PATH = os.getenv("VECTORSTORE_BIN_PATH", "../vectorstore/embedded_docs_bin")
+VECTORSTORE_VERIFY_CHECKSUM = os.getenv("VECTORSTORE_VERIFY_CHECKSUM", "0") == "1"
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./cache/embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "512"))
+
+_embedding_cache = None
+
+# Từ khóa dùng cho keyword similarity khi không có embedding
+BACKEND_KEYWORDS = ["python", "flask", "django", "api", "rest", "database", "sql", "server", "backend", "web", "development"]
+
+def load_vectorstore(vectorstore_path: str = VECTORSTORE_PATH):
     """Load vectorstore từ shared folder"""
     try:
-        vectorstore_path = "../vectorstore/embedded_docs.json"
         print(f"📁 Đang tải vectorstore từ: {vectorstore_path}")
 
         if not os.path.exists(vectorstore_path):
@@ -21,147 +40,240 @@ def load_vectorstore():
         print(f"❌ Lỗi tải vectorstore: {e}")
         return []
 
-def embed_text(text: str):
-    """Embed text using OpenAI - sử dụng GPT-4o-mini thay vì embedding model"""
-    try:
-        print(f"🔤 Đang embed text: {text[:50]}...")
-
-        # Sử dụng GPT-4o-mini để tạo embedding đơn giản
-        # Trong thực tế, bạn nên dùng embedding model, nhưng tạm thời dùng cách này
-        prompt = f"""
-        Tạo một vector embedding đơn giản cho văn bản sau bằng cách trả về một mảng số:
-        "{text}"
-
-        Chỉ trả về mảng JSON, không có text nào khác.
-        """
-
-        from .openai_client import chat_completion
-        response = chat_completion([
-            {"role": "user", "content": prompt}
-        ])
-
-        if response and 'choices' in response and len(response['choices']) > 0:
-            content = response['choices'][0]['message']['content'].strip()
-
-            # Loại bỏ markdown code blocks nếu có
-            if content.startswith("```json"):
-                content = content[7:-3].strip()
-            elif content.startswith("```"):
-                content = content[3:-3].strip()
-
-            embedding = json.loads(content)
-            print("✅ Embed text thành công!")
-            return embedding
-        else:
-            print("❌ Không nhận được embedding từ GPT")
-            return get_simple_embedding(text)
-
-    except Exception as e:
-        print(f"❌ Lỗi embed text với GPT: {e}")
-        return get_simple_embedding(text)
-
-def get_simple_embedding(text: str):
-    """Tạo embedding đơn giản dựa trên từ khóa (fallback)"""
-    print("🔄 Sử dụng simple embedding fallback...")
-
-    # Từ khóa quan trọng cho backend development
-    backend_keywords = ["python", "flask", "django", "api", "rest", "database", "sql", "server", "backend", "web"]
-
-    # Tạo embedding đơn giản dựa trên sự xuất hiện của từ khóa
-    embedding = []
-    text_lower = text.lower()
+def get_embedding_cache():
+    """Cache embedding trên disk, key = hash(model, text)"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        try:
+            _embedding_cache = SQLiteCache(
+                EMBEDDING_CACHE_PATH,
+                table="embeddings",
+                max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+            )
+        except Exception as e:
+            print(f"⚠️ Embedding cache disabled: {e}")
+            _embedding_cache = False
+    return _embedding_cache if _embedding_cache is not False else None
+
+def embed_text(text: str, model: str = EMBEDDING_MODEL):
+    """Embed 1 text bằng embedding model (có cache, fallback local khi offline)"""
+    return embed_batch([text], model)[0]
+
+def embed_batch(texts: list, model: str = EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE):
+    """
+    Embed nhiều text: lấy từ cache trước, phần còn thiếu gọi API theo batch nhiều input.
+    Nếu API không khả dụng, cả batch dùng local embedding để các vector cùng không gian.
+    """
+    if not texts:
+        return []
 
-    for keyword in backend_keywords:
-        if keyword in text_lower:
-            embedding.append(1.0)
+    cache = get_embedding_cache()
+    keys = [content_hash("embedding", model, text) for text in texts]
+    embeddings = [cache.get(key) if cache is not None else None for key in keys]
+
+    # Text chưa có trong cache (gộp các text trùng nhau)
+    missing = {}
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            missing.setdefault(keys[i], []).append(i)
+
+    if missing:
+        missing_keys = list(missing)
+        print(f"🔤 Đang embed {len(missing_keys)}/{len(texts)} text (model: {model})...")
+
+        for start in range(0, len(missing_keys), batch_size):
+            chunk_keys = missing_keys[start:start + batch_size]
+            chunk_texts = [texts[missing[key][0]] for key in chunk_keys]
+
+            vectors = create_embeddings(chunk_texts, model)
+            if not vectors or len(vectors) != len(chunk_texts):
+                print("❌ Không tạo được embedding từ API, dùng local embedding")
+                return [get_local_embedding(text) for text in texts]
+
+            for key, vector in zip(chunk_keys, vectors):
+                if cache is not None:
+                    cache.set(key, vector)
+                for i in missing[key]:
+                    embeddings[i] = vector
+
+    return embeddings
+
+def _ngram_bucket(ngram: str, dim: int):
+    """Hash ổn định (không phụ thuộc PYTHONHASHSEED) -> (bucket, dấu)"""
+    h = zlib.crc32(ngram.encode("utf-8"))
+    return h % dim, 1.0 if (h >> 31) & 1 == 0 else -1.0
+
+def get_local_embedding(text: str, dim: int = LOCAL_EMBEDDING_DIM):
+    """
+    Embedding local, deterministic (fallback khi offline):
+    hashing trick trên character n-gram (3-5) của từng từ, tf log-scale, chuẩn hóa L2.
+    Text giống nhau về từ vựng sẽ có cosine cao.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        token = f"<{word}>"
+        for n in (3, 4, 5):
+            for start in range(max(1, len(token) - n + 1)):
+                bucket, sign = _ngram_bucket(token[start:start + n], dim)
+                vector[bucket] += sign
+
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector.tolist()
+
+class VectorIndex:
+    """
+    Index load 1 lần, giữ embeddings trong ma trận float32 liên tục với norm tính sẵn.
+    - Score = 1 phép nhân ma trận-vector (cosine nếu có embedding, keyword nếu không)
+    - Top-k bằng argpartition, dedupe theo course_title bằng np.unique
+    Dữ liệu có thể nằm trong RAM (từ JSON) hoặc memory-mapped (MappedVectorstore).
+    """
+
+    def __init__(self, size: int, get_record, title_codes, keyword_matrix, embeddings=None, norms=None):
+        self.size = size
+        self.get_record = get_record
+        self.title_codes = title_codes
+        self.keyword_matrix = keyword_matrix
+        self.embeddings = embeddings
+        self.norms = None
+        if embeddings is not None:
+            self.norms = np.where(norms == 0, 1.0, norms).astype(np.float32)
+
+    @classmethod
+    def from_docs(cls, docs: list):
+        """Build index từ list document (JSON vectorstore)"""
+        records = [{key: value for key, value in doc.items() if key != "embedding"} for doc in docs]
+        titles = [doc.get("course_title", "") for doc in docs]
+
+        # Mã số cho mỗi course_title để dedupe vectorized
+        _, title_codes = np.unique(np.array(titles, dtype=object).astype(str), return_inverse=True)
+
+        # Ma trận keyword (docs x keywords) cho keyword similarity
+        keyword_matrix = np.array(
+            [[1.0 if keyword in doc.get("text", "").lower() else 0.0 for keyword in BACKEND_KEYWORDS] for doc in docs],
+            dtype=np.float32
+        ).reshape(len(docs), len(BACKEND_KEYWORDS))
+
+        embeddings = cls._build_embedding_matrix(docs)
+        norms = np.linalg.norm(embeddings, axis=1) if embeddings is not None else None
+
+        return cls(len(docs), records.__getitem__, title_codes, keyword_matrix, embeddings, norms)
+
+    @classmethod
+    def from_mapped(cls, store: MappedVectorstore):
+        """Index trên vectorstore memory-mapped - không copy embeddings vào RAM"""
+        if list(store.keywords) == BACKEND_KEYWORDS:
+            keyword_matrix = store.keyword_matrix
         else:
-            embedding.append(0.0)
-
-    # Thêm padding nếu cần
-    while len(embedding) < 10:
-        embedding.append(0.0)
-
-    print(f"✅ Tạo simple embedding với {len(embedding)} dimensions")
-    return embedding
-
-def dot_product(a, b):
-    """Tính dot product thủ công"""
-    if len(a) != len(b):
-        # Padding để cùng chiều dài
-        max_len = max(len(a), len(b))
-        a = a + [0] * (max_len - len(a))
-        b = b + [0] * (max_len - len(b))
-    return sum(x * y for x, y in zip(a, b))
-
-def magnitude(vector):
-    """Tính magnitude thủ công"""
-    return math.sqrt(sum(x * x for x in vector))
-
-def cosine_similarity(a, b):
-    """Cosine similarity không dùng numpy"""
-    if not a or not b:
-        return 0
-    dot_prod = dot_product(a, b)
-    mag_a = magnitude(a)
-    mag_b = magnitude(b)
-    return dot_prod / (mag_a * mag_b) if mag_a != 0 and mag_b != 0 else 0
+            # Keyword list đã đổi từ lúc convert: tính lại từ text
+            keyword_matrix = np.array(
+                [[1 if keyword in store.record(i).get("text", "").lower() else 0 for keyword in BACKEND_KEYWORDS]
+                 for i in range(store.count)],
+                dtype=np.uint8
+            ).reshape(store.count, len(BACKEND_KEYWORDS))
+
+        return cls(store.count, store.record, store.title_codes, keyword_matrix,
+                   store.embeddings, np.asarray(store.norms))
+
+    @staticmethod
+    def _build_embedding_matrix(docs: list):
+        """Ma trận (n, dim) float32 nếu mọi document có embedding cùng số chiều"""
+        embeddings = [doc.get("embedding") for doc in docs]
+        if not embeddings or any(not embedding for embedding in embeddings):
+            return None
+
+        dim = len(embeddings[0])
+        if any(len(embedding) != dim for embedding in embeddings):
+            print("⚠️ Embeddings không cùng số chiều, dùng keyword similarity")
+            return None
+
+        return np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+
+    @property
+    def has_embeddings(self) -> bool:
+        return self.embeddings is not None
+
+    def score(self, query: str, query_embedding=None) -> np.ndarray:
+        """Similarity của query với mọi document"""
+        if self.has_embeddings and query_embedding is not None and len(query_embedding) == self.embeddings.shape[1]:
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_norm = float(np.linalg.norm(query_vector))
+            if query_norm > 0:
+                return (self.embeddings @ query_vector) / (self.norms * query_norm)
+
+        query_lower = query.lower()
+        query_keywords = np.array([1.0 if keyword in query_lower else 0.0 for keyword in BACKEND_KEYWORDS], dtype=np.float32)
+        return (self.keyword_matrix.astype(np.float32, copy=False) @ query_keywords) / len(BACKEND_KEYWORDS)
+
+    def top_k_unique(self, scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Index của top_k document có score cao nhất, mỗi course_title 1 lần"""
+        if self.size == 0 or top_k <= 0:
+            return np.array([], dtype=np.int64)
+
+        pool = min(self.size, top_k * 4)
+        while True:
+            if pool < self.size:
+                candidates = np.argpartition(-scores, pool - 1)[:pool]
+            else:
+                candidates = np.arange(self.size)
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+            # Lần xuất hiện đầu tiên (score cao nhất) của mỗi title
+            _, first_positions = np.unique(self.title_codes[candidates], return_index=True)
+            picked = candidates[np.sort(first_positions)]
+
+            if len(picked) >= top_k or pool >= self.size:
+                return picked[:top_k]
+            pool = min(self.size, pool * 4)
+
+    def search(self, query: str, top_k: int = 5, query_embedding=None) -> list:
+        scores = self.score(query, query_embedding)
+        results = []
+        for i in self.top_k_unique(scores, top_k):
+            record = self.get_record(int(i))
+            results.append({
+                "course_title": record.get("course_title", ""),
+                "text": record.get("text", ""),
+                "similarity": float(scores[i])
+            })
+        return results
+
+_vector_index = None
+_vector_index_lock = threading.Lock()
+
+def get_vector_index(reload: bool = False):
+    """Load index 1 lần cho cả process - ưu tiên định dạng nhị phân memory-mapped"""
+    global _vector_index
+    with _vector_index_lock:
+        if _vector_index is None or reload:
+            _vector_index = None
+            if os.path.exists(os.path.join(VECTORSTORE_BIN_PATH, "manifest.json")):
+                try:
+                    store = MappedVectorstore(VECTORSTORE_BIN_PATH, verify_checksum=VECTORSTORE_VERIFY_CHECKSUM)
+                    _vector_index = VectorIndex.from_mapped(store)
+                    print(f"✅ Đã mở vectorstore nhị phân: {store.count} documents")
+                except Exception as e:
+                    print(f"❌ Lỗi mở vectorstore nhị phân, dùng JSON: {e}")
+
+            if _vector_index is None:
+                docs = load_vectorstore()
+                _vector_index = VectorIndex.from_docs(docs) if docs else None
+    return _vector_index
 
 def search_courses(query: str, top_k: int = 5):
     """Tìm khóa học phù hợp dựa trên query"""
     print(f"🔍 Đang tìm kiếm khóa học với query: {query[:100]}...")
 
-    vectorstore = load_vectorstore()
-    if not vectorstore:
+    index = get_vector_index()
+    if index is None or index.size == 0:
         print("❌ Vectorstore trống!")
         return []
 
-    query_embedding = embed_text(query)
-    if not query_embedding:
-        print("❌ Không thể tạo query embedding!")
-        return []
-
-    similarities = []
-
-    for doc in vectorstore:
-        # Sử dụng similarity đơn giản dựa trên từ khóa
-        doc_text = doc.get("text", "").lower()
-        query_lower = query.lower()
+    # Chỉ embed query khi index có embedding để so sánh
+    query_embedding = embed_text(query) if index.has_embeddings else None
 
-        # Tính similarity đơn giản
-        sim = simple_text_similarity(query_lower, doc_text)
-        similarities.append((sim, doc))
-
-    # Sắp xếp theo độ tương đồng giảm dần
-    similarities.sort(key=lambda x: x[0], reverse=True)
-
-    # Lấy các khóa học duy nhất
-    unique_courses = {}
-    for sim, doc in similarities:
-        course_title = doc["course_title"]
-        if course_title not in unique_courses:
-            unique_courses[course_title] = {
-                "course_title": course_title,
-                "text": doc["text"],
-                "similarity": float(sim)
-            }
-        if len(unique_courses) >= top_k:
-            break
-
-    print(f"✅ Tìm thấy {len(unique_courses)} khóa học phù hợp")
-    return list(unique_courses.values())
-
-def simple_text_similarity(text1: str, text2: str):
-    """Tính similarity đơn giản dựa trên từ khóa chung"""
-    backend_keywords = ["python", "flask", "django", "api", "rest", "database", "sql", "server", "backend", "web", "development"]
-
-    score = 0
-    text1_lower = text1.lower()
-    text2_lower = text2.lower()
-
-    for keyword in backend_keywords:
-        if keyword in text1_lower and keyword in text2_lower:
-            score += 1
-
-    # Chuẩn hóa score về 0-1
-    max_score = len(backend_keywords)
-    return score / max_score if max_score > 0 else 0
+    results = index.search(query, top_k, query_embedding)
+    print(f"✅ Tìm thấy {len(results)} khóa học phù hợp")
+    return results
@@ -0,0 +1,186 @@
+# utils/vectorstore_format.py
+"""
+Định dạng nhị phân memory-mapped cho vectorstore (thay cho 1 file JSON lớn).
+
+Thư mục gồm:
+- manifest.json     : format, version, count, dim, keywords, sha256 của từng file
+- embeddings.npy    : ma trận float32 (count, dim), mở bằng mmap
+- norms.npy         : norm của từng embedding (float32, count)
+- keywords.npy      : ma trận keyword (uint8, count x len(keywords))
+- title_codes.npy   : mã số course_title (int32, count) để dedupe
+- offsets.npy       : byte offset của từng record trong records.bin (int64, count + 1)
+- records.bin       : header MAGIC + các record JSON UTF-8 (document không có embedding)
+
+Các worker process mở cùng file sẽ dùng chung page cache của OS.
+
+Convert: python -m utils.vectorstore_format convert --input ../vectorstore/embedded_docs.json --output ../vectorstore/embedded_docs_bin
+Verify:  python -m utils.vectorstore_format verify ../vectorstore/embedded_docs_bin
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_NAME = "course-vectorstore"
+FORMAT_VERSION = 1
+MAGIC = b"CVSTORE" + bytes([FORMAT_VERSION])
+DATA_FILES = ("embeddings.npy", "norms.npy", "keywords.npy", "title_codes.npy", "offsets.npy", "records.bin")
+
+class VectorstoreFormatError(Exception):
+    pass
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _keyword_matrix(texts, keywords) -> np.ndarray:
+    return np.array(
+        [[1 if keyword in text.lower() else 0 for keyword in keywords] for text in texts],
+        dtype=np.uint8
+    ).reshape(len(texts), len(keywords))
+
+def convert_vectorstore(docs: list, output_dir, keywords: list) -> dict:
+    """Ghi docs (list dict có 'embedding') ra định dạng nhị phân, trả về manifest"""
+    output_dir = Path(output_dir)
+    if not docs:
+        raise VectorstoreFormatError("Vectorstore trống, không có gì để convert")
+
+    dim = len(docs[0].get("embedding") or [])
+    if dim == 0 or any(len(doc.get("embedding") or []) != dim for doc in docs):
+        raise VectorstoreFormatError("Mọi document phải có embedding cùng số chiều")
+
+    # Ghi vào thư mục tạm rồi rename để reader không thấy file ghi dở
+    tmp_dir = output_dir.with_name(output_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    embeddings = np.asarray([doc["embedding"] for doc in docs], dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1).astype(np.float32)
+    texts = [doc.get("text", "") for doc in docs]
+    titles = [doc.get("course_title", "") for doc in docs]
+    _, title_codes = np.unique(np.array(titles, dtype=object).astype(str), return_inverse=True)
+
+    np.save(tmp_dir / "embeddings.npy", embeddings)
+    np.save(tmp_dir / "norms.npy", norms)
+    np.save(tmp_dir / "keywords.npy", _keyword_matrix(texts, keywords))
+    np.save(tmp_dir / "title_codes.npy", title_codes.astype(np.int32))
+
+    offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+    with open(tmp_dir / "records.bin", "wb") as f:
+        f.write(MAGIC)
+        position = 0
+        for i, doc in enumerate(docs):
+            record = {key: value for key, value in doc.items() if key != "embedding"}
+            payload = json.dumps(record, ensure_ascii=False).encode("utf-8")
+            f.write(payload)
+            position += len(payload)
+            offsets[i + 1] = position
+    np.save(tmp_dir / "offsets.npy", offsets)
+
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "count": len(docs),
+        "dim": dim,
+        "dtype": "float32",
+        "keywords": list(keywords),
+        "checksums": {name: _sha256_file(tmp_dir / name) for name in DATA_FILES},
+    }
+    with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    return manifest
+
+class MappedVectorstore:
+    """Mở vectorstore nhị phân bằng mmap - không parse toàn bộ dữ liệu khi mở"""
+
+    def __init__(self, path, verify_checksum: bool = False):
+        self.path = Path(path)
+        manifest_path = self.path / "manifest.json"
+        if not manifest_path.exists():
+            raise VectorstoreFormatError(f"Không tìm thấy manifest: {manifest_path}")
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get("format") != FORMAT_NAME:
+            raise VectorstoreFormatError(f"Sai format: {self.manifest.get('format')}")
+        if self.manifest.get("version") != FORMAT_VERSION:
+            raise VectorstoreFormatError(
+                f"Version {self.manifest.get('version')} không được hỗ trợ (cần {FORMAT_VERSION})"
+            )
+        if verify_checksum:
+            self.verify()
+
+        self.count = self.manifest["count"]
+        self.dim = self.manifest["dim"]
+        self.keywords = self.manifest["keywords"]
+
+        self.embeddings = np.load(self.path / "embeddings.npy", mmap_mode="r")
+        self.norms = np.load(self.path / "norms.npy", mmap_mode="r")
+        self.keyword_matrix = np.load(self.path / "keywords.npy", mmap_mode="r")
+        self.title_codes = np.load(self.path / "title_codes.npy", mmap_mode="r")
+        self.offsets = np.load(self.path / "offsets.npy", mmap_mode="r")
+
+        if self.embeddings.shape != (self.count, self.dim) or len(self.offsets) != self.count + 1:
+            raise VectorstoreFormatError("Kích thước dữ liệu không khớp với manifest")
+
+        self._records_file = open(self.path / "records.bin", "rb")
+        self._records = mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._records[:len(MAGIC)] != MAGIC:
+            raise VectorstoreFormatError("records.bin sai header")
+
+    def verify(self) -> None:
+        """So sánh sha256 của từng file với manifest (đọc toàn bộ file)"""
+        for name, expected in self.manifest.get("checksums", {}).items():
+            actual = _sha256_file(self.path / name)
+            if actual != expected:
+                raise VectorstoreFormatError(f"Checksum không khớp: {name}")
+
+    def record(self, i: int) -> dict:
+        """Decode record thứ i (course_title, text, ...)"""
+        start = len(MAGIC) + int(self.offsets[i])
+        end = len(MAGIC) + int(self.offsets[i + 1])
+        return json.loads(self._records[start:end].decode("utf-8"))
+
+    def close(self) -> None:
+        self._records.close()
+        self._records_file.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert/verify vectorstore nhị phân memory-mapped")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert embedded_docs.json sang định dạng nhị phân")
+    convert_parser.add_argument("--input", default="../vectorstore/embedded_docs.json")
+    convert_parser.add_argument("--output", default="../vectorstore/embedded_docs_bin")
+
+    verify_parser = subparsers.add_parser("verify", help="Kiểm tra version và checksum")
+    verify_parser.add_argument("path")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        from utils.vector_store import BACKEND_KEYWORDS
+
+        with open(args.input, "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        manifest = convert_vectorstore(docs, args.output, BACKEND_KEYWORDS)
+        print(f"✅ Đã convert {manifest['count']} documents (dim={manifest['dim']}) -> {args.output}")
+    else:
+        store = MappedVectorstore(args.path, verify_checksum=True)
+        print(f"✅ {args.path}: version {store.manifest['version']}, {store.count} documents, checksum OK")
+        store.close()
+
+if __name__ == "__main__":
+    main()